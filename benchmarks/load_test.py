@@ -0,0 +1,241 @@
+"""Load test whole runs of the utility (run_program.main) against a local stand-in for the API, so that the
+throughput of the pipeline can be measured without touching a real API.
+
+Run from the repository root with: python3 -m benchmarks.load_test
+
+The stand-in API serves generated XML records of '--fields' elements for GET requests and echoes PUT
+requests back, after '--latency' milliseconds. A share of requests ('--error-rate') get a 500 error, and
+another ('--throttle-rate') get a 429 with a Retry-After header. A project is generated in the 'projects'
+folder for each run and removed afterwards, and each run happens in its own process so that its peak memory
+use can be measured.
+
+For each run, this shows the resources per second, the time from a resource's GET request arriving at the
+API to the last response for it going out (50th and 99th percentile), the peak RSS of the run's process,
+and how many resources failed (production runs only). Add '--json' to save the results for comparing later.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import statistics
+import sys
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockApi:
+    """A local HTTP server standing in for an XML API. Records how long each resource took, from the
+    first request for it arriving to the last response for it going out."""
+    def __init__(self, fields: int, latency: float, error_rate: float, throttle_rate: float, seed: int = 0):
+        self.fields = fields
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.requests = 0
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._timings: dict[str, list[float]] = {}
+
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                api.handle(self, None)
+
+            def do_PUT(self):
+                api.handle(self, self.rfile.read(int(self.headers.get("Content-Length", 0))))
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url_template(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}/records/<resource_id>"
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset(self):
+        with self._lock:
+            self._timings = {}
+            self.requests = 0
+
+    def latencies(self) -> list[float]:
+        """How long each resource took, in seconds."""
+        with self._lock:
+            return [end - start for start, end in self._timings.values()]
+
+    def record(self, identifier: str) -> bytes:
+        fields = "".join(f"<field{i}>value {i} of record {identifier}</field{i}>" for i in range(self.fields))
+        return f"<record><id>{identifier}</id><status>old</status><fields>{fields}</fields></record>".encode()
+
+    def handle(self, request: BaseHTTPRequestHandler, body: bytes | None):
+        start = time.perf_counter()
+        identifier = request.path.split("?")[0].rsplit("/", 1)[-1]
+        with self._lock:
+            self.requests += 1
+            self._timings.setdefault(identifier, [start, start])
+            roll = self._random.random()
+
+        time.sleep(self.latency)
+        if roll < self.throttle_rate:
+            status, headers, body = 429, {"Retry-After": "0"}, b"<error>Too many requests</error>"
+        elif roll < self.throttle_rate + self.error_rate:
+            status, headers, body = 500, {}, b"<error>Internal server error</error>"
+        else:
+            status, headers, body = 200, {}, body if body is not None else self.record(identifier)
+
+        request.send_response(status)
+        for name, value in {"Content-Type": "application/xml", "Content-Length": str(len(body)), **headers}.items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(body)
+
+        with self._lock:
+            self._timings[identifier][1] = time.perf_counter()
+
+
+def write_project(project_path: str, url_template: str, resources: int, dry_run: bool, max_concurrency: int,
+                  extra_settings: list[str]):
+    os.makedirs(project_path)
+    with open(f"{project_path}/__init__.py", "w") as f:
+        f.write("")
+    with open(f"{project_path}/progress.csv", "w", encoding="utf-8-sig") as f:
+        f.write("ID,Status\n")
+    with open(f"{project_path}/input.csv", "w", encoding="utf-8-sig") as f:
+        f.write("ID,Status\n")
+        f.writelines(f"RECORD_{i},new\n" for i in range(resources))
+
+    settings = [
+        f"api_url_template = {url_template!r}",
+        "update_file = 'input.csv'",
+        "xpath_for_get_response_verification = '/record/id'",
+        "xpath_of_resource_in_put_response = '/record'",
+        "query_param_api_key = None",
+        "xpaths = ['/record/status']",
+        "xpath_operations = 'update'",
+        f"dry_run = {dry_run}",
+        "retry_failed = False",
+        "update_limit = None",
+        f"max_concurrency = {max_concurrency}",
+        "max_consecutive_failures = None",
+        "use_custom_xml_update_function = False",
+        "def custom_xml_update_function(*args):",
+        "    pass",
+        *extra_settings,
+    ]
+    with open(f"{project_path}/project_settings.py", "w") as f:
+        f.write("\n".join(settings) + "\n")
+
+
+def run_in_process(project_name: str, results: multiprocessing.Queue):
+    """Do one run of the utility, sending back how long it took and the process's peak RSS."""
+    # Keep the progress bar out of the results.
+    sys.stderr = open(os.devnull, "w")
+    try:
+        import run_program
+        start = time.perf_counter()
+        run_program.main(project_name)
+        elapsed = time.perf_counter() - start
+    except Exception:
+        results.put({"error": traceback.format_exc()})
+        return
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    results.put({"seconds": elapsed, "peak_rss": peak_rss})
+
+
+def count_failed(project_path: str) -> int:
+    with open(f"{project_path}/progress.csv", encoding="utf-8-sig") as f:
+        return sum(1 for line in f if line.rstrip().endswith(",failed"))
+
+
+def run_case(api: MockApi, mode: str, args: argparse.Namespace) -> dict:
+    project_name = f"load_test_{os.getpid()}"
+    project_path = f"projects/{project_name}"
+    shutil.rmtree(project_path, ignore_errors=True)
+    write_project(project_path, api.url_template, args.resources, mode == "dry", args.max_concurrency, args.setting)
+    api.reset()
+
+    try:
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        process = context.Process(target=run_in_process, args=(project_name, results))
+        process.start()
+        result = results.get()
+        process.join()
+        if "error" in result:
+            raise RuntimeError(f"The {mode} run failed:\n{result['error']}")
+
+        latencies = sorted(api.latencies())
+        percentiles = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+        return {
+            "mode": mode,
+            "resources": args.resources,
+            "seconds": result["seconds"],
+            "resources_per_second": args.resources / result["seconds"],
+            "p50_ms": percentiles[49] * 1000,
+            "p99_ms": percentiles[98] * 1000,
+            "peak_rss_mb": result["peak_rss"] / 2**20,
+            "requests": api.requests,
+            "failed": count_failed(project_path) if mode == "prod" else None,
+        }
+    finally:
+        shutil.rmtree(project_path, ignore_errors=True)
+
+
+def main(args: argparse.Namespace):
+    api = MockApi(args.fields, args.latency / 1000, args.error_rate, args.throttle_rate, seed=args.seed)
+    api.start()
+    os.makedirs("projects", exist_ok=True)
+
+    print(f"{args.resources} resources of {args.fields} fields, {args.latency} ms latency, "
+          f"{args.error_rate:.0%} errors, {args.throttle_rate:.0%} throttled, max_concurrency {args.max_concurrency}")
+    print(f"{'mode':>5} {'time (s)':>9} {'res/s':>8} {'p50 (ms)':>9} {'p99 (ms)':>9} {'RSS (MB)':>9} {'requests':>9} {'failed':>7}")
+    results = []
+    try:
+        for mode in args.modes:
+            result = run_case(api, mode, args)
+            results.append(result)
+            failed = result["failed"] if result["failed"] is not None else "-"
+            print(f"{mode:>5} {result['seconds']:9.2f} {result['resources_per_second']:8.1f} {result['p50_ms']:9.1f} "
+                  f"{result['p99_ms']:9.1f} {result['peak_rss_mb']:9.1f} {result['requests']:>9} {failed:>7}")
+    finally:
+        api.stop()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"arguments": {name: value for name, value in vars(args).items() if name != "json"}, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--resources", type=int, default=1_000, help="How many resources to update.")
+    parser.add_argument("--fields", type=int, default=50, help="How many fields each generated record has (its size).")
+    parser.add_argument("--latency", type=float, default=5, help="How long the API takes to answer each request, in milliseconds.")
+    parser.add_argument("--error-rate", type=float, default=0, help="The share of requests (0 to 1) that get a 500 error.")
+    parser.add_argument("--throttle-rate", type=float, default=0, help="The share of requests (0 to 1) that get a 429.")
+    parser.add_argument("--max-concurrency", type=int, default=8, help="The max_concurrency setting for the runs.")
+    parser.add_argument("--modes", nargs="+", choices=["dry", "prod"], default=["dry", "prod"], help="Which runs to do.")
+    parser.add_argument("--setting", action="append", default=[],
+                        help="A line to add to the project settings, e.g. \"backup_format = 'packed'\". Can be repeated.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for choosing which requests fail.")
+    parser.add_argument("--json", help="Save the results to this JSON file.")
+    args = parser.parse_args()
+
+    main(args)
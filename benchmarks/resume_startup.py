@@ -0,0 +1,67 @@
+"""Benchmark how long a run takes to start up (reading progress.csv and the update file) as the
+amount of previous progress grows.
+
+Run from the repository root with: python3 -m benchmarks.resume_startup
+
+Each case has an update file of 'rows' resources, 'completed' of which are already in progress.csv.
+The time to build the list of resources for the run is shown for the progress index that the program
+uses (a dict) and, for comparison, for the same lookups done against a plain list."""
+import argparse
+import csv
+import tempfile
+import time
+
+from src.get_configuration import Settings
+from src.progress_manager import ProgressManager
+from src.read_update_file import read_update_file
+
+
+def write_project(project_path: str, rows: int, completed: int) -> Settings:
+    with open(f"{project_path}/progress.csv", "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(["ID", "Status"])
+        writer.writerows([f"RESOURCE_{i}", "success"] for i in range(completed))
+
+    with open(f"{project_path}/input.csv", "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(["ID", "Value"])
+        writer.writerows([f"RESOURCE_{i}", "value"] for i in range(rows))
+
+    settings = Settings()
+    settings.update_file = f"{project_path}/input.csv"
+    settings.api_url_template = "https://example.com/resource/<resource_id>"
+    settings.use_custom_xml_update_function = False
+    settings.xpaths = ["/resource/value"]
+    return settings
+
+
+def time_startup(project_path: str, settings: Settings, as_list: bool) -> tuple[float, int]:
+    start = time.perf_counter()
+    pm = ProgressManager(project_path)
+    exclude = list(pm.previously_completed_api_resources) if as_list else pm.previously_completed_api_resources
+    api_resources = read_update_file(settings, api_resources_to_exclude=exclude)
+    return time.perf_counter() - start, len(api_resources)
+
+
+def main(max_list_completed: int):
+    cases = [(1_000, 800), (10_000, 8_000), (50_000, 40_000), (100_000, 80_000), (500_000, 400_000)]
+
+    print(f"{'rows':>10} {'completed':>10} {'to do':>8} {'dict (s)':>10} {'list (s)':>10}")
+    for rows, completed in cases:
+        with tempfile.TemporaryDirectory() as project_path:
+            settings = write_project(project_path, rows, completed)
+            dict_time, to_do = time_startup(project_path, settings, as_list=False)
+            if completed <= max_list_completed:
+                list_time = f"{time_startup(project_path, settings, as_list=True)[0]:10.3f}"
+            else:
+                list_time = f"{'skipped':>10}"
+        print(f"{rows:>10} {completed:>10} {to_do:>8} {dict_time:10.3f} {list_time}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-list-completed", type=int, default=40_000,
+                        help="Skip the list comparison above this much progress, since it takes quadratic time.")
+    args = parser.parse_args()
+
+    main(args.max_list_completed)
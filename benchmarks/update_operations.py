@@ -0,0 +1,75 @@
+"""Benchmark the built-in 'updateOrInsert' and 'delete' operations on records with many repeated elements.
+
+Run from the repository root with: python3 -m benchmarks.update_operations
+
+Each case is a synthetic record with 'elements' <item> elements, each with a couple of <note> elements.
+'updateOrInsert' inserts a <status> into every item, and 'delete' removes one note from every item. The
+time per element should stay flat as the record grows. For comparison, the same work is timed the way
+these operations used to do it, with the whole tree searched again for each parent element.
+"""
+import argparse
+import copy
+import time
+from lxml import etree
+
+from src.api_resource import parse_xml
+from src.xml_updater import get_update_plan
+
+
+def make_record(elements: int) -> etree._Element:
+    items = "".join(f"<item><id>{i}</id><notes><note type='old'>a</note><note type='new'>b</note></notes></item>"
+                    for i in range(elements))
+    return parse_xml(f"<items>{items}</items>".encode())
+
+
+def legacy_update_or_insert(tree: etree._Element, parent_xpath: str, child_name: str, value: str):
+    for parent_el in tree.xpath(parent_xpath):
+        xpath_results = tree.xpath(f"{parent_xpath}/{child_name}")
+        if len(xpath_results) > 0:
+            for el in xpath_results:
+                el.text = value
+        else:
+            el = etree.SubElement(parent_el, child_name)
+            el.text = value
+
+
+def legacy_delete(tree: etree._Element, xpath: str, value: str):
+    for i, el_to_update in enumerate(tree.xpath(xpath)):
+        for el_to_delete in tree.xpath(f"{xpath}[{i+1}]/{value}"):
+            el_to_delete.getparent().remove(el_to_delete)
+
+
+def time_it(function, record: etree._Element) -> float:
+    tree = copy.deepcopy(record)
+    start = time.perf_counter()
+    function(tree)
+    return time.perf_counter() - start
+
+
+def main(max_legacy_elements: int):
+    update_or_insert = get_update_plan(["/items/item/status"], ["updateOrInsert"])
+    delete = get_update_plan(["/items/item"], ["delete"])
+
+    cases = [
+        ("updateOrInsert", lambda tree: update_or_insert.apply("R", tree, ["checked"]),
+         lambda tree: legacy_update_or_insert(tree, "/items/item", "status", "checked")),
+        ("delete", lambda tree: delete.apply("R", tree, ["notes/note[@type='old']"]),
+         lambda tree: legacy_delete(tree, "/items/item", "notes/note[@type='old']")),
+    ]
+
+    print(f"{'operation':>15} {'elements':>9} {'time (s)':>9} {'us/element':>11} {'legacy (s)':>11}")
+    for elements in [500, 1_000, 2_000, 4_000, 8_000, 16_000]:
+        record = make_record(elements)
+        for name, run, run_legacy in cases:
+            elapsed = time_it(run, record)
+            legacy = f"{time_it(run_legacy, record):11.3f}" if elements <= max_legacy_elements else f"{'skipped':>11}"
+            print(f"{name:>15} {elements:>9} {elapsed:9.3f} {elapsed / elements * 1e6:11.1f} {legacy}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-legacy-elements", type=int, default=4_000,
+                        help="Skip the legacy comparison above this many elements, since it takes quadratic time.")
+    args = parser.parse_args()
+
+    main(args.max_legacy_elements)
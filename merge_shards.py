@@ -0,0 +1,31 @@
+import argparse
+import os
+
+from src.sharding import find_shard_folders, merge_shards
+
+
+def main(project_name: str):
+    """Bring the progress and comparisons of a project's shards into the project's 'progress.csv' and
+    'comparisons.jsonl'."""
+    project_path = f"projects/{project_name}"
+    if not os.path.exists(project_path):
+        raise FileNotFoundError(
+            f"Project '{project_name}' has not been initialized.")
+
+    shard_folders = find_shard_folders(project_path)
+    if not shard_folders:
+        print(f"Project '{project_name}' has no shards to merge.")
+        return
+
+    merged = merge_shards(project_path)
+    print(f"Merged {len(shard_folders)} shards ({', '.join(os.path.basename(folder) for folder in shard_folders)}): "
+          f"{merged['resources']} resources and {merged['comparisons']} new comparisons.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge the results of a project's shards into the project's own files.")
+    parser.add_argument(
+        "project_name", help="The name of the project to merge the shards of.", type=str)
+    args = parser.parse_args()
+
+    main(args.project_name)
@@ -0,0 +1,172 @@
+import argparse
+import copy
+import os
+import logging
+import shutil
+from contextlib import closing
+from tqdm import tqdm
+from datetime import datetime
+
+from src.get_configuration import get_configuration
+from src.backup import Backup
+from src.xml_updater import XMLUpdater
+from src.progress_manager import ProgressManager
+from src.resource_pipeline import ResourcePipeline, TooManyFailuresError
+from src.http_session import create_session
+from src.rate_limiter import RateLimiter, QuotaExhaustedError
+from src.retry_policy import RetryPolicy
+from src.run_logging import setup_logging, stop_logging
+from src.sharding import Shard, find_shard_folders
+from src.restorer import Restorer, read_ids_file, ids_with_status, iter_resources_to_restore, count_resources_to_restore
+
+
+def main(project_name: str, ids_filepath: str | None = None, status: str = "success", dry_run: bool = False,
+         shard: Shard | None = None):
+    """Put resources back the way they were before the update, by sending their backups to the API.
+
+    The resources to restore are the ones listed in 'ids_filepath', or otherwise the ones with 'status'
+    in the update's 'progress.csv'. Restores go through the same pipeline as updates, with the same
+    concurrency, rate limits and retries, and are recorded in 'restore_progress.csv' as they finish, so a
+    restore that's stopped part way through carries on where it left off when it's run again.
+
+    With a 'shard', the backups and progress of that shard of the update are used instead, and the
+    restore's files are kept in the shard's folder."""
+    # ------------------------------- LOOK FOR PROJECT -------------------------------------
+
+    project_path = f"projects/{project_name}"
+    if not os.path.exists(project_path):
+        raise FileNotFoundError(
+            f"Project '{project_name}' has not been initialized.")
+
+    # ---------------------------- HANDLE USER CONFIGURATION --------------------------------
+
+    settings = copy.copy(get_configuration(project_path))
+    settings.dry_run = dry_run
+    # A resource that the update broke may not pass the usual verification, but it still needs restoring.
+    settings.xpath_for_get_response_verification = "/*"
+
+    # Where the update kept its files, and where the restore keeps its own.
+    run_path = shard.folder(project_path) if shard else project_path
+    if not os.path.exists(run_path):
+        raise FileNotFoundError(f"Shard {shard.index}/{shard.count} of project '{project_name}' has not been run.")
+
+    # -------------------- INITIALIZE LOGGER; PRINT INIT MESSAGES ------------------------
+
+    timestamp = datetime.now().strftime('%Y-%m-%d_%H%M%S')
+    log_listener = setup_logging(f"{run_path}/logs_restore_{timestamp}.{'jsonl' if settings.log_format == 'json' else 'log'}",
+                                 level=settings.log_level, json_lines=settings.log_format == "json",
+                                 max_bytes=settings.log_max_bytes, backup_count=settings.log_backup_count)
+    logging.info("Starting restore from backups...")
+    logging.info("Project: %s", project_name)
+    if shard:
+        logging.info("Shard: %s of %s", shard.index, shard.count)
+
+    # ------------------------- INITIALIZE THE NEEDED COMPONENTS --------------------------
+
+    backups = Backup(project_path=run_path, store_format=settings.backup_format)
+    # What the resources look like before they're restored is backed up too, separately, so the
+    # original backups are never overwritten.
+    restore_path = f"{run_path}/restore"
+    if not os.path.exists(restore_path):
+        os.mkdir(restore_path)
+    pre_restore_backuper = Backup(project_path=restore_path, store_format=settings.backup_format)
+    # Resources updated by the project's shards (and merged into its progress) were backed up in the shards'
+    # folders.
+    shard_backups = {}
+    if not shard:
+        shard_backups = {Shard.from_folder(folder): Backup(project_path=folder, store_format=settings.backup_format)
+                         for folder in find_shard_folders(project_path)}
+    restore_pm = ProgressManager(run_path, retry_failed=True, compaction_interval=settings.progress_compaction_interval,
+                                 progress_name="restore_progress")
+    xu = XMLUpdater(custom_update_function=Restorer(backups, shard_backups))
+    rate_limiter = RateLimiter(requests_per_second=settings.requests_per_second, burst=settings.rate_limit_burst,
+                               daily_request_limit=settings.daily_request_limit,
+                               remaining_quota_header=settings.remaining_quota_header,
+                               min_remaining_quota=settings.min_remaining_quota)
+    session = create_session(pool_size=settings.http_pool_size, connect_retries=settings.http_connect_retries,
+                             keep_alive=settings.http_keep_alive, timeout=settings.http_timeout, rate_limiter=rate_limiter,
+                             max_throttled_retries=settings.max_throttled_retries)
+
+    dry_run_folder = f"{run_path}/restoreDryRun"
+    if dry_run:
+        logging.info("Dry run mode: saving resources to %s.", dry_run_folder)
+        if os.path.exists(dry_run_folder):
+            shutil.rmtree(dry_run_folder)
+        os.mkdir(dry_run_folder)
+
+    # ------------------------- CHOOSE THE RESOURCES TO RESTORE --------------------------
+
+    if ids_filepath:
+        identifiers = read_ids_file(ids_filepath)
+    else:
+        update_pm = ProgressManager(run_path)
+        identifiers = ids_with_status(update_pm.previously_completed_api_resources, status)
+    # Failed restores are tried again; successful ones aren't repeated.
+    already_restored = restore_pm.previously_completed_api_resources if not dry_run else {}
+    # The resources are made as the restore goes, like the resources of an update, so that memory use
+    # stays flat however many there are. This only counts them, for the progress bar.
+    resources_to_restore = count_resources_to_restore(identifiers, already_restored)
+
+    if resources_to_restore == 0:
+        logging.info("Exiting - no resources to restore.")
+        restore_pm.close()
+        backups.close()
+        pre_restore_backuper.close()
+        for backup in shard_backups.values():
+            backup.close()
+        stop_logging(log_listener)
+        return
+
+    api_resources = iter_resources_to_restore(settings, identifiers, already_restored)
+    logging.info("Resources to restore: %s", resources_to_restore)
+
+    # ----------------------- START THE ACTUAL API WORK -----------------------------
+
+    retry_policy = RetryPolicy(max_attempts=settings.max_attempts, backoff_factor=settings.retry_backoff_factor,
+                               max_backoff=settings.retry_max_backoff, retry_on_status_codes=settings.retry_on_status_codes)
+    pipeline = ResourcePipeline(settings, pre_restore_backuper, xu, session, dry_run_folder=dry_run_folder if dry_run else None,
+                                retry_policy=retry_policy)
+
+    def finish_resource(api_resource):
+        if not dry_run:
+            restore_pm.record(api_resource)
+        api_resource.release_payloads()
+
+    try:
+        with closing(pipeline.run(api_resources)) as completed_api_resources:
+            for completed_api_resource in tqdm(completed_api_resources, total=resources_to_restore):
+                finish_resource(completed_api_resource)
+    except (QuotaExhaustedError, TooManyFailuresError) as e:
+        logging.error("Stopping the restore: %s", e)
+    finally:
+        for unreported_api_resource in pipeline.unreported:
+            finish_resource(unreported_api_resource)
+
+        backups.close()
+        pre_restore_backuper.close()
+        for backup in shard_backups.values():
+            backup.close()
+
+        logging.info("Saving state...")
+        restore_pm.close()
+        logging.info("Done." if not dry_run else "Dry run done.")
+        stop_logging(log_listener)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Restore resources from the backups made by a project's updates.")
+    parser.add_argument(
+        "project_name", help="The name of the project to restore resources of.", type=str)
+    parser.add_argument(
+        "--ids", help="CSV file with the IDs of the resources to restore in its first column (with a header row).", type=str)
+    parser.add_argument(
+        "--status", help="Restore the resources with this status in progress.csv (when --ids isn't given).",
+        choices=["success", "failed", "all"], default="success")
+    parser.add_argument(
+        "--dry-run", help="Save the restored resources to 'restoreDryRun' instead of sending them to the API.", action="store_true")
+    parser.add_argument(
+        "--shard", help="Restore from the backups of this shard of the update, written as 'index/count' (e.g. 2/4).",
+        type=Shard.parse)
+    args = parser.parse_args()
+
+    main(args.project_name, ids_filepath=args.ids, status=args.status, dry_run=args.dry_run, shard=args.shard)
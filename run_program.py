@@ -2,22 +2,38 @@ import argparse
 import os
 import logging
 import shutil
-import requests
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from collections import ChainMap
+from itertools import islice
 from tqdm import tqdm
 from datetime import datetime
 
 from src.get_configuration import get_configuration
-from src.read_update_file import read_update_file
-from src.retrieve_resource import retrieve_resource
+from src.read_update_file import iter_update_file, count_update_file
 from src.backup import Backup
 from src.xml_updater import XMLUpdater
 from src.progress_manager import ProgressManager
-from src.verify_response_content import verify_response_content
-from src.comparator import Comparator
-
-
-def main(project_name: str):
-    """The function that runs the actual update utility."""
+from src.comparator import Comparator, ComparisonLog
+from src.bulk_writer import BulkWriter
+from src.resource_pipeline import ResourcePipeline, TooManyFailuresError
+from src.http_session import create_session
+from src.rate_limiter import RateLimiter, QuotaExhaustedError
+from src.retry_policy import RetryPolicy
+from src.response_cache import ResponseCache
+from src.dry_run_manifest import DryRunManifest, DryRunPromoter
+from src.metrics import RunMetrics
+from src.run_logging import setup_logging, stop_logging, forward_process_logs, setup_process_logging
+from src.sharding import Shard
+
+
+def main(project_name: str, shard: Shard | None = None):
+    """The function that runs the actual update utility.
+
+    With a 'shard', only the resources of the update file in that shard are updated, and the run's
+    progress, backups, comparisons, logs and metrics are kept in the shard's folder instead of the
+    project folder (see 'merge_shards' for bringing them back together)."""
     # ------------------------------- LOOK FOR PROJECT -------------------------------------
 
     project_path = f"projects/{project_name}"
@@ -25,159 +41,210 @@ def main(project_name: str):
         raise FileNotFoundError(
             f"Project '{project_name}' has not been initialized.")
 
+    # ---------------------------- HANDLE USER CONFIGURATION --------------------------------
+
+    settings = get_configuration(f"projects/{project_name}")
+
+    # Where this run keeps its files: the project folder, or the shard's folder in it.
+    run_path = project_path
+    if shard:
+        run_path = shard.folder(project_path)
+        os.makedirs(run_path, exist_ok=True)
+
     # -------------------- INITIALIZE LOGGER; PRINT INIT MESSAGES ------------------------
 
     # Timestamp for logfile
     timestamp = datetime.now().strftime('%Y-%m-%d_%H%M%S')
-    logging.basicConfig(filename=f"{project_path}/logs_{timestamp}.log",
-                        format='%(levelname)s:%(asctime)s: %(message)s', level=logging.INFO)
+    log_listener = setup_logging(f"{run_path}/logs_{timestamp}.{'jsonl' if settings.log_format == 'json' else 'log'}",
+                                 level=settings.log_level, json_lines=settings.log_format == "json",
+                                 max_bytes=settings.log_max_bytes, backup_count=settings.log_backup_count)
     logging.info("Starting API Update Utility...")
-    logging.info(f"Project: {project_name}")
+    logging.info("Project: %s", project_name)
+    if shard:
+        logging.info("Shard: %s of %s", shard.index, shard.count)
 
-    # ---------------------------- HANDLE USER CONFIGURATION --------------------------------
+    # ---------------------------------- LOAD PROGRESS ------------------------------------
 
-    settings = get_configuration(f"projects/{project_name}")
+    metrics = RunMetrics()
+    pm = ProgressManager(run_path, retry_failed=settings.retry_failed,
+                         compaction_interval=settings.progress_compaction_interval)
+
+    # ------------------------- GET API RESOURCES FROM UPDATE FILE --------------------------
+
+    # The update file is read as the run goes, rather than all at once, so that memory use stays flat
+    # no matter how big it is. This first pass only counts the resources, for the progress bar.
+    api_resources_to_exclude = pm.previously_completed_api_resources
+    if shard:
+        # Resources finished before the project was split into shards (or brought in by merging them)
+        # aren't updated again.
+        project_pm = ProgressManager(project_path, retry_failed=settings.retry_failed)
+        api_resources_to_exclude = ChainMap(pm.previously_completed_api_resources, project_pm.previously_completed_api_resources)
+
+    final_update_limit = count_update_file(settings, api_resources_to_exclude=api_resources_to_exclude,
+                                           update_limit=settings.update_limit, shard=shard)
+
+    if final_update_limit == 0:
+        logging.info("Exiting - no resources to update.%s",
+                     " (retryFailed is set to false, there may be failed resources. Check 'progress.csv')" if not settings.retry_failed else " Congrats!")
+        stop_logging(log_listener)
+        return
 
     # ------------------------- INITIALIZE THE NEEDED COMPONENTS --------------------------
 
-    pm = ProgressManager(project_path, retry_failed=settings.retry_failed)
-    backuper = Backup(project_path=project_path)
+    # These are only set up once there's something to do, so that they're always closed at the end of
+    # the run (in the 'finally' below).
+    backuper = Backup(project_path=run_path, store_format=settings.backup_format)
+    # Processes for the CPU-heavy work (XML updates and comparisons), if the user asked for them.
+    # Spawned rather than forked, since the worker threads may already be running when they start.
+    process_pool = None
+    process_log_listener = None
+    if settings.cpu_workers:
+        mp_context = multiprocessing.get_context("spawn")
+        # The processes' logs (e.g. warnings from the XML updates) go to the run's log file too.
+        process_log_listener = forward_process_logs(log_listener, mp_context)
+        process_pool = ProcessPoolExecutor(max_workers=settings.cpu_workers, mp_context=mp_context, initializer=setup_process_logging,
+                                           initargs=(process_log_listener.queue, settings.log_level))
     xu = XMLUpdater(custom_update_function=settings.custom_xml_update_function if settings.use_custom_xml_update_function else None,
-                        xpaths=settings.xpaths, operations=settings.xpath_operations)
-    session = requests.Session()
+                        xpaths=settings.xpaths, operations=settings.xpath_operations, process_pool=process_pool)
+    rate_limiter = RateLimiter(requests_per_second=settings.requests_per_second, burst=settings.rate_limit_burst,
+                               daily_request_limit=settings.daily_request_limit,
+                               remaining_quota_header=settings.remaining_quota_header,
+                               min_remaining_quota=settings.min_remaining_quota)
+    session = create_session(pool_size=settings.http_pool_size, connect_retries=settings.http_connect_retries,
+                             keep_alive=settings.http_keep_alive, timeout=settings.http_timeout, rate_limiter=rate_limiter,
+                             max_throttled_retries=settings.max_throttled_retries, metrics=metrics)
+
+    response_cache = ResponseCache(f"{run_path}/response_cache.sqlite", ttl=settings.response_cache_ttl) if settings.use_response_cache else None
 
     # ------------------------ CREATE DRY RUN FOLDER IF NEEDED ---------------------------
 
+    dry_run_folder = f"{run_path}/dryRun"
+    dry_run_manifest = None
+    dry_run_promoter = None
     if settings.dry_run == True:
-        dry_run_folder = f"{project_path}/dryRun"
-        logging.info(f"Dry run mode: saving resources to {dry_run_folder}.")
+        logging.info("Dry run mode: saving resources to %s.", dry_run_folder)
         # Reset dry run folder
         if os.path.exists(dry_run_folder):
             shutil.rmtree(dry_run_folder)
         os.mkdir(dry_run_folder)
+        dry_run_manifest = DryRunManifest(dry_run_folder, xpaths=settings.xpaths, operations=settings.xpath_operations)
+    elif settings.promote_dry_run:
+        logging.info("Promoting the dry run in %s.", dry_run_folder)
+        dry_run_promoter = DryRunPromoter(dry_run_folder, xpaths=settings.xpaths, operations=settings.xpath_operations)
+
+    api_resources = islice(iter_update_file(settings, api_resources_to_exclude=api_resources_to_exclude, shard=shard),
+                           final_update_limit)
+
+    logging.info("Resources to update: %s", final_update_limit)
+    logging.info("Dry run mode: %s", settings.dry_run)
+
+    # ------------------------------ SET UP THE COMPARATOR -------------------------------
+
+    comparator = None
+    if settings.dry_run == False and settings.xpath_of_resource_in_put_response:
+        # Compare the resource from the GET request to what the PUT response return, to see
+        # what changed during the API update. Comparisons are appended to the file as each resource
+        # finishes, so the file is cumulative across runs.
+        comparator = Comparator(settings.xpath_of_resource_in_put_response, process_pool=process_pool)
+        comparison_log = ComparisonLog(f"{run_path}/comparisons.jsonl")
+    elif settings.dry_run == False and not settings.xpath_of_resource_in_put_response:
+        logging.warning("Skipping comparisions as there's no xpath_of_resource_in_put_response")
+    else:
+        # NOTE there is no cumulative comparisons for dry run because the folder is deleted each time.
+        comparator = Comparator(process_pool=process_pool)
+        comparison_log = ComparisonLog(f"{dry_run_folder}/comparisons.jsonl")
+
+    def finish_resource(api_resource):
+        """Save the results for a resource that has been through the pipeline. Nothing holds on to the
+        resource after this, so its XML can be freed."""
+        # The pipeline has already compared the resource.
+        if comparator and api_resource.comparison is not None:
+            try:
+                comparison_log.write(api_resource.identifier, api_resource.comparison)
+            except:
+                logging.exception("Something went wrong in saving the comparison for resource %s.", api_resource.identifier)
+
+        # Save progress as soon as each resource is done, so nothing is lost if the program is killed.
+        # This comes after the comparison so that a resource is never marked done without one.
+        if settings.dry_run == False:
+            pm.record(api_resource)
 
-    # ------------------------- GET API RESOURCES FROM UPDATE FILE --------------------------
-
-    api_resources = read_update_file(settings, api_resources_to_exclude=pm.previously_completed_api_resources)
-
-    if len(api_resources) == 0:
-        logging.info(f"Exiting - no resources to update.{
-                     " (retryFailed is set to false, there may be failed resources. Check 'progress.csv')" if not settings.retry_failed else " Congrats!"}")
-        return
-
-    final_update_limit = len(api_resources)
-    if settings.update_limit and settings.update_limit > 0 and settings.update_limit < final_update_limit:
-        final_update_limit = settings.update_limit
-
-    logging.info(f"Resources to update: {final_update_limit}")
-    logging.info(f"Dry run mode: {settings.dry_run}")
+        metrics.record_resource(api_resource)
+        api_resource.release_payloads()
 
     # ----------------------- START THE ACTUAL API WORK -----------------------------
 
+    retry_policy = RetryPolicy(max_attempts=settings.max_attempts, backoff_factor=settings.retry_backoff_factor,
+                               max_backoff=settings.retry_max_backoff, retry_on_status_codes=settings.retry_on_status_codes)
+    bulk_writer = BulkWriter(settings.bulk_write_function, session, batch_size=settings.bulk_batch_size) if settings.use_bulk_writer else None
+    pipeline = ResourcePipeline(settings, backuper, xu, session, dry_run_folder=dry_run_folder if settings.dry_run == True else None,
+                                retry_policy=retry_policy, comparator=comparator, bulk_writer=bulk_writer,
+                                response_cache=response_cache, dry_run_manifest=dry_run_manifest,
+                                dry_run_promoter=dry_run_promoter, metrics=metrics)
+    logging.info("Max concurrency: %s", pipeline.max_concurrency)
+    logging.info("Rate limit: %s requests per second", settings.requests_per_second or 'none')
+    if pipeline.bulk_writer:
+        logging.info("Bulk writes: batches of %s", bulk_writer.batch_size)
+
     try:
-        # Progress bar.
-        for index in tqdm(range(final_update_limit)):
-
-            # GET THE XML FOR EACH RESOURCE ---------------------------
-            logging.info(f"Working on resource {api_resources[index].identifier}...")
-            logging.debug("Retrieving GET request...")
-            api_resource_with_xml = retrieve_resource(api_resources[index])
-            logging.debug("Done.")
-
-            # VERIFY THE XML IS VALID ---------------------------------
-            logging.debug("Verifying response content...")
-            verified_api_resource = verify_response_content(api_resource_with_xml, settings.xpath_for_get_response_verification)
-            logging.debug("Done.")
-
-            # BACK UP XML IF VALID AND NOT DRY RUN --------------------
-            if settings.dry_run == False:
-                if verified_api_resource.status != "failed":
-                    logging.debug("Backing up resource...")
-                    result = backuper.backup(verified_api_resource.identifier, verified_api_resource.xml_from_get_request)
-                    if result == -1:
-                        logging.error(f"Could not back up vendor {verified_api_resource.identifier}")
-                        verified_api_resource.mark_failed()
-                    logging.debug("Done")
-                else:
-                    logging.debug(f"Skipping backup of resource {verified_api_resource.identifier} due to status '{verified_api_resource.status}'.")
-
-            # UPDATE THE XML -----------------------------------------------------
-            logging.debug("Updating XML...")
-            resource_with_updated_xml = xu.update_resource(verified_api_resource)
-            logging.debug("Done.")
-
-            # IF THIS IS A DRY RUN, SAVE THE UPDATED XML -------------------------
-            if settings.dry_run == True:
-                # Only save resources if they have updated XML (i.e, are still pending a production update)
-                if resource_with_updated_xml.status == "pending":
-                    resource_file_path = f"{dry_run_folder}/{Backup.normalize_identifier(resource_with_updated_xml.identifier)}.xml"
-                    with open(resource_file_path, "wb") as f:
-                        f.write(resource_with_updated_xml.xml_for_update_request)
-                    logging.debug("Done")
-            
-            # IF THIS IS A PRODUCTION RUN, RUN THE API UPDATE --------------------
-            else:
-                # Only run on resources that are pending.
-                if resource_with_updated_xml.status == "pending":
-                    response = session.put(resource_with_updated_xml.api_url, data=resource_with_updated_xml.xml_for_update_request, headers={
-                                            "Content-Type": "application/xml"})
-                    if response.status_code == 200:
-                        resource_with_updated_xml.mark_successful()
-                        logging.info(f"Resource {resource_with_updated_xml.identifier} updated successfully.")
-                    else:
-                        resource_with_updated_xml.mark_failed()
-                        logging.warning(f"Resource {resource_with_updated_xml.identifier} NOT UPDATED SUCCESSFULLY. Status code: {response.status_code}")
-                    resource_with_updated_xml.update_response = response.content
+        # Progress bar. Resources are counted as they come out of the pipeline, which may not be
+        # in the order of the update file when more than one is worked on at a time.
+        with closing(pipeline.run(api_resources)) as completed_api_resources:
+            for completed_api_resource in tqdm(completed_api_resources, total=final_update_limit):
+                finish_resource(completed_api_resource)
+    except (QuotaExhaustedError, TooManyFailuresError) as e:
+        # Resources that weren't finished are still pending, so the next run picks them up.
+        logging.error("Stopping the run: %s", e)
     finally:
-        # --------------- RUN COMPARATOR ----------------
+        # Resources that finished after the run was stopped weren't handled in the loop above.
+        for unreported_api_resource in pipeline.unreported:
+            finish_resource(unreported_api_resource)
+
+        if comparator:
+            comparison_log.close()
+        if process_pool:
+            process_pool.shutdown(cancel_futures=True)
+            process_log_listener.stop()
+        if response_cache:
+            response_cache.close()
+        if dry_run_manifest:
+            dry_run_manifest.close()
+        backuper.close()
+
+        # ---------------------- SAVE METRICS ---------------------
 
         try:
-            if settings.dry_run == False and settings.xpath_of_resource_in_put_response:
-                # Initialize comparator
-                comparator = Comparator(settings.xpath_of_resource_in_put_response)
-
-                # Compare the resource from the GET request to what the PUT response return, to see
-                # what changed during the API update.
-                comparison_filepath = f"{project_path}/comparisons.json"
-                past_comparison_dict = Comparator.get_past_comparisons(comparison_filepath)
-
-                # Run the comparator
-                cumulative_comparisons = comparator.compare(past_comparison_dict, api_resources, settings.dry_run)
-
-                # Write the results to the file
-                Comparator.write_comparisons(comparison_filepath, cumulative_comparisons)
-            elif settings.dry_run == False and not settings.xpath_of_resource_in_put_response:
-                logging.warning(f"Skipping comparisions as there's no xpath_of_resource_in_put_response")
-            else:
-                # Intitalize comparator
-                comparator = Comparator()
-
-                # Perform the operation for the dry run
-                comparison_filepath = f"{dry_run_folder}/comparisons.json"
-
-                # Run the comparator. NOTE there is no cumulative comparisons for dry run because the folder is
-                # deleted each time.
-                comparisons = comparator.compare({}, api_resources, settings.dry_run)
-
-                # Write the results to the file
-                Comparator.write_comparisons(comparison_filepath, comparisons)
+            metrics.write_json(f"{run_path}/metrics_{timestamp}.json")
+            if settings.prometheus_textfile:
+                labels = {"project": project_name, "mode": "dry_run" if settings.dry_run else "production"}
+                prometheus_textfile = settings.prometheus_textfile
+                if shard:
+                    # Each shard gets its own file, so shards on the same machine don't replace each other's.
+                    labels["shard"] = shard.name
+                    prometheus_textfile = f"{prometheus_textfile.removesuffix('.prom')}_{shard.name}.prom"
+                metrics.write_prometheus(prometheus_textfile, labels=labels)
         except:
-            logging.exception("Something went wrong in running the comparator.")
+            logging.exception("Something went wrong in saving the run's metrics.")
 
         # --------------------- SAVE STATE ------------------------
 
         if settings.dry_run == False:
             logging.info("Saving state...")
-            pm.save_state(api_resources)
+            pm.close()
             logging.info("Done.")
         else:
             logging.info("Dry run done.")
 
+        stop_logging(log_listener)
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "project_name", help="The name of the project to generate.", type=str)
+    parser.add_argument(
+        "--shard", help="Only update the resources in this shard of the update file, written as 'index/count' (e.g. 2/4).",
+        type=Shard.parse)
     args = parser.parse_args()
 
-    main(args.project_name)
+    main(args.project_name, shard=args.shard)
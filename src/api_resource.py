@@ -1,9 +1,52 @@
+from collections.abc import Sequence
+from enum import StrEnum
+from lxml import etree
+
+
+def parse_xml(xml: bytes) -> etree._Element:
+    """Parse resource XML. Whitespace between elements is dropped, so that the XML is indented
+    consistently when it's pretty-printed again."""
+    # Parsers can't be shared between threads, so a new one is made each time.
+    return etree.fromstring(xml, etree.XMLParser(remove_blank_text=True))
+
+
+
+class ResourceStatus(StrEnum):
+    """Where a resource is in the update. These are strings, so they're saved to progress.csv as they are
+    and can be compared to 'pending', 'success' and 'failed'."""
+    PENDING = "pending"
+    SUCCESS = "success"
+    FAILED = "failed"
+
+
+class ResourceFailure:
+    """Details of why an API resource failed: which stage of the pipeline it failed in (e.g. 'GET',
+    'verify', 'update', 'PUT'), the type of exception if there was one, a message, and the HTTP status
+    code if the failure came from an API response."""
+    __slots__ = ("stage", "message", "exception_type", "http_status")
+
+    def __init__(self, stage: str, message: str, exception_type: str | None = None, http_status: int | None = None):
+        self.stage = stage
+        self.message = message
+        self.exception_type = exception_type
+        self.http_status = http_status
+
+    def __str__(self):
+        details = f"{self.exception_type}: {self.message}" if self.exception_type else self.message
+        return f"{self.stage} failed{f' (HTTP {self.http_status})' if self.http_status else ''}: {details}"
 
 
 class ApiResource:
     """Class to hold information about a resource from the API (e.g., a user). This is
-    how resource state is carried through the program."""
-    def __init__(self, identifier: str, api_url: str, update_values: list[str] = [], status: str | None = "pending"):
+    how resource state is carried through the program.
+
+    Resources use slots rather than a __dict__, and their XML is dropped with 'release_payloads' once the
+    run is done with them, so that each one only takes up a little memory while it's waiting to be
+    worked on or after it's finished."""
+    __slots__ = ("identifier", "api_url", "update_values", "_status", "_xml_from_get_request", "_tree",
+                 "xml_for_update_request", "update_response", "comparison", "_attempts", "failure")
+
+    def __init__(self, identifier: str, api_url: str, update_values: Sequence[str] = (), status: ResourceStatus | str | None = ResourceStatus.PENDING):
         self.identifier = identifier
         self.update_values = update_values
         self.status = status
@@ -12,11 +55,67 @@ class ApiResource:
         self.xml_from_get_request: bytes = None
         self.xml_for_update_request: bytes | None = None
         self.update_response: bytes | None = None
+        # The comparison of the resource before and after the update, if the comparator was run.
+        self.comparison: dict | str | None = None
+
+        self._attempts: dict[str, int] | None = None
+        self.failure: ResourceFailure | None = None
+
+    @property
+    def status(self) -> ResourceStatus | None:
+        return self._status
+
+    @status.setter
+    def status(self, status: ResourceStatus | str | None):
+        self._status = ResourceStatus(status) if status is not None else None
+
+    @property
+    def attempts(self) -> dict[str, int]:
+        """How many times each request (e.g. 'GET', 'PUT') was attempted for this resource."""
+        if self._attempts is None:
+            self._attempts = {}
+        return self._attempts
+
+    @property
+    def xml_from_get_request(self) -> bytes | None:
+        return self._xml_from_get_request
+
+    @xml_from_get_request.setter
+    def xml_from_get_request(self, xml: bytes | None):
+        self._xml_from_get_request = xml
+        self._tree = None
+
+    @property
+    def tree(self) -> etree._Element | None:
+        """The XML from the GET request, parsed. It's only parsed the first time it's needed, and then
+        reused by each stage of the pipeline. This must not be changed; make a copy to change it."""
+        if self._tree is None and self._xml_from_get_request:
+            self._tree = parse_xml(self._xml_from_get_request)
+        return self._tree
+
+    def set_xml_from_get_request(self, xml: bytes, tree: etree._Element):
+        """Set the XML from the GET request along with the tree it was serialized from, so that it
+        doesn't have to be parsed again."""
+        self.xml_from_get_request = xml
+        self._tree = tree
 
     def mark_successful(self):
         """Mark the API resource as successful."""
-        self.status = "success"
+        self.status = ResourceStatus.SUCCESS
+
+    def mark_failed(self, stage: str | None = None, message: str | None = None, exception: Exception | None = None, http_status: int | None = None):
+        """Mark the API resource as failed. If the stage is passed, the details of the failure are
+        recorded on the resource as well."""
+        self.status = ResourceStatus.FAILED
+        if stage:
+            self.failure = ResourceFailure(stage, message if message else str(exception),
+                                           exception_type=type(exception).__name__ if exception else None,
+                                           http_status=http_status)
 
-    def mark_failed(self):
-        """Mark the API resource as failed."""
-        self.status = "failed"
+    def release_payloads(self):
+        """Drop the XML held by the resource (from the GET request, for the update request, and from the
+        update response). Call this once the resource has been saved; its status, failure and comparison
+        are kept."""
+        self.xml_from_get_request = None
+        self.xml_for_update_request = None
+        self.update_response = None
@@ -1,43 +1,170 @@
+import hashlib
 import logging
 import os
+import re
+import threading
+from urllib.parse import unquote
+
+from .backup_store import PackedBackupStore
 
 class Backup():
     """Class for backing up the XML retrieved from a GET request. This class also creates the backup
-     folder if it does not exist and tracks how many files were written."""
-    def __init__(self, project_path: str):
+     folder if it does not exist and tracks how many files were written.
+
+     Backups are either written as one XML file per resource ('files', see 'relative_filepath'), or packed
+     into one compressed, indexed file ('packed', see PackedBackupStore), which is better for large jobs."""
+    def __init__(self, project_path: str, store_format: str = "files"):
         self.backup_location = f"{project_path}/backups"
 
         if not os.path.exists(self.backup_location):
             os.mkdir(self.backup_location)
 
+        self.store_format = store_format
+        self.packed_store = PackedBackupStore(f"{self.backup_location}/backups.sqlite") if store_format == "packed" else None
+        # With the "files" format, packed backups from runs made with the other format are only opened if
+        # a backup isn't found in a file (see 'restore').
+        self._other_packed_store: PackedBackupStore | None = None
+
         self.files_written = 0
+        # Backups can be written from several worker threads at once.
+        self._lock = threading.Lock()
+        # The identifiers with a backup in the folder, by their legacy file name. Only read if there are
+        # legacy backups to restore (see '_restore_legacy').
+        self._identifiers_by_legacy_name: dict[str, set[str]] | None = None
 
     def backup(self, identifier: str, xml_resource: bytearray) -> int:
         """
         Backup an XML resource to a backup folder. 
         Return -1 for errors, 0 for success.
         """
-        resource_file_name = self.normalize_identifier(identifier)
-        filepath = f"{self.backup_location}/{resource_file_name}.xml"
+        filepath = self.packed_store.filepath if self.packed_store else self._filepath(identifier)
 
-        logging.debug(f"Backing up resource {identifier} to {filepath}")
+        logging.debug("Backing up resource %s to %s", identifier, filepath)
 
         try:
-            with open(filepath, "wb") as f:
-                f.write(xml_resource)
+            if self.packed_store:
+                self.packed_store.write(identifier, xml_resource)
+            else:
+                os.makedirs(os.path.dirname(filepath), exist_ok=True)
+                with open(filepath, "wb") as f:
+                    f.write(xml_resource)
+            with self._lock:
                 self.files_written += 1
+                if self._identifiers_by_legacy_name is not None:
+                    self._identifiers_by_legacy_name.setdefault(self.normalize_identifier(identifier), set()).add(identifier)
         except:
-            logging.exception(f"Backup for resource {identifier} failed.")
+            logging.exception("Backup for resource %s failed.", identifier)
             return -1
         return 0
 
+    def restore(self, identifier: str) -> bytes | None:
+        """Get the backed up XML of a resource, or None if there's no backup of it.
+
+        A resource that was backed up in the other format (e.g. before 'backup_format' was changed) is
+        found too. If it has backups in both, the one in the current format is used."""
+        if self.packed_store:
+            xml_resource = self.packed_store.read(identifier)
+            if xml_resource is None:
+                xml_resource = self._restore_file(identifier)
+        else:
+            xml_resource = self._restore_file(identifier)
+            if xml_resource is None and self._open_other_packed_store():
+                xml_resource = self._other_packed_store.read(identifier)
+        if xml_resource is None:
+            xml_resource = self._restore_legacy(identifier)
+        return xml_resource
+
+    def close(self):
+        """Finish writing any backups that are waiting."""
+        if self.packed_store:
+            self.packed_store.close()
+        if self._other_packed_store:
+            self._other_packed_store.close()
+            self._other_packed_store = None
+
+    def _restore_file(self, identifier: str) -> bytes | None:
+        filepath = self._filepath(identifier)
+        if os.path.isfile(filepath):
+            with open(filepath, "rb") as f:
+                return f.read()
+        return None
+
+    def _open_other_packed_store(self) -> bool:
+        """Open the packed backups made while 'backup_format' was "packed", if there are any."""
+        filepath = f"{self.backup_location}/backups.sqlite"
+        with self._lock:
+            if self._other_packed_store is None and os.path.isfile(filepath):
+                self._other_packed_store = PackedBackupStore(filepath)
+            return self._other_packed_store is not None
+
+    def _filepath(self, identifier: str) -> str:
+        return f"{self.backup_location}/{self.relative_filepath(identifier)}"
+
+    def _legacy_filepath(self, identifier: str) -> str:
+        """Where older versions of the utility saved the backup of a resource."""
+        return f"{self.backup_location}/{self.normalize_identifier(identifier)}.xml"
+
+    def _restore_legacy(self, identifier: str) -> bytes | None:
+        """Get the backup an older version of the utility made of a resource, or None if there isn't one.
+
+        Older versions could save the backups of different identifiers (e.g. 'A/1' and 'A:1') to the same
+        file. So the file is only used if no other identifier that has been backed up since maps to it;
+        otherwise there's no telling whose backup it is."""
+        filepath = self._legacy_filepath(identifier)
+        if not os.path.isfile(filepath):
+            return None
+
+        with self._lock:
+            if self._identifiers_by_legacy_name is None:
+                self._identifiers_by_legacy_name = {}
+                for folder in os.scandir(self.backup_location):
+                    if not folder.is_dir():
+                        continue
+                    for file in os.scandir(folder.path):
+                        other_identifier = self.decode_identifier(file.name)
+                        self._identifiers_by_legacy_name.setdefault(self.normalize_identifier(other_identifier), set()).add(other_identifier)
+            others = self._identifiers_by_legacy_name.get(self.normalize_identifier(identifier), set()) - {identifier}
+
+        if others:
+            logging.warning("The old backup %s of resource %s may be the backup of %s instead, so it isn't used.",
+                            filepath, identifier, ", ".join(sorted(others)))
+            return None
+        with open(filepath, "rb") as f:
+            return f.read()
+
+    @staticmethod
+    def relative_filepath(identifier: str) -> str:
+        """The path (relative to the backup or dry run folder) of the file for a resource.
+
+        Files are spread over 256 sub-folders by a hash of the identifier, so that no folder gets too big
+        on large jobs. The file name is the encoded identifier (see 'encode_identifier')."""
+        identifier_hash = _identifier_hash(identifier)
+        return f"{identifier_hash[:2]}/{_encode_identifier(identifier, identifier_hash)}.xml"
+
+    @staticmethod
+    def encode_identifier(identifier: str) -> str:
+        """Turn a resource identifier into a file name (without an extension) that no other identifier
+        maps to, and that can be turned back into the identifier with 'decode_identifier'.
+
+        Characters that aren't allowed in file names (and '%') are percent-encoded, so the name is still
+        easy to recognise when spot checking. A short hash of the identifier is added to the end, so that
+        identifiers that only differ in case don't share a file on case-insensitive file systems."""
+        return _encode_identifier(identifier, _identifier_hash(identifier))
+
+    @staticmethod
+    def decode_identifier(filename: str) -> str:
+        """Get the resource identifier back from a file name made by 'encode_identifier' (with or without
+        the '.xml' extension)."""
+        filename = os.path.basename(filename).removesuffix(".xml")
+        return unquote(filename.rpartition("~")[0])
+
     @staticmethod
     def normalize_identifier(identifier: str):
         """This takes a resource identifier (e.g., a user ID) and removes characters that
-        are not allowed as part of file names. 
-        
-        This will allow the file names of backups to be more easily identifiable for spot 
-        checking, and will ensure that they can be properly saved."""
+        are not allowed as part of file names.
+
+        This is how backups used to be named. Different identifiers can be normalized to the same
+        name, so it's only used to find backups made by older versions; see 'encode_identifier'."""
         disallowed_chars: set = (
             "*", "/", "\\", ":", "?", '"', "'", ">", "<", "|", ".")
 
@@ -46,3 +173,20 @@ class Backup():
             normalized_identifier = normalized_identifier.replace(char, "_")
 
         return normalized_identifier
+
+
+# Characters that can't be (or shouldn't be) used in file names on some operating systems. '%' is included
+# so that the encoding can be reversed.
+_CHARS_TO_ENCODE = re.compile(r'[%*/\\:?"\'<>|\x00-\x1f]')
+_ENCODED_CHARS = {chr(code): f"%{code:02X}" for code in [*range(32), *map(ord, '%*/\\:?"\'<>|')]}
+
+
+def _identifier_hash(identifier: str) -> str:
+    return hashlib.sha256(identifier.encode("utf-8")).hexdigest()
+
+
+def _encode_identifier(identifier: str, identifier_hash: str) -> str:
+    # Most identifiers don't have anything to encode, and searching is much quicker than substituting.
+    if _CHARS_TO_ENCODE.search(identifier):
+        identifier = _CHARS_TO_ENCODE.sub(lambda match: _ENCODED_CHARS[match.group()], identifier)
+    return f"{identifier}~{identifier_hash[:8]}"
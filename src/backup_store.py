@@ -0,0 +1,90 @@
+import gzip
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+
+class PackedBackupStore:
+    """Backup store that keeps every backup of a project in one SQLite file, gzip-compressed and indexed by
+    resource identifier, instead of one XML file per resource. Any one resource can be read back with 'read'.
+
+    Writes go through a background thread that commits whatever backups are waiting in one transaction (a
+    group commit), so worker threads backing up resources at the same time share the cost of syncing to disk.
+    'write' only returns once its backup is committed, so a resource is never updated before it's backed up.
+    If a resource is backed up again (e.g. in a later run), the newer backup replaces the older one, like it
+    does with backup files. This is safe to share between threads."""
+    def __init__(self, filepath: str, max_batch_size: int = 256):
+        self.filepath = filepath
+        self.max_batch_size = max_batch_size
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(filepath, check_same_thread=False)
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=FULL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS backups (identifier TEXT PRIMARY KEY, backed_up_at REAL, xml BLOB)")
+            self._connection.commit()
+
+        self._queue: queue.Queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_batches, name="backup_writer", daemon=True)
+        self._writer.start()
+
+    def write(self, identifier: str, xml: bytes):
+        """Back up a resource, waiting until it's committed. Raises if it couldn't be written."""
+        # Compress in the calling thread, so that several threads can compress at once.
+        future = Future()
+        self._queue.put((identifier, time.time(), gzip.compress(xml, mtime=0), future))
+        future.result()
+
+    def read(self, identifier: str) -> bytes | None:
+        """Get the backed up XML of a resource, or None if it hasn't been backed up."""
+        with self._lock:
+            row = self._connection.execute("SELECT xml FROM backups WHERE identifier = ?", (identifier,)).fetchone()
+        return gzip.decompress(row[0]) if row else None
+
+    def identifiers(self) -> list[str]:
+        """The identifiers of every resource that has been backed up."""
+        with self._lock:
+            return [row[0] for row in self._connection.execute("SELECT identifier FROM backups ORDER BY backed_up_at")]
+
+    def close(self):
+        """Finish writing the backups that are waiting, and close the file."""
+        self._queue.put(None)
+        self._writer.join()
+        with self._lock:
+            self._connection.close()
+
+    def _write_batches(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            # Take everything else that's waiting, so that it's all committed together.
+            batch = [item]
+            while len(batch) < self.max_batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                with self._lock:
+                    self._connection.executemany("INSERT OR REPLACE INTO backups VALUES (?, ?, ?)",
+                                                 [(identifier, backed_up_at, xml) for identifier, backed_up_at, xml, _ in batch])
+                    self._connection.commit()
+            except Exception as e:
+                with self._lock:
+                    self._connection.rollback()
+                for *_, future in batch:
+                    future.set_exception(e)
+            else:
+                for *_, future in batch:
+                    future.set_result(None)
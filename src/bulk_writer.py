@@ -0,0 +1,66 @@
+import logging
+import requests
+
+from .api_resource import ApiResource, ResourceStatus
+from .rate_limiter import QuotaExhaustedError
+
+
+class BulkWriter:
+    """Class that sends updated resources to the API in batches, for APIs that can take many resources in
+    one request, instead of one PUT per resource.
+
+    The request itself is made by the user's 'bulk_write_function' (see project_settings.py), which gets
+    the run's session and a batch of (resource ID, updated XML) pairs. It returns a dict of resource ID to
+    result: True if the resource was updated, False if it wasn't, or the resource's XML from the API's
+    response if it was updated and should be compared. Resources missing from the results are failed.
+
+    This isn't thread-safe; the pipeline only uses it from the thread the run is started from."""
+    def __init__(self, bulk_write_function: callable, session: requests.Session, batch_size: int = 100):
+        self.bulk_write_function = bulk_write_function
+        self.session = session
+        self.batch_size = max(1, batch_size)
+        self.batch: list[ApiResource] = []
+
+    def add(self, api_resource: ApiResource) -> list[ApiResource]:
+        """Add a resource to the current batch. Once the batch is full it's written, and its resources
+        are returned with their status set. Until then, an empty list is returned."""
+        self.batch.append(api_resource)
+        if len(self.batch) >= self.batch_size:
+            return self.flush()
+        return []
+
+    def flush(self) -> list[ApiResource]:
+        """Write whatever is in the current batch, returning its resources with their status set."""
+        batch, self.batch = self.batch, []
+        if not batch:
+            return batch
+
+        logging.info("Writing a batch of %s resources...", len(batch))
+        try:
+            results = self.bulk_write_function(self.session, [(api_resource.identifier, api_resource.xml_for_update_request) for api_resource in batch])
+        except QuotaExhaustedError:
+            raise
+        except Exception as e:
+            logging.exception("The bulk write of %s resources failed.", len(batch))
+            http_status = getattr(e, "response", None).status_code if getattr(e, "response", None) is not None else None
+            for api_resource in batch:
+                api_resource.mark_failed("bulk write", exception=e, http_status=http_status)
+            return batch
+
+        for api_resource in batch:
+            result = results.get(api_resource.identifier) if results else None
+            if result is None:
+                api_resource.mark_failed("bulk write", "Missing from the bulk write results")
+            elif result is False:
+                api_resource.mark_failed("bulk write", "The bulk write reported this resource as not updated")
+            else:
+                if isinstance(result, bytes):
+                    api_resource.update_response = result
+                api_resource.mark_successful()
+
+            if api_resource.status == ResourceStatus.FAILED:
+                logging.warning("Resource %s NOT UPDATED SUCCESSFULLY. %s", api_resource.identifier, api_resource.failure)
+            else:
+                logging.info("Resource %s updated successfully.", api_resource.identifier)
+
+        return batch
@@ -5,88 +5,87 @@ from deepdiff.diff import DeepDiff
 import lxml
 import logging
 import os
+from concurrent.futures import Executor
 
-from .api_resource import ApiResource
+from .api_resource import ApiResource, ResourceStatus
 
-class Comparator:
-    def __init__(self, xpath_of_resource_in_put_response: str | None = None):
-        self.xpath_of_resource_in_put_response = xpath_of_resource_in_put_response
+def diff_xml(xml_before: bytes, xml_after: bytes) -> dict | str:
+    """Find the differences between two versions of a resource's XML. This is the slow part of a
+    comparison, so it's kept at the top level of the module to be able to run in another process."""
+    logging.debug("Running DeepDiff")
+    deepdif_obj = DeepDiff(xmltodict.parse(xml_before), xmltodict.parse(xml_after))
+    differences_dict = json.loads(deepdif_obj.to_json())
 
-    @staticmethod
-    def get_past_comparisons(comparison_filepath: str) -> dict:
-        """Get the past comparisons so that the file can be cumulative.
-        Else, return an empty dict."""
-        if os.path.isfile(comparison_filepath):
-            with open(comparison_filepath, "r") as f:
-                return json.load(f)
-        else: return {}
+    # If there is no difference between the two, add the string "No Difference" instead
+    if len(differences_dict.keys()) == 0:
+        differences_dict = "No Difference"
+        logging.debug("No difference found")
 
-    @staticmethod
-    def write_comparisons(comparison_filepath: str, cumulative_comparisons: dict):
-        """Write API resource comparisons to a specified file."""
-        with open(comparison_filepath, "w") as f:
-            logging.info(f"Saving comparisons to {comparison_filepath}")
-            json.dump(cumulative_comparisons, f, indent=2)
-            logging.info("Done.")
+    return differences_dict
+
+
+class Comparator:
+    def __init__(self, xpath_of_resource_in_put_response: str | None = None, process_pool: Executor | None = None):
+        self.xpath_of_resource_in_put_response = xpath_of_resource_in_put_response
+        # If set, the diffs are run in this pool, so comparisons for several resources can use several CPU cores.
+        self.process_pool = process_pool
 
     def compare(self, existing_comparisons: dict, api_resources: list[ApiResource], dry_run: bool=False) -> dict:
         results: dict = existing_comparisons
         
         for api_resource in api_resources:
-            updated_resource = None
-            logging.debug(f"Comparing {api_resource.identifier}")
-
-            # DRY RUN ----------------------------------------
-            if dry_run:
-                # Only run the process for api resources that aren't failed.
-                if api_resource.status == "failed":
-                    logging.debug("Dry run, skipping, status=failed")
-                    continue
+            comparison = self.compare_resource(api_resource, dry_run)
+            if comparison is not None:
+                results[api_resource.identifier] = comparison
+        
+        return results
 
-                # If there isn't an XML for update request, that means the update
-                # won't be performed.
-                if not api_resource.xml_for_update_request:
-                    results[api_resource.identifier] = "Update will not be performed."
-                    logging.debug("Dry run, skipping, nothing to update")
-                    continue
+    def compare_resource(self, api_resource: ApiResource, dry_run: bool=False) -> dict | str | None:
+        """Compare a single API resource before and after its update. Returns the differences, a string
+        explaining why there's nothing to compare, or None if the resource should be left out of the
+        comparisons altogether (e.g. it failed)."""
+        updated_resource = None
+        logging.debug("Comparing %s", api_resource.identifier)
 
-                updated_resource = api_resource.xml_for_update_request
+        # DRY RUN ----------------------------------------
+        if dry_run:
+            # Only run the process for api resources that aren't failed.
+            if api_resource.status == ResourceStatus.FAILED:
+                logging.debug("Dry run, skipping, status=failed")
+                return None
 
-            # PRODUCTION RUN ----------------------------------
-            else:
-                # Only run the process for api resources that were updated successfully
-                if api_resource.status != "success":
-                    logging.debug("Update run, skipping, status=failed")
-                    continue
+            # If there isn't an XML for update request, that means the update
+            # won't be performed.
+            if not api_resource.xml_for_update_request:
+                logging.debug("Dry run, skipping, nothing to update")
+                return "Update will not be performed."
 
-                # If there's not an update response, but it is still successful, this means
-                # the resource didn't need to be updated.
-                if not api_resource.update_response:
-                    results[api_resource.identifier] = "Update was not run; XML update function returned None indicating update did not need to be performed."
-                    logging.debug("Update run, skipping, nothing to update")
-                    continue
-                
-                updated_resource = api_resource.update_response
+            updated_resource = api_resource.xml_for_update_request
 
-                try:
-                    updated_resource = self.pull_xml_element_from_dict(updated_resource, self.xpath_of_resource_in_put_response, api_resource.identifier)
-                except ValueError as ve:
-                    results[api_resource.identifier] = ve.__str__()
-                    logging.debug("Update run, skipping, updated resource not found")
-                    continue
+        # PRODUCTION RUN ----------------------------------
+        else:
+            # Only run the process for api resources that were updated successfully
+            if api_resource.status != ResourceStatus.SUCCESS:
+                logging.debug("Update run, skipping, status=failed")
+                return None
 
-            logging.debug("Running DeepDiff")
-            deepdif_obj = DeepDiff(xmltodict.parse(api_resource.xml_from_get_request), xmltodict.parse(updated_resource))
-            differences_dict = json.loads(deepdif_obj.to_json())
-        
-            # If there is no difference between the two, add the string "No Difference" instead
-            if len(differences_dict.keys()) == 0:
-                differences_dict = "No Difference"
-                logging.debug("No difference found")
+            # If there's not an update response, but it is still successful, this means
+            # the resource didn't need to be updated.
+            if not api_resource.update_response:
+                logging.debug("Update run, skipping, nothing to update")
+                return "Update was not run; XML update function returned None indicating update did not need to be performed."
             
-            results[api_resource.identifier] = differences_dict
-        
-        return results
+            updated_resource = api_resource.update_response
+
+            try:
+                updated_resource = self.pull_xml_element_from_dict(updated_resource, self.xpath_of_resource_in_put_response, api_resource.identifier)
+            except ValueError as ve:
+                logging.debug("Update run, skipping, updated resource not found")
+                return ve.__str__()
+
+        if self.process_pool:
+            return self.process_pool.submit(diff_xml, api_resource.xml_from_get_request, updated_resource).result()
+        return diff_xml(api_resource.xml_from_get_request, updated_resource)
     
     @staticmethod
     def pull_xml_element_from_dict(xml: bytes, xpath: str, identifier: str) -> bytes:
@@ -98,3 +97,41 @@ class Comparator:
             raise ValueError(f"Could not find xpath '{xpath}' in PUT response for resource '{identifier}'; skipping comparison.")
 
         return lxml.etree.tostring(resource, pretty_print=True)
+
+
+class ComparisonLog:
+    """Comparisons file written one resource at a time, as JSON Lines: each line is an object with the
+    resource's identifier and its comparison. Lines are only ever appended, so a run doesn't need to
+    load or rewrite the comparisons of past runs, and nothing is lost if the run is killed.
+
+    A resource that is compared again in a later run gets a new line; the last line for an identifier
+    is the latest comparison (see 'read_comparisons')."""
+    def __init__(self, comparison_filepath: str):
+        self.comparison_filepath = comparison_filepath
+        self._file = open(comparison_filepath, "a", encoding="utf-8")
+
+    def write(self, identifier: str, comparison: dict | str):
+        """Append one resource's comparison to the file."""
+        self._file.write(json.dumps({"id": identifier, "comparison": comparison}) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    @staticmethod
+    def read_comparisons(comparison_filepath: str) -> dict:
+        """Read a comparisons file into a dict of identifier to comparison, the same shape as the
+        older comparisons.json. Lines cut off by the program being killed are skipped."""
+        comparisons = {}
+        if not os.path.isfile(comparison_filepath):
+            return comparisons
+
+        with open(comparison_filepath, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                comparisons[entry["id"]] = entry["comparison"]
+
+        return comparisons
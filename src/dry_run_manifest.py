@@ -0,0 +1,102 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from .api_resource import ApiResource, ResourceStatus
+
+MANIFEST_FILENAME = "manifest.jsonl"
+
+
+def sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def update_fingerprint(api_resource: ApiResource, xpaths: list[str] | None, operations: list[str] | None) -> str:
+    """A hash of everything (other than the resource itself) that the updated XML was made from, so that a
+    dry run isn't promoted if the update file or the xpaths have changed since."""
+    return sha256(json.dumps([list(api_resource.update_values), xpaths, operations]).encode("utf-8"))
+
+
+class DryRunManifest:
+    """Record of what a dry run did to each resource, saved as 'manifest.jsonl' in the dry run folder: a hash
+    of the XML from the GET request, a fingerprint of the update, and the name of the file holding the updated
+    XML (or None if the resource didn't need updating). Failed resources aren't recorded.
+
+    This is what lets a production run with 'promote_dry_run' send exactly the XML that was reviewed. This
+    is safe to share between threads."""
+    def __init__(self, dry_run_folder: str, xpaths: list[str] | None = None, operations: list[str] | None = None):
+        self.filepath = os.path.join(dry_run_folder, MANIFEST_FILENAME)
+        self.xpaths = xpaths
+        self.operations = operations
+        self._lock = threading.Lock()
+        self._file = open(self.filepath, "a", encoding="utf-8")
+
+    def record(self, api_resource: ApiResource, updated_xml_filename: str | None):
+        """Record a resource that has been through the dry run."""
+        entry = {
+            "id": api_resource.identifier,
+            "get_sha256": sha256(api_resource.xml_from_get_request),
+            "update_fingerprint": update_fingerprint(api_resource, self.xpaths, self.operations),
+            "file": updated_xml_filename,
+        }
+        with self._lock:
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class DryRunPromoter:
+    """Uses the results of a dry run in a production run, instead of updating the XML again.
+
+    The resource is still retrieved, and its XML is checked against the hash saved by the dry run. If the
+    resource (or its update values, or the xpaths) changed since the dry run, it's failed rather than sent,
+    since what would be sent is no longer what was reviewed. Resources that weren't in the dry run are
+    failed too."""
+    def __init__(self, dry_run_folder: str, xpaths: list[str] | None = None, operations: list[str] | None = None):
+        self.dry_run_folder = dry_run_folder
+        self.xpaths = xpaths
+        self.operations = operations
+
+        manifest_filepath = os.path.join(dry_run_folder, MANIFEST_FILENAME)
+        if not os.path.isfile(manifest_filepath):
+            raise FileNotFoundError(f"There's no dry run to promote ('{manifest_filepath}' does not exist). Do a dry run first.")
+
+        self.entries: dict[str, dict] = {}
+        with open(manifest_filepath, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Cut off by the dry run being killed.
+                    continue
+                self.entries[entry["id"]] = entry
+
+    def promote(self, api_resource: ApiResource) -> ApiResource:
+        """Set the resource's XML for the update request to the XML from the dry run, or fail the resource
+        if that can't be done safely."""
+        if api_resource.status != ResourceStatus.PENDING or not api_resource.xml_from_get_request:
+            return api_resource
+
+        entry = self.entries.get(api_resource.identifier)
+        if entry is None:
+            api_resource.mark_failed("promote", "The resource was not in the dry run")
+        elif entry["get_sha256"] != sha256(api_resource.xml_from_get_request):
+            api_resource.mark_failed("promote", "The resource has changed since the dry run")
+        elif entry["update_fingerprint"] != update_fingerprint(api_resource, self.xpaths, self.operations):
+            api_resource.mark_failed("promote", "The update values or xpaths have changed since the dry run")
+        elif entry["file"] is None:
+            logging.info("Skipping update request for resource '%s' because the dry run found nothing to update. Marking it as complete.", api_resource.identifier)
+            api_resource.mark_successful()
+        else:
+            with open(os.path.join(self.dry_run_folder, entry["file"]), "rb") as f:
+                api_resource.xml_for_update_request = f.read()
+
+        if api_resource.status == ResourceStatus.FAILED:
+            logging.warning("Resource %s was not promoted: %s", api_resource.identifier, api_resource.failure.message)
+
+        return api_resource
@@ -14,12 +14,50 @@ class Settings:
         self.xpath_operations: str | list[str] | None = None
 
         self.dry_run: bool = None
+        self.promote_dry_run: bool = None
         self.update_limit: int | None = None
         self.retry_failed: bool = None
+        self.progress_compaction_interval: int = None
+        self.max_concurrency: int = None
+        self.max_consecutive_failures: int | None = None
+        self.cpu_workers: int | None = None
+
+        self.http_pool_size: int = None
+        self.http_connect_retries: int = None
+        self.http_keep_alive: bool = None
+        self.http_timeout: float | tuple[float, float] | None = None
+
+        self.requests_per_second: float | None = None
+        self.rate_limit_burst: int = None
+        self.daily_request_limit: int | None = None
+        self.remaining_quota_header: str | None = None
+        self.min_remaining_quota: int = None
+        self.max_throttled_retries: int = None
+
+        self.max_attempts: int = None
+        self.retry_backoff_factor: float = None
+        self.retry_max_backoff: float = None
+        self.retry_on_status_codes: list[int] = None
+
+        self.backup_format: str = None
+
+        self.use_response_cache: bool = None
+        self.response_cache_ttl: float | None = None
+
+        self.prometheus_textfile: str | None = None
+
+        self.log_level: str = None
+        self.log_format: str = None
+        self.log_max_bytes: int | None = None
+        self.log_backup_count: int = None
 
         self.use_custom_xml_update_function: bool = None
         self.custom_xml_update_function: callable = None
 
+        self.use_bulk_writer: bool = None
+        self.bulk_batch_size: int = None
+        self.bulk_write_function: callable = None
+
 
 def get_configuration(project_path: str):
     """Reads the user-defined settings from the module in their project folder. Also validates
@@ -58,6 +96,77 @@ def get_configuration(project_path: str):
             expanded_operations.append(operation_to_do_for_all_xpaths)
     else: expanded_operations = None
 
+    # Settings added after the first release are optional, so that older project_settings.py files keep working.
+    max_concurrency = getattr(project_settings, "max_concurrency", 1)
+    if max_concurrency is None:
+        max_concurrency = 1
+    if not isinstance(max_concurrency, int) or max_concurrency < 1:
+        raise ValueError("max_concurrency must be a whole number of at least 1")
+
+    cpu_workers = getattr(project_settings, "cpu_workers", None)
+    if cpu_workers is not None and (not isinstance(cpu_workers, int) or cpu_workers < 1):
+        raise ValueError("cpu_workers must be a whole number of at least 1, or None to not use extra processes")
+
+    # Keep at least one pooled connection per worker thread.
+    http_pool_size = getattr(project_settings, "http_pool_size", None)
+    if http_pool_size is None:
+        http_pool_size = max(10, max_concurrency)
+    if not isinstance(http_pool_size, int) or http_pool_size < 1:
+        raise ValueError("http_pool_size must be a whole number of at least 1")
+
+    http_timeout = getattr(project_settings, "http_timeout", (10, 60))
+    if isinstance(http_timeout, list):
+        http_timeout = tuple(http_timeout)
+    timeout_values = http_timeout if isinstance(http_timeout, tuple) else (http_timeout,)
+    if http_timeout is not None and (len(timeout_values) not in (1, 2) or
+                                     not all(isinstance(value, (int, float)) and value > 0 for value in timeout_values)):
+        raise ValueError("http_timeout must be a number of seconds, a pair of them (connect, read), or None for no timeout")
+
+    requests_per_second = getattr(project_settings, "requests_per_second", None)
+    if requests_per_second is not None and (not isinstance(requests_per_second, (int, float)) or requests_per_second <= 0):
+        raise ValueError("requests_per_second must be a positive number, or None for no limit")
+
+    max_attempts = getattr(project_settings, "max_attempts", 3)
+    if not isinstance(max_attempts, int) or max_attempts < 1:
+        raise ValueError("max_attempts must be a whole number of at least 1")
+
+    backup_format = getattr(project_settings, "backup_format", "files")
+    if backup_format not in ("files", "packed"):
+        raise ValueError("backup_format must be 'files' or 'packed'")
+
+    response_cache_ttl = getattr(project_settings, "response_cache_ttl", 3600)
+    if response_cache_ttl is not None and (not isinstance(response_cache_ttl, (int, float)) or response_cache_ttl < 0):
+        raise ValueError("response_cache_ttl must be a number of seconds, or None")
+
+    prometheus_textfile = getattr(project_settings, "prometheus_textfile", None)
+    if prometheus_textfile is not None and (not isinstance(prometheus_textfile, str) or not prometheus_textfile.endswith(".prom")):
+        raise ValueError("prometheus_textfile must be the path of a file ending in '.prom', or None")
+
+    log_level = getattr(project_settings, "log_level", "INFO")
+    if log_level not in ("DEBUG", "INFO", "WARNING", "ERROR"):
+        raise ValueError("log_level must be 'DEBUG', 'INFO', 'WARNING' or 'ERROR'")
+
+    log_format = getattr(project_settings, "log_format", "text")
+    if log_format not in ("text", "json"):
+        raise ValueError("log_format must be 'text' or 'json'")
+
+    log_max_bytes = getattr(project_settings, "log_max_bytes", 100 * 2**20)
+    if log_max_bytes is not None and (not isinstance(log_max_bytes, int) or log_max_bytes < 1):
+        raise ValueError("log_max_bytes must be a whole number of at least 1, or None")
+
+    log_backup_count = getattr(project_settings, "log_backup_count", 10)
+    if not isinstance(log_backup_count, int) or log_backup_count < 1:
+        raise ValueError("log_backup_count must be a whole number of at least 1")
+
+    use_bulk_writer = getattr(project_settings, "use_bulk_writer", False)
+    bulk_write_function = getattr(project_settings, "bulk_write_function", None)
+    if use_bulk_writer and not callable(bulk_write_function):
+        raise ValueError("If use_bulk_writer is True, bulk_write_function must be defined")
+
+    bulk_batch_size = getattr(project_settings, "bulk_batch_size", 100)
+    if not isinstance(bulk_batch_size, int) or bulk_batch_size < 1:
+        raise ValueError("bulk_batch_size must be a whole number of at least 1")
+
     # ---------------- INSTANTIATING THE SETTINGS OBJECT -----------------
 
     settings = Settings()
@@ -69,9 +178,39 @@ def get_configuration(project_path: str):
     settings.xpaths = xpaths
     settings.xpath_operations = expanded_operations
     settings.dry_run = project_settings.dry_run
+    settings.promote_dry_run = getattr(project_settings, "promote_dry_run", False)
     settings.update_limit = project_settings.update_limit
     settings.retry_failed = project_settings.retry_failed
+    settings.progress_compaction_interval = getattr(project_settings, "progress_compaction_interval", 1000)
+    settings.max_concurrency = max_concurrency
+    settings.max_consecutive_failures = getattr(project_settings, "max_consecutive_failures", 50)
+    settings.cpu_workers = cpu_workers
+    settings.http_pool_size = http_pool_size
+    settings.http_connect_retries = getattr(project_settings, "http_connect_retries", 0)
+    settings.http_keep_alive = getattr(project_settings, "http_keep_alive", True)
+    settings.http_timeout = http_timeout
+    settings.requests_per_second = requests_per_second
+    settings.rate_limit_burst = getattr(project_settings, "rate_limit_burst", 1)
+    settings.daily_request_limit = getattr(project_settings, "daily_request_limit", None)
+    settings.remaining_quota_header = getattr(project_settings, "remaining_quota_header", "X-Exl-Api-Remaining")
+    settings.min_remaining_quota = getattr(project_settings, "min_remaining_quota", 0)
+    settings.max_throttled_retries = getattr(project_settings, "max_throttled_retries", 5)
+    settings.max_attempts = max_attempts
+    settings.retry_backoff_factor = getattr(project_settings, "retry_backoff_factor", 0.5)
+    settings.retry_max_backoff = getattr(project_settings, "retry_max_backoff", 30)
+    settings.retry_on_status_codes = getattr(project_settings, "retry_on_status_codes", [500, 502, 503, 504])
+    settings.backup_format = backup_format
+    settings.use_response_cache = getattr(project_settings, "use_response_cache", False)
+    settings.response_cache_ttl = response_cache_ttl
+    settings.prometheus_textfile = prometheus_textfile
+    settings.log_level = log_level
+    settings.log_format = log_format
+    settings.log_max_bytes = log_max_bytes
+    settings.log_backup_count = log_backup_count
     settings.use_custom_xml_update_function = project_settings.use_custom_xml_update_function
     settings.custom_xml_update_function = project_settings.custom_xml_update_function
+    settings.use_bulk_writer = use_bulk_writer
+    settings.bulk_batch_size = bulk_batch_size
+    settings.bulk_write_function = bulk_write_function
 
     return settings
\ No newline at end of file
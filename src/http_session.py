@@ -0,0 +1,66 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .metrics import RunMetrics
+from .rate_limiter import RateLimiter, RateLimitedAdapter
+
+
+class TimeoutAdapter(HTTPAdapter):
+    """HTTP adapter that gives up on requests that take too long, unless the request sets its own timeout.
+    'timeout' is in seconds, either one number or (time to connect, time to wait for the server to
+    send data)."""
+    def __init__(self, timeout: float | tuple[float, float] | None = None, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+class _RateLimitedTimeoutAdapter(TimeoutAdapter, RateLimitedAdapter):
+    """Rate limited adapter with a timeout. The timeout applies to each request sent, including ones sent
+    again after a 429."""
+
+
+def create_session(pool_size: int = 10, connect_retries: int = 0, keep_alive: bool = True,
+                   rate_limiter: RateLimiter | None = None, max_throttled_retries: int = 5,
+                   metrics: RunMetrics | None = None, timeout: float | tuple[float, float] | None = (10, 60)) -> requests.Session:
+    """Create the HTTP session shared by the GET and PUT requests of a run.
+
+    The session keeps a pool of open connections to the API, so that each request doesn't need to
+    open a new TCP/TLS connection. 'pool_size' should be at least the number of resources worked on
+    at once, otherwise worker threads will open and throw away extra connections.
+
+    'connect_retries' is how many times to retry a request that could not connect to the server at all.
+    These are always safe to retry because nothing reached the API.
+
+    If a rate limiter is passed, every request made through the session waits for it, and requests
+    answered with a 429 are sent again up to 'max_throttled_retries' times.
+
+    If run metrics are passed, every response is recorded in them.
+
+    Requests that take longer than 'timeout' (see TimeoutAdapter) raise requests.Timeout (or
+    requests.ConnectionError), so that a connection that stops responding can't hold up a worker thread
+    forever. The retry policy retries these like other connection problems."""
+    session = requests.Session()
+
+    retries = Retry(total=connect_retries, connect=connect_retries, read=0, status=0, other=0,
+                    backoff_factor=0.5, raise_on_status=False)
+    if rate_limiter:
+        adapter = _RateLimitedTimeoutAdapter(rate_limiter=rate_limiter, max_throttled_retries=max_throttled_retries, timeout=timeout,
+                                             pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+    else:
+        adapter = TimeoutAdapter(timeout=timeout, pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+
+    if metrics:
+        session.hooks["response"].append(metrics.observe_response)
+
+    return session
@@ -0,0 +1,200 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator
+
+import requests
+
+from .api_resource import ApiResource
+
+
+class Histogram:
+    """Counts of how long something took, in buckets (Prometheus' default buckets, plus some shorter ones
+    for the stages that don't wait on the API and some longer ones), along with the total and the longest
+    time."""
+    BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0, 30.0, 60.0)
+
+    def __init__(self):
+        # The last count is for anything longer than the last bucket.
+        self.bucket_counts = [0] * (len(self.BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.bucket_counts[bisect_left(self.BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, percent: float) -> float:
+        """An upper bound on the given percentile: the top of the bucket it falls in."""
+        if not self.count:
+            return 0.0
+        target = self.count * percent / 100
+        seen = 0
+        for upper_bound, bucket_count in zip(self.BUCKETS, self.bucket_counts):
+            seen += bucket_count
+            if seen >= target:
+                return min(upper_bound, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "total_seconds": round(self.sum, 6),
+            "mean_ms": round(self.sum / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50) * 1000, 3),
+            "p90_ms": round(self.percentile(90) * 1000, 3),
+            "p99_ms": round(self.percentile(99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class RunMetrics:
+    """Timers and counters for a run, for finding out where a run spends its time.
+
+    Collects how long each stage of the pipeline took for each resource (GET, verify, backup, update, PUT,
+    compare...), how long each HTTP request took, the status codes of the responses, the bytes sent and
+    received, retries, and how many resources succeeded or failed (and at which stage). At the end of a
+    run, these are written as a JSON summary, and optionally as a Prometheus textfile (for node_exporter's
+    textfile collector).
+
+    HTTP requests are measured by adding 'observe_response' to the session's response hooks. Requests that
+    the rate limiter sends again after a 429 are only counted once, with their last response. This is safe
+    to share between threads."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+
+        self.stage_seconds: dict[str, Histogram] = {}
+        self.request_seconds: dict[str, Histogram] = {}
+        self.resource_seconds = Histogram()
+        # (method, status code) -> number of responses
+        self.http_responses: Counter[tuple[str, int]] = Counter()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.resources: Counter[str] = Counter()
+        self.failures: Counter[str] = Counter()
+        self.retries: Counter[str] = Counter()
+
+    @contextmanager
+    def time_stage(self, stage: str) -> Iterator[None]:
+        """Time a stage of the pipeline for one resource."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - start)
+
+    def observe_stage(self, stage: str, seconds: float):
+        with self._lock:
+            self.stage_seconds.setdefault(stage, Histogram()).observe(seconds)
+
+    def observe_resource(self, seconds: float):
+        """Record how long a resource took to go through the whole pipeline."""
+        with self._lock:
+            self.resource_seconds.observe(seconds)
+
+    def observe_response(self, response: requests.Response, *args, **kwargs) -> requests.Response:
+        """Response hook for the session (see requests' event hooks)."""
+        request_body = response.request.body if response.request is not None else None
+        method = response.request.method if response.request is not None else "unknown"
+        with self._lock:
+            self.http_responses[(method, response.status_code)] += 1
+            self.request_seconds.setdefault(method, Histogram()).observe(response.elapsed.total_seconds())
+            self.bytes_sent += len(request_body) if request_body else 0
+            self.bytes_received += len(response.content or b"")
+        return response
+
+    def record_resource(self, api_resource: ApiResource):
+        """Count a finished resource: its status, where it failed, and how many requests had to be retried."""
+        with self._lock:
+            self.resources[api_resource.status] += 1
+            if api_resource.failure:
+                self.failures[api_resource.failure.stage] += 1
+            for request_name, attempts in api_resource.attempts.items():
+                if attempts > 1:
+                    self.retries[request_name] += attempts - 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            elapsed = time.perf_counter() - self._started
+            finished = sum(self.resources.values())
+            return {
+                "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self.started_at)),
+                "elapsed_seconds": round(elapsed, 3),
+                "resources": dict(self.resources),
+                "resources_per_second": round(finished / elapsed, 3) if elapsed else 0.0,
+                "failures_by_stage": dict(self.failures),
+                "retries": dict(self.retries),
+                "resource_seconds": self.resource_seconds.summary(),
+                "stage_seconds": {stage: histogram.summary() for stage, histogram in self.stage_seconds.items()},
+                "http": {
+                    "responses": {f"{method} {status_code}": count for (method, status_code), count in sorted(self.http_responses.items())},
+                    "request_seconds": {method: histogram.summary() for method, histogram in self.request_seconds.items()},
+                    "bytes_sent": self.bytes_sent,
+                    "bytes_received": self.bytes_received,
+                },
+            }
+
+    def write_json(self, filepath: str):
+        """Save the summary of the run as JSON."""
+        _write_atomically(filepath, json.dumps(self.summary(), indent=2))
+
+    def write_prometheus(self, filepath: str, labels: dict[str, str] | None = None):
+        """Save the metrics in Prometheus' text format. The file is replaced in one step, as node_exporter's
+        textfile collector needs."""
+        with self._lock:
+            lines = []
+            common_labels = labels if labels else {}
+
+            def add_histogram(name: str, help_text: str, histograms: dict[str, Histogram], label_name: str):
+                lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} histogram"])
+                for label_value, histogram in sorted(histograms.items()):
+                    series_labels = {**common_labels, label_name: label_value} if label_name else common_labels
+                    cumulative = 0
+                    for upper_bound, bucket_count in zip([*Histogram.BUCKETS, "+Inf"], histogram.bucket_counts):
+                        cumulative += bucket_count
+                        lines.append(f"{name}_bucket{_labels({**series_labels, 'le': str(upper_bound)})} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(series_labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{_labels(series_labels)} {histogram.count}")
+
+            def add_counter(name: str, help_text: str, values: dict[tuple, int], label_names: tuple[str, ...]):
+                lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} counter"])
+                for label_values, value in sorted(values.items()):
+                    lines.append(f"{name}{_labels({**common_labels, **dict(zip(label_names, label_values))})} {value}")
+
+            add_histogram("api_update_stage_seconds", "Time spent in each stage of the pipeline, per resource.", self.stage_seconds, "stage")
+            add_histogram("api_update_resource_seconds", "Time for a resource to go through the whole pipeline.", {"": self.resource_seconds}, "")
+            add_histogram("api_update_http_request_seconds", "Time for the API to answer a request.", self.request_seconds, "method")
+            add_counter("api_update_http_responses_total", "Responses from the API, by method and status code.",
+                        {(method, str(status_code)): count for (method, status_code), count in self.http_responses.items()}, ("method", "status"))
+            add_counter("api_update_http_sent_bytes_total", "Bytes sent to the API in request bodies.", {(): self.bytes_sent}, ())
+            add_counter("api_update_http_received_bytes_total", "Bytes received from the API in response bodies.", {(): self.bytes_received}, ())
+            add_counter("api_update_resources_total", "Finished resources, by status.", {(str(status),): count for status, count in self.resources.items()}, ("status",))
+            add_counter("api_update_failures_total", "Failed resources, by the stage they failed in.", {(stage,): count for stage, count in self.failures.items()}, ("stage",))
+            add_counter("api_update_retries_total", "Requests that were sent again, by request.", {(request_name,): count for request_name, count in self.retries.items()}, ("request",))
+
+        _write_atomically(filepath, "\n".join(lines) + "\n")
+
+
+def _labels(labels: dict[str, str]) -> str:
+    """Format labels for the Prometheus text format, e.g. {stage="GET"}."""
+    if not labels:
+        return ""
+    escaped = {name: str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for name, value in labels.items()}
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped.items()) + "}"
+
+
+def _write_atomically(filepath: str, text: str):
+    """Write the file next to where it's going, then swap it in, so nothing ever reads a half-written file."""
+    temp_filepath = f"{filepath}.tmp"
+    with open(temp_filepath, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp_filepath, filepath)
@@ -1,34 +1,165 @@
 from __future__ import annotations
 import csv
+import os
+import threading
 from copy import deepcopy
 
-from src.api_resource import ApiResource
+from src.api_resource import ApiResource, ResourceStatus
 
 class ProgressManager:
     """Class to manage which API resources have already been acted on so that we don't try
-     to perform a production update twice."""
-    def __init__(self, project_path: str, retry_failed: bool = False):
-        self.progress_file_name = f"{project_path}/progress.csv"
-        self.previously_completed_api_resources, self.previous_state = self._parse_application_progress(
+     to perform a production update twice.
+
+     Progress is written as each resource finishes: a line is appended to a journal file and flushed
+     to disk, so that nothing is lost if the program is killed. Every 'compaction_interval' resources
+     (and when the progress manager is closed), the journal is moved into 'progress.csv'. A journal
+     left behind by a run that didn't get to close is moved into 'progress.csv' on startup.
+
+     'progress_name' changes the names of these files, to track the progress of something other than
+     the update (e.g. 'restore_progress' for restores). The file is created if it doesn't exist."""
+    def __init__(self, project_path: str, retry_failed: bool = False, compaction_interval: int = 1000, progress_name: str = "progress"):
+        self.progress_file_name = f"{project_path}/{progress_name}.csv"
+        self.journal_file_name = f"{project_path}/{progress_name}_journal.csv"
+        self.compaction_interval = compaction_interval
+
+        if not os.path.exists(self.progress_file_name):
+            self._write_state(self.progress_file_name, [])
+
+        self._lock = threading.Lock()
+        self._journal_file = None
+        self._journal_writer = None
+        self._entries_since_compaction = 0
+
+        self._rewrite_on_compaction = False
+        self.compact()
+        # Maps the ID of each finished resource to its status. This is checked for every row of the update
+        # file, so it needs constant-time lookups.
+        self.previously_completed_api_resources, rows_in_progress_file = self._parse_application_progress(
             self.progress_file_name, retry_failed=retry_failed)
 
+        # Failed resources that are being retried are no longer part of the progress, so the first
+        # compaction rewrites the file without them instead of appending to it.
+        self._rewrite_on_compaction = retry_failed and len(self.previously_completed_api_resources) < rows_in_progress_file
+
+    @property
+    def previous_state(self) -> list[dict]:
+        """The progress from before this run, as rows of the progress file."""
+        return [{"ID": identifier, "Status": status} for identifier, status in self.previously_completed_api_resources.items()]
+
+    def record(self, api_resource: ApiResource):
+        """Record the outcome of a production update as soon as it's known. Pending resources are
+        ignored, since nothing was done to them."""
+        if api_resource.status == ResourceStatus.PENDING:
+            return
+
+        with self._lock:
+            if self._journal_file is None:
+                self._journal_file = open(self.journal_file_name, "a", newline="", encoding="utf-8")
+                self._journal_writer = csv.writer(self._journal_file)
+            self._journal_writer.writerow([api_resource.identifier, api_resource.status])
+            self._journal_file.flush()
+            os.fsync(self._journal_file.fileno())
+            self._entries_since_compaction += 1
+
+            if self._entries_since_compaction >= self.compaction_interval:
+                self._compact()
+
+    def compact(self):
+        """Move the progress in the journal into 'progress.csv'."""
+        with self._lock:
+            self._compact()
+
+    def close(self):
+        """Move the last of the journal into 'progress.csv'. Call this at the end of a run."""
+        self.compact()
+
+    def _compact(self):
+        """Append the journal to 'progress.csv' and remove it. Must be called with the lock held.
+
+        If the program is killed part way through this, some entries may end up in 'progress.csv'
+        twice, which does no harm."""
+        if self._journal_file is not None:
+            self._journal_file.close()
+            self._journal_file = None
+            self._journal_writer = None
+        self._entries_since_compaction = 0
+
+        if not os.path.exists(self.journal_file_name):
+            return
+
+        with open(self.journal_file_name, "r", newline="", encoding="utf-8") as journal:
+            # A line cut off part way through by a crash can't be trusted, so it's dropped.
+            entries = [row for row in csv.reader(journal) if len(row) == 2 and row[1] in ("success", "failed")]
+
+        if entries and self._rewrite_on_compaction:
+            self._write_state(self.progress_file_name, self.previous_state + [{"ID": entry[0], "Status": entry[1]} for entry in entries])
+            self._rewrite_on_compaction = False
+        elif entries:
+            self._append_entries(self.progress_file_name, entries)
+
+        os.remove(self.journal_file_name)
+
+    def merge(self, progress: dict[str, str]):
+        """Add progress that was saved somewhere else (e.g. by the shards of a project), mapping resource IDs
+        to their status, and rewrite 'progress.csv' with it. Where a resource is in both, the status in
+        'progress' wins, unless the resource was already updated successfully: that can't be undone by
+        progress that may be older. Merging the same progress again changes nothing."""
+        with self._lock:
+            self._compact()
+            state, _ = self._parse_application_progress(self.progress_file_name, retry_failed=False)
+            state.update((identifier, status) for identifier, status in progress.items()
+                         if state.get(identifier) != "success")
+            self._write_state(self.progress_file_name, [{"ID": identifier, "Status": status} for identifier, status in state.items()])
+            self._rewrite_on_compaction = False
+
     def save_state(self, api_resources: list[ApiResource]):
-        """Saves the state of the production run. This will add any successful or failed production
-        updates to the 'progress.csv' file."""
+        """Saves the state of the production run by rewriting the 'progress.csv' file with the previous
+        state plus any successful or failed production updates.
+        
+        Runs record their progress as they go with 'record' instead; this is for writing a whole state
+        at once."""
 
         # Create new state by adding successful or failed production updates to the state before the
         # program started.
         new_state = self._get_new_state(self.previous_state, api_resources)
+        self._write_state(self.progress_file_name, new_state)
 
-        with open(self.progress_file_name, "w", newline="", encoding="utf-8-sig") as csv_file:
+    @staticmethod
+    def _write_state(progress_file_name: str, state: list[dict]):
+        """Rewrite the progress file with the given state. The new file is written next to the old one
+        and then swapped in, so a crash part way through can't leave a half-written progress file."""
+        temp_file_name = f"{progress_file_name}.tmp"
+        with open(temp_file_name, "w", newline="", encoding="utf-8-sig") as csv_file:
             writer = csv.DictWriter(csv_file, fieldnames=["ID", "Status"])
             writer.writeheader()
 
-            for api_resource in new_state:
+            for api_resource in state:
                 writer.writerow({
                     "ID": api_resource["ID"],
                     "Status": api_resource["Status"]
                 })
+            csv_file.flush()
+            os.fsync(csv_file.fileno())
+
+        os.replace(temp_file_name, progress_file_name)
+
+    @staticmethod
+    def _append_entries(progress_file_name: str, entries: list[list[str]]):
+        """Append ID/status rows to the end of the progress file and flush them to disk."""
+        # The last row of a progress file written by hand (or by an older version) may not end in a newline.
+        needs_newline = False
+        with open(progress_file_name, "rb") as f:
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) not in (b"\n", b"\r")
+
+        with open(progress_file_name, "a", newline="", encoding="utf-8-sig") as csv_file:
+            if needs_newline:
+                csv_file.write("\r\n")
+            writer = csv.writer(csv_file)
+            writer.writerows(entries)
+            csv_file.flush()
+            os.fsync(csv_file.fileno())
 
     @staticmethod
     def _get_new_state(previous_state: list[dict], api_resources: list[ApiResource]):
@@ -41,7 +172,7 @@ class ProgressManager:
         new_state = deepcopy(previous_state)
 
         for completed_api_resource in api_resources:
-            if completed_api_resource.status == "pending":
+            if completed_api_resource.status == ResourceStatus.PENDING:
                 continue
             else:
                 new_state.append({
@@ -52,25 +183,27 @@ class ProgressManager:
         return new_state
 
     @staticmethod
-    def _parse_application_progress(progress_file_name: str, retry_failed: bool) -> tuple[list[str], list[dict]]:
-        """Get the progress of the application prior to this run. This includes the previous state, as well
-        as a list of the API resources that were finished.
+    def _parse_application_progress(progress_file_name: str, retry_failed: bool) -> tuple[dict[str, str], int]:
+        """Get the progress of the application prior to this run: a dict of the API resources that were
+        finished, mapping their IDs to their status, and the number of rows in the progress file.
         
         The definition of 'finished' depends on whether the user set retry_failed to True or False. If True,
         resources from progress.csv that are 'failed' will NOT be considered finished. Else, they will
-        be considered finished. Successful resources are always considered finished."""
-        api_resources_finished: list[str] = []
-        previous_state: list[dict] = []
+        be considered finished. Successful resources are always considered finished.
+        
+        If a resource is in the file more than once, the last row for it wins."""
+        api_resources_finished: dict[str, str] = {}
+        rows = 0
 
         with open(progress_file_name, "r", newline="", encoding="utf-8-sig") as f:
             reader = csv.DictReader(f)
 
             for row in reader:
+                rows += 1
                 # This effectively removes all failed resources from the previous state, to be tried again.
                 if retry_failed and row["Status"] == "failed":
                     continue
 
-                previous_state.append({"ID": row["ID"], "Status": row["Status"]})
-                api_resources_finished.append(row["ID"])
+                api_resources_finished[row["ID"]] = row["Status"]
 
-        return api_resources_finished, previous_state
+        return api_resources_finished, rows
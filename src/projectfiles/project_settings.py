@@ -19,8 +19,72 @@ xpath_of_resource_in_put_response: str | None = None
 
 # Other settings
 dry_run: bool = True
+# In a production run, send the XML saved by the last dry run instead of updating the XML again. Resources that changed
+# since the dry run, or weren't in it, are failed instead of sent.
+promote_dry_run: bool = False
 retry_failed: bool = False
 update_limit: int | None = None
+# How many resources to work on at the same time. Keep this within the limits of your API.
+max_concurrency: int = 1
+# Stop the run if this many resources in a row fail (e.g. because the API is down). None to never stop.
+max_consecutive_failures: int | None = 50
+# How many processes to use for updating the XML and comparing it, for large resources where this
+# work (not the API) is what's slow. Only helps when max_concurrency is above 1. None to not use them.
+cpu_workers: int | None = None
+
+# Connection settings. The defaults are fine for most APIs.
+# How many connections to keep open to the API. None means max(10, max_concurrency).
+http_pool_size: int | None = None
+# How many times to retry a request that could not connect to the API at all.
+http_connect_retries: int = 0
+http_keep_alive: bool = True
+# How long to wait, in seconds, to connect to the API and then for it to send data, before giving up on a request
+# (it's then retried like any other connection problem). One number sets both. None to wait forever.
+http_timeout: float | tuple[float, float] | None = (10, 60)
+
+# Rate limiting. Every GET and PUT waits its turn so the run stays within your API's limits.
+# Alma allows 25 requests per second per institution, shared by everything that uses your API keys.
+requests_per_second: float | None = None
+# How many requests can go out back to back after a quiet period.
+rate_limit_burst: int = 1
+# Stop the run (leaving the rest pending) after this many requests, or when the API reports that
+# no more than min_remaining_quota calls are left for the day.
+daily_request_limit: int | None = None
+remaining_quota_header: str | None = "X-Exl-Api-Remaining"
+min_remaining_quota: int = 0
+# How many times to resend a request the API rejected with a 429 (too many requests).
+max_throttled_retries: int = 5
+
+# Retrying failed requests. A GET or PUT that fails with a dropped connection or one of these status
+# codes is tried again, up to max_attempts times in total, waiting a little longer each time.
+max_attempts: int = 3
+retry_backoff_factor: float = 0.5
+retry_max_backoff: float = 30
+retry_on_status_codes: list[int] = [500, 502, 503, 504]
+
+# How to store backups: "files" for one XML file per resource in the backups folder, or "packed" for one compressed
+# file holding them all (backups/backups.sqlite), which is much smaller and faster for large jobs.
+backup_format: str = "files"
+
+# Save GET responses in the project folder, so that a production run after a dry run (or a retry run) doesn't need
+# to download every resource again. If the API sends ETag or Last-Modified headers, a saved copy is only used once
+# the API confirms it hasn't changed. Otherwise only dry runs use it, for response_cache_ttl seconds (None to never
+# use it); production runs download the resource again.
+use_response_cache: bool = False
+response_cache_ttl: float | None = 3600
+
+# Each run saves a summary of where its time went (per-stage timings, HTTP status codes, retries...) to
+# metrics_<timestamp>.json in the project folder. To also write the metrics for Prometheus (node_exporter's textfile
+# collector), set this to the path of a file ending in .prom, e.g. "/var/lib/node_exporter/textfile/api_update.prom".
+prometheus_textfile: str | None = None
+
+# Logs are written to logs_<timestamp>.log in the project folder (or .jsonl, with one JSON object per line, if
+# log_format is "json"). Once a log file reaches log_max_bytes, it's compressed and a new one is started, keeping the
+# last log_backup_count of them. Set log_level to "DEBUG" to see every step for every resource.
+log_level: str = "INFO"
+log_format: str = "text"
+log_max_bytes: int | None = 100 * 2**20
+log_backup_count: int = 10
 
 # Here, you can override the function that updates the resource XML if the built-in one (located in src.xml_updater.default_update_function) doesn't meet your needs.
 use_custom_xml_update_function: bool = False
@@ -29,4 +93,13 @@ def custom_xml_update_function(resource_id: str, xml_from_get_request: bytes, up
     # The function is run PER API resource. The output should be a bytes XML object. I suggest using pretty print. Example: etree.tostring(tree, pretty_print=True)
     pass
 
-
+# If your API can take many resources in one request, you can send the updated resources in batches
+# instead of one PUT per resource. Only used in production runs; dry runs work as usual.
+use_bulk_writer: bool = False
+bulk_batch_size: int = 100
+def bulk_write_function(session, updates: list[tuple[str, bytes]]) -> dict[str, bool | bytes]:
+    # LEAVE THE PARAMETERS BE - this is what this program will pass to this function!
+    # 'session' is the program's requests.Session (use it so that the rate limit applies), and 'updates' is a list of
+    # (resource ID, updated XML) pairs. Return a dict of resource ID to True if it was updated, False if not, or the
+    # resource XML from the API's response if it was updated and you want it compared. Resources left out are failed.
+    pass
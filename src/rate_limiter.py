@@ -0,0 +1,137 @@
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+
+
+class QuotaExhaustedError(Exception):
+    """Raised when the API's call quota for the day has been used up. The run should stop and be
+    picked up again once the quota resets."""
+
+
+class RateLimiter:
+    """Token bucket that every request to the API passes through, so that a run stays within the
+    API's call limits instead of being throttled.
+
+    'requests_per_second' is the steady rate, and 'burst' is how many requests can go out back to back
+    after a quiet period. If the API answers with a 429, requests are paused for the length of its
+    Retry-After header and the rate is halved, then slowly raised back up as requests succeed.
+
+    The daily quota is tracked two ways: by counting requests against 'daily_request_limit', and by
+    reading the remaining quota the API reports in 'remaining_quota_header' (Alma sends this as
+    X-Exl-Api-Remaining). Once either runs out, QuotaExhaustedError is raised. This is safe to share
+    between threads."""
+    DEFAULT_RETRY_AFTER_SECONDS = 1
+
+    def __init__(self, requests_per_second: float | None = None, burst: int = 1, daily_request_limit: int | None = None,
+                 remaining_quota_header: str | None = "X-Exl-Api-Remaining", min_remaining_quota: int = 0):
+        self.requests_per_second = requests_per_second
+        self.burst = max(1, burst)
+        self.daily_request_limit = daily_request_limit
+        self.remaining_quota_header = remaining_quota_header
+        self.min_remaining_quota = min_remaining_quota
+
+        self._lock = threading.Lock()
+        self._rate = requests_per_second
+        # Theoretical arrival time of the next request, for the token bucket.
+        self._next_request_at = 0.0
+        self._paused_until = 0.0
+        self._remaining_quota: int | None = None
+        self._day_started_at = time.monotonic()
+        self.requests_today = 0
+
+    @property
+    def current_rate(self) -> float | None:
+        """The rate currently being used, which may be lower than the configured rate after a 429."""
+        return self._rate
+
+    def acquire(self):
+        """Block until the next request is allowed to go out."""
+        with self._lock:
+            self._check_quota()
+            now = time.monotonic()
+            allowed_at = max(now, self._paused_until)
+            if self._rate:
+                interval = 1 / self._rate
+                self._next_request_at = max(self._next_request_at, allowed_at)
+                allowed_at = max(allowed_at, self._next_request_at - (self.burst - 1) * interval)
+                self._next_request_at += interval
+            self.requests_today += 1
+
+        delay = allowed_at - now
+        if delay > 0:
+            time.sleep(delay)
+
+        # A 429 may have come back for another request while this one was waiting.
+        while (pause := self._paused_until - time.monotonic()) > 0:
+            time.sleep(pause)
+
+    def observe(self, response):
+        """Adjust to a response from the API: its remaining-quota header, and 429s."""
+        remaining = response.headers.get(self.remaining_quota_header) if self.remaining_quota_header else None
+
+        with self._lock:
+            if remaining is not None:
+                try:
+                    self._remaining_quota = int(remaining)
+                except ValueError:
+                    logging.debug("Could not read remaining quota header value '%s'", remaining)
+
+            if response.status_code == 429:
+                retry_after = self._parse_retry_after(response.headers.get("Retry-After"))
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                if self._rate:
+                    self._rate = max(self.requests_per_second / 16, self._rate / 2)
+                logging.warning("API rate limit hit; pausing requests for %s seconds. Rate is now %s requests per second.", retry_after, self._rate)
+            elif self._rate and self._rate < self.requests_per_second:
+                self._rate = min(self.requests_per_second, self._rate + self.requests_per_second / 20)
+
+    def _check_quota(self):
+        """Raise if there's no quota left for today. Must be called with the lock held."""
+        if time.monotonic() - self._day_started_at >= 24 * 60 * 60:
+            self._day_started_at = time.monotonic()
+            self.requests_today = 0
+
+        if self.daily_request_limit is not None and self.requests_today >= self.daily_request_limit:
+            raise QuotaExhaustedError(f"Reached the daily request limit of {self.daily_request_limit}.")
+        if self._remaining_quota is not None and self._remaining_quota <= self.min_remaining_quota:
+            raise QuotaExhaustedError(f"The API reports {self._remaining_quota} requests remaining in its quota.")
+
+    @classmethod
+    def _parse_retry_after(cls, retry_after: str | None) -> float:
+        """Retry-After is either a number of seconds or an HTTP date."""
+        if not retry_after:
+            return cls.DEFAULT_RETRY_AFTER_SECONDS
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return cls.DEFAULT_RETRY_AFTER_SECONDS
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """HTTP adapter that sends every request through a RateLimiter. Requests that are answered with
+    a 429 are sent again once the limiter allows it, up to 'max_throttled_retries' times."""
+    def __init__(self, rate_limiter: RateLimiter, max_throttled_retries: int = 5, **kwargs):
+        self.rate_limiter = rate_limiter
+        self.max_throttled_retries = max_throttled_retries
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            response = super().send(request, **kwargs)
+            self.rate_limiter.observe(response)
+
+            if response.status_code != 429 or attempt >= self.max_throttled_retries:
+                return response
+
+            attempt += 1
+            logging.info("%s request was throttled; sending it again (attempt %s).", request.method, attempt + 1)
+            response.close()
@@ -1,19 +1,30 @@
-import csv 
+import csv
+from collections.abc import Container
+from itertools import islice
+from typing import Iterator
 
 from .api_resource import ApiResource
 from .get_configuration import Settings
 
-def read_update_file(settings: Settings, api_resources_to_exclude: list[str]) -> list[ApiResource]:
+def read_update_file(settings: Settings, api_resources_to_exclude: Container[str]) -> list[ApiResource]:
     """Read the update file containing the resource IDs to update as well as the values to use
     during the update (one for each xpath).
-    
-    Takes 'api_resources_to_exclude', which is a list of resource IDs pulled from the previous state
-    of the program. It is the same list as 'resources_finished'. This function will skip any of these
-    resources."""
-    # Resources that this run has available to work on. It may not run all of them if there's an error
-    # or if the update limit is set lower.
-    api_resources: list[ApiResource] = []
-        
+
+    Takes 'api_resources_to_exclude', which holds the resource IDs pulled from the previous state
+    of the program (the progress manager's 'previously_completed_api_resources'). This function will
+    skip any of these resources. It's checked once per row, so pass a set or dict rather than a list
+    for large update files.
+
+    This holds every resource in memory at once; runs use 'iter_update_file' instead."""
+    return list(iter_update_file(settings, api_resources_to_exclude))
+
+
+def iter_update_file(settings: Settings, api_resources_to_exclude: Container[str], shard: Container[str] | None = None) -> Iterator[ApiResource]:
+    """Read the update file one row at a time, yielding an API resource for each resource that isn't
+    excluded. Like 'read_update_file', but only one row is held in memory at a time, however big the
+    update file is. With a 'shard', only the resources in that shard are yielded.
+
+    The header is checked when the first resource is asked for."""
     with open(settings.update_file, "r", encoding="utf-8-sig") as uf:
         reader = csv.reader(uf)
 
@@ -26,7 +37,7 @@ def read_update_file(settings: Settings, api_resources_to_exclude: list[str]) ->
                     number_of_values_provided = len(row[1:])
                     if number_of_xpaths_provided != number_of_values_provided:
                         raise ValueError("You must provide a value column for each xpath")
-                
+
                 # Skip the header
                 continue
 
@@ -35,14 +46,29 @@ def read_update_file(settings: Settings, api_resources_to_exclude: list[str]) ->
             # is false)
             if identifier in api_resources_to_exclude:
                 continue
+            if shard is not None and identifier not in shard:
+                continue
+
+            yield make_api_resource(settings, identifier, update_values=row[1:])
+
+
+def make_api_resource(settings: Settings, identifier: str, update_values: list[str] | None = None) -> ApiResource:
+    """Create the API resource for an identifier, with its URL filled in from the settings."""
+    # Create the URL for this resource.
+    api_url = settings.api_url_template.replace("<resource_id>", identifier)
+    if type(settings.query_param_api_key) == str:
+        # Add the Query param API key, stripping ? for safety.
+        api_url = api_url + "?" + settings.query_param_api_key.lstrip("?")
+
+    return ApiResource(identifier=identifier, api_url=api_url, update_values=update_values if update_values is not None else ())
+
 
-            # Create the URL for this resource.
-            api_url = settings.api_url_template.replace("<resource_id>", identifier)
-            if type(settings.query_param_api_key) == str:
-                # Add the Query param API key, stripping ? for safety.
-                api_url = api_url + "?" + settings.query_param_api_key.lstrip("?")
+def count_update_file(settings: Settings, api_resources_to_exclude: Container[str], update_limit: int | None = None,
+                      shard: Container[str] | None = None) -> int:
+    """Count how many resources a run will work on: the resources in the update file that aren't excluded,
+    up to the update limit (if there is one). This reads through the file without keeping the resources."""
+    resources = iter_update_file(settings, api_resources_to_exclude, shard=shard)
+    if update_limit and update_limit > 0:
+        resources = islice(resources, update_limit)
 
-            api_resource = ApiResource(identifier=identifier, api_url=api_url, update_values=row[1:])
-            api_resources.append(api_resource)
-        
-    return api_resources
\ No newline at end of file
+    return sum(1 for _ in resources)
@@ -0,0 +1,313 @@
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import nullcontext
+from typing import Iterable, Iterator
+import requests
+
+from .api_resource import ApiResource, ResourceStatus
+from .backup import Backup
+from .bulk_writer import BulkWriter
+from .comparator import Comparator
+from .dry_run_manifest import DryRunManifest, DryRunPromoter
+from .get_configuration import Settings
+from .metrics import RunMetrics
+from .rate_limiter import QuotaExhaustedError
+from .response_cache import ResponseCache
+from .retrieve_resource import retrieve_resource
+from .retry_policy import RetryPolicy
+from .verify_response_content import verify_response_content
+from .xml_updater import XMLUpdater
+
+
+class TooManyFailuresError(Exception):
+    """Raised when too many resources in a row have failed. This usually means something is wrong
+    with the whole run (e.g. a bad API key or an API outage) rather than with individual resources."""
+
+
+class ResourcePipeline:
+    """Class that runs API resources through the update pipeline: GET the resource, verify it, back it up,
+    update the XML, and then either PUT it to the API or save it to the dry run folder. If a comparator is
+    passed, each resource is then compared, with the result put on the resource's 'comparison'.
+
+    If a bulk writer is passed (production runs only), resources aren't PUT one at a time. Instead, once
+    a resource is ready to be sent, it's added to the bulk writer's batch, and it's handed back to the
+    caller after its batch has been written.
+
+    If a response cache is passed, GETs go through it, and a resource's saved copy is dropped once the
+    resource has been updated.
+
+    Dry runs record what they did in the dry run manifest, if one is passed. In a production run, a dry
+    run promoter takes the place of the XML update: the XML saved by the dry run is sent instead.
+
+    If run metrics are passed, each stage is timed for each resource.
+
+    Resources can be worked on concurrently by a pool of threads (see 'max_concurrency' in the settings).
+    Completed resources are handed back to the caller one at a time, so anything that is not thread-safe
+    (the progress manager, the comparator, the progress bar) should only be touched by the caller."""
+    def __init__(self, settings: Settings, backuper: Backup, xml_updater: XMLUpdater, session: requests.Session, dry_run_folder: str | None = None,
+                 retry_policy: RetryPolicy | None = None, comparator: Comparator | None = None, bulk_writer: BulkWriter | None = None,
+                 response_cache: ResponseCache | None = None, dry_run_manifest: DryRunManifest | None = None,
+                 dry_run_promoter: DryRunPromoter | None = None, metrics: RunMetrics | None = None):
+        self.settings = settings
+        self.backuper = backuper
+        self.xml_updater = xml_updater
+        self.session = session
+        self.dry_run_folder = dry_run_folder
+        self.retry_policy = retry_policy if retry_policy else RetryPolicy(max_attempts=1)
+        self.comparator = comparator
+        self.bulk_writer = bulk_writer if settings.dry_run == False else None
+        self.response_cache = response_cache
+        self.dry_run_manifest = dry_run_manifest if settings.dry_run == True else None
+        self.dry_run_promoter = dry_run_promoter if settings.dry_run == False else None
+        self.metrics = metrics
+
+        self.max_concurrency = settings.max_concurrency if settings.max_concurrency else 1
+        self.max_consecutive_failures = settings.max_consecutive_failures
+        self.consecutive_failures = 0
+        self.unreported: list[ApiResource] = []
+
+    def run(self, api_resources: Iterable[ApiResource]) -> Iterator[ApiResource]:
+        """Process each API resource, yielding it once it has gone through the whole pipeline. With
+        a max_concurrency above 1, resources are yielded in the order they finish, not the order they
+        were passed in.
+
+        Only a bounded number of resources are submitted to the thread pool at once. If the caller stops
+        early (for example on ctrl-c), resources that have not been started are left untouched, and the
+        ones already in flight are allowed to finish so that their status is accurate. Those are put in
+        'unreported' rather than yielded, so the caller can still save their progress.
+
+        If 'max_consecutive_failures' resources fail in a row, TooManyFailuresError is raised after the
+        last of them is yielded.
+
+        With a bulk writer, the last partial batch is written once every resource has been processed. If
+        the caller stops early, resources still waiting in a batch are not written and stay pending."""
+        self.unreported: list[ApiResource] = []
+
+        # Resources that are finished but haven't been handed to the caller yet.
+        ready: deque[ApiResource] = deque()
+        if self.max_concurrency <= 1:
+            try:
+                for api_resource in api_resources:
+                    self._complete([self.process(api_resource)], ready)
+                    while ready:
+                        completed_api_resource = ready.popleft()
+                        yield completed_api_resource
+                        self._check_consecutive_failures(completed_api_resource)
+                ready.extend(self._flush_bulk_writer())
+                while ready:
+                    completed_api_resource = ready.popleft()
+                    yield completed_api_resource
+                    self._check_consecutive_failures(completed_api_resource)
+            finally:
+                self.unreported = list(ready)
+            return
+
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="resource_worker")
+        in_flight = set()
+        try:
+            api_resources_iter = iter(api_resources)
+            more_to_submit = True
+            while more_to_submit or in_flight:
+                # Keep the workers busy without queuing up the whole update file.
+                while more_to_submit and len(in_flight) < self.max_concurrency * 2:
+                    api_resource = next(api_resources_iter, None)
+                    if api_resource is None:
+                        more_to_submit = False
+                    else:
+                        in_flight.add(executor.submit(self.process, api_resource))
+
+                if in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    error = None
+                    finished = []
+                    for future in done:
+                        if future.exception():
+                            error = future.exception()
+                        else:
+                            finished.append(future.result())
+                    self._complete(finished, ready)
+
+                    while ready:
+                        completed_api_resource = ready.popleft()
+                        yield completed_api_resource
+                        self._check_consecutive_failures(completed_api_resource)
+
+                    if error:
+                        raise error
+
+            ready.extend(self._flush_bulk_writer())
+            while ready:
+                completed_api_resource = ready.popleft()
+                yield completed_api_resource
+                self._check_consecutive_failures(completed_api_resource)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            self.unreported = list(ready) + [future.result() for future in in_flight
+                                             if not future.cancelled() and future.exception() is None]
+
+    def _complete(self, api_resources: list[ApiResource], ready: deque[ApiResource]):
+        """Take resources the workers are done with, and add the ones that are now ready to be handed back
+        to 'ready'. That's normally all of them, but with a bulk writer, a resource waiting for its PUT is
+        held until its batch is written, and then the whole batch is added.
+
+        The resources that don't wait for the bulk writer are added first, so that if a bulk write raises
+        (e.g. QuotaExhaustedError), they're still in 'ready' for the caller to save."""
+        to_write = []
+        for api_resource in api_resources:
+            if self.bulk_writer and api_resource.status == ResourceStatus.PENDING and api_resource.xml_for_update_request:
+                to_write.append(api_resource)
+            else:
+                ready.append(api_resource)
+        for api_resource in to_write:
+            ready.extend(self._compare_batch(self._write_bulk(lambda: self.bulk_writer.add(api_resource))))
+
+    def _flush_bulk_writer(self) -> list[ApiResource]:
+        """Write the bulk writer's last, partial batch."""
+        if not self.bulk_writer:
+            return []
+        return self._compare_batch(self._write_bulk(self.bulk_writer.flush))
+
+    def _write_bulk(self, write: callable) -> list[ApiResource]:
+        """Call the bulk writer, timing it if it wrote a batch."""
+        start = time.perf_counter()
+        written = write()
+        if written and self.metrics:
+            self.metrics.observe_stage("bulk write", time.perf_counter() - start)
+        return written
+
+    def _timed(self, stage: str):
+        """Time a stage of the pipeline, if there are metrics to record it in."""
+        return self.metrics.time_stage(stage) if self.metrics else nullcontext()
+
+    def _compare_batch(self, api_resources: list[ApiResource]) -> list[ApiResource]:
+        """Compare resources that have been through the bulk writer (they weren't finished when the workers
+        would normally have compared them)."""
+        for api_resource in api_resources:
+            if api_resource.status == ResourceStatus.SUCCESS:
+                self._forget_cached_response(api_resource)
+            self._compare(api_resource)
+        return api_resources
+
+    def _forget_cached_response(self, api_resource: ApiResource):
+        """Drop the saved GET response for a resource that was just updated, since it's now out of date."""
+        if self.response_cache:
+            self.response_cache.invalidate(api_resource.api_url)
+
+    def _check_consecutive_failures(self, api_resource: ApiResource):
+        """Circuit breaker: stop the run once too many resources have failed in a row."""
+        self.consecutive_failures = self.consecutive_failures + 1 if api_resource.status == ResourceStatus.FAILED else 0
+        if self.max_consecutive_failures and self.consecutive_failures >= self.max_consecutive_failures:
+            raise TooManyFailuresError(f"{self.consecutive_failures} resources in a row have failed. The last failure was: {api_resource.failure}")
+
+    def process(self, api_resource: ApiResource) -> ApiResource:
+        """Run one API resource through the pipeline. This is called from the worker threads.
+
+        If any stage raises an exception, only this resource is failed: what went wrong (and where) is
+        recorded on the resource and the run carries on with the next one. Running out of API quota is
+        the exception to this, since every resource after it would fail too."""
+        started = time.perf_counter()
+        stage = "GET"
+        try:
+            # GET THE XML FOR EACH RESOURCE ---------------------------
+            logging.info("Working on resource %s...", api_resource.identifier)
+            logging.debug("Retrieving GET request...")
+            with self._timed(stage):
+                api_resource_with_xml = retrieve_resource(api_resource, self.session, self.retry_policy, self.response_cache,
+                                                            allow_unconfirmed_copy=self.settings.dry_run == True)
+            logging.debug("Done.")
+
+            # VERIFY THE XML IS VALID ---------------------------------
+            stage = "verify"
+            logging.debug("Verifying response content...")
+            with self._timed(stage):
+                verified_api_resource = verify_response_content(api_resource_with_xml, self.settings.xpath_for_get_response_verification)
+            logging.debug("Done.")
+
+            # BACK UP XML IF VALID AND NOT DRY RUN --------------------
+            stage = "backup"
+            if self.settings.dry_run == False:
+                if verified_api_resource.status != ResourceStatus.FAILED:
+                    logging.debug("Backing up resource...")
+                    with self._timed(stage):
+                        result = self.backuper.backup(verified_api_resource.identifier, verified_api_resource.xml_from_get_request)
+                    if result == -1:
+                        logging.error("Could not back up resource %s", verified_api_resource.identifier)
+                        verified_api_resource.mark_failed("backup", "Could not write the backup file")
+                    logging.debug("Done")
+                else:
+                    logging.debug("Skipping backup of resource %s due to status '%s'.", verified_api_resource.identifier, verified_api_resource.status)
+
+            # UPDATE THE XML -----------------------------------------------------
+            # (Or, if we're promoting a dry run, use the XML it saved.)
+            if self.dry_run_promoter:
+                stage = "promote"
+                logging.debug("Using the updated XML from the dry run...")
+                with self._timed(stage):
+                    resource_with_updated_xml = self.dry_run_promoter.promote(verified_api_resource)
+            else:
+                stage = "update"
+                logging.debug("Updating XML...")
+                with self._timed(stage):
+                    resource_with_updated_xml = self.xml_updater.update_resource(verified_api_resource)
+            logging.debug("Done.")
+
+            # IF THIS IS A DRY RUN, SAVE THE UPDATED XML -------------------------
+            if self.settings.dry_run == True:
+                stage = "dry run save"
+                updated_xml_filename = None
+                # Only save resources if they have updated XML (i.e, are still pending a production update)
+                if resource_with_updated_xml.status == ResourceStatus.PENDING:
+                    updated_xml_filename = Backup.relative_filepath(resource_with_updated_xml.identifier)
+                    os.makedirs(os.path.dirname(f"{self.dry_run_folder}/{updated_xml_filename}"), exist_ok=True)
+                    with self._timed(stage), open(f"{self.dry_run_folder}/{updated_xml_filename}", "wb") as f:
+                        f.write(resource_with_updated_xml.xml_for_update_request)
+                    logging.debug("Done")
+                if self.dry_run_manifest and resource_with_updated_xml.status != ResourceStatus.FAILED:
+                    self.dry_run_manifest.record(resource_with_updated_xml, updated_xml_filename)
+
+            # IF THIS IS A PRODUCTION RUN, RUN THE API UPDATE --------------------
+            # (With a bulk writer, the resource is sent with its batch instead; see '_complete'.)
+            elif not self.bulk_writer:
+                stage = "PUT"
+                # Only run on resources that are pending.
+                if resource_with_updated_xml.status == ResourceStatus.PENDING:
+                    with self._timed(stage):
+                        response = self.retry_policy.call(lambda: self.session.put(resource_with_updated_xml.api_url, data=resource_with_updated_xml.xml_for_update_request, headers={
+                                                "Content-Type": "application/xml"}), resource_with_updated_xml, "PUT")
+                    if response.status_code == 200:
+                        resource_with_updated_xml.mark_successful()
+                        self._forget_cached_response(resource_with_updated_xml)
+                        logging.info("Resource %s updated successfully.", resource_with_updated_xml.identifier)
+                    else:
+                        resource_with_updated_xml.mark_failed("PUT", f"Status code: {response.status_code}", http_status=response.status_code)
+                        logging.warning("Resource %s NOT UPDATED SUCCESSFULLY. Status code: %s", resource_with_updated_xml.identifier, response.status_code)
+                    resource_with_updated_xml.update_response = response.content
+        except QuotaExhaustedError:
+            raise
+        except Exception as e:
+            http_status = getattr(e, "status_code", None)
+            if http_status is None and getattr(e, "response", None) is not None:
+                http_status = e.response.status_code
+            api_resource.mark_failed(stage, exception=e, http_status=http_status)
+            logging.warning("Resource %s failed: %s", api_resource.identifier, api_resource.failure)
+
+        # COMPARE THE XML BEFORE AND AFTER THE UPDATE ------------------------
+        # This is done here rather than by the caller so that comparisons, which can be slow for large
+        # resources, run in the worker threads too.
+        if not (self.bulk_writer and api_resource.status == ResourceStatus.PENDING):
+            self._compare(api_resource)
+
+        if self.metrics:
+            self.metrics.observe_resource(time.perf_counter() - started)
+        return api_resource
+
+    def _compare(self, api_resource: ApiResource):
+        if self.comparator:
+            try:
+                with self._timed("compare"):
+                    api_resource.comparison = self.comparator.compare_resource(api_resource, self.settings.dry_run)
+            except Exception:
+                logging.exception("Something went wrong in comparing resource %s.", api_resource.identifier)
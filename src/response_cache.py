@@ -0,0 +1,86 @@
+import hashlib
+import sqlite3
+import threading
+import time
+
+
+class CachedResponse:
+    """A GET response saved in the response cache."""
+    def __init__(self, body: bytes, etag: str | None, last_modified: str | None, fetched_at: float):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+
+    @property
+    def can_revalidate(self) -> bool:
+        """Whether the API gave us something to check the saved copy against."""
+        return bool(self.etag or self.last_modified)
+
+
+class ResponseCache:
+    """On-disk cache of GET responses, so that a run after a dry run (or a retry run) doesn't need to
+    download every resource again.
+
+    If the API sent an ETag or Last-Modified header with a response, the saved copy is only used after
+    checking with the API that it's still current (a conditional GET, which the API answers with a short
+    304 if nothing changed). Otherwise, the saved copy is used without asking the API for 'ttl' seconds
+    after it was downloaded, and not at all once it's older than that.
+
+    Responses are stored in an SQLite file, keyed by a hash of the URL (so that API keys in the URL aren't
+    written to disk). This is safe to share between threads."""
+    def __init__(self, cache_filepath: str, ttl: float | None = 3600):
+        self.cache_filepath = cache_filepath
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(cache_filepath, check_same_thread=False)
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute("""CREATE TABLE IF NOT EXISTS responses (
+                url_hash TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, body BLOB, fetched_at REAL)""")
+            self._connection.commit()
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def get(self, url: str) -> CachedResponse | None:
+        """Get the saved response for a URL, if there's one that can still be used."""
+        with self._lock:
+            row = self._connection.execute("SELECT body, etag, last_modified, fetched_at FROM responses WHERE url_hash = ?",
+                                           (self._key(url),)).fetchone()
+        if row is None:
+            return None
+
+        cached_response = CachedResponse(*row)
+        if not cached_response.can_revalidate and not self.is_fresh(cached_response):
+            return None
+        return cached_response
+
+    def is_fresh(self, cached_response: CachedResponse) -> bool:
+        """Whether a saved response is new enough to use without asking the API."""
+        return bool(self.ttl) and time.time() - cached_response.fetched_at < self.ttl
+
+    def put(self, url: str, body: bytes, etag: str | None = None, last_modified: str | None = None):
+        """Save a response."""
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                                     (self._key(url), etag, last_modified, body, time.time()))
+            self._connection.commit()
+
+    def touch(self, url: str):
+        """Mark a saved response as current, after the API confirmed it hasn't changed."""
+        with self._lock:
+            self._connection.execute("UPDATE responses SET fetched_at = ? WHERE url_hash = ?", (time.time(), self._key(url)))
+            self._connection.commit()
+
+    def invalidate(self, url: str):
+        """Forget the saved response for a URL, e.g. because the resource was just updated."""
+        with self._lock:
+            self._connection.execute("DELETE FROM responses WHERE url_hash = ?", (self._key(url),))
+            self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,67 @@
+import csv
+from collections.abc import Container, Iterable, Iterator
+from lxml import etree
+
+from .api_resource import ApiResource, parse_xml
+from .backup import Backup
+from .get_configuration import Settings
+from .read_update_file import make_api_resource
+from .sharding import Shard
+
+
+class Restorer:
+    """XML update function that puts a resource back the way it was when it was backed up, so that the
+    update pipeline can be used to restore resources.
+
+    Returns None (nothing to send) if the resource is already the same as its backup, and raises if there's
+    no backup of it.
+
+    'shard_backups' are the backups of the project's shards. A resource that isn't in 'backups' is looked
+    for in the backups of the shards it belongs to, since a project's shards back up their resources in
+    their own folders."""
+    def __init__(self, backups: Backup, shard_backups: dict[Shard, Backup] | None = None):
+        self.backups = backups
+        self.shard_backups = shard_backups if shard_backups else {}
+
+    def __call__(self, resource_id: str, xml_from_get_request: bytes, update_values: list[str] | None = None,
+                 xpaths: list[str] | None = None, operations: str | list[str] | None = None) -> bytes | None:
+        backed_up_xml = self.backups.restore(resource_id)
+        for shard, shard_backups in self.shard_backups.items():
+            if backed_up_xml is not None:
+                break
+            if resource_id in shard:
+                backed_up_xml = shard_backups.restore(resource_id)
+        if backed_up_xml is None:
+            raise LookupError(f"There is no backup of resource {resource_id}")
+
+        # Compare without formatting, since backups made by older versions may be indented differently.
+        if etree.tostring(parse_xml(backed_up_xml)) == etree.tostring(parse_xml(xml_from_get_request)):
+            return None
+        return backed_up_xml
+
+
+def read_ids_file(ids_filepath: str) -> list[str]:
+    """Read the resource IDs to restore from a CSV file, which has a header and the IDs in its first column
+    (like the update file)."""
+    with open(ids_filepath, "r", newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        return [row[0] for row in reader if row]
+
+
+def ids_with_status(progress: dict[str, str], status: str) -> list[str]:
+    """The IDs in the update's progress that have a status ('success', 'failed'), or any status ('all')."""
+    return [identifier for identifier, resource_status in progress.items() if status == "all" or resource_status == status]
+
+
+def iter_resources_to_restore(settings: Settings, identifiers: Iterable[str], already_restored: Container[str]) -> Iterator[ApiResource]:
+    """Yield an API resource for each identifier that hasn't been restored already. Resources are made as
+    they're asked for, so a restore doesn't hold them all in memory at once."""
+    for identifier in identifiers:
+        if identifier not in already_restored:
+            yield make_api_resource(settings, identifier)
+
+
+def count_resources_to_restore(identifiers: Iterable[str], already_restored: Container[str]) -> int:
+    """Count how many resources a restore will work on, without making them (for the progress bar)."""
+    return sum(1 for identifier in identifiers if identifier not in already_restored)
@@ -1,13 +1,73 @@
 from lxml import etree
 import requests
 
-from .api_resource import ApiResource
+from .api_resource import ApiResource, parse_xml
+from .response_cache import ResponseCache
+from .retry_policy import RetryPolicy
 
-def retrieve_resource(api_resource: ApiResource) -> ApiResource:
-    """Get the resource XML from the API, and pretty-print it.
+
+class RetrievalError(Exception):
+    """Raised when the GET response can't be used, for example an HTML error page instead of XML."""
+    def __init__(self, message: str, status_code: int | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def retrieve_resource(api_resource: ApiResource, session: requests.Session | None = None, retry_policy: RetryPolicy | None = None,
+                      cache: ResponseCache | None = None, allow_unconfirmed_copy: bool = False) -> ApiResource:
+    """Get the resource XML from the API, and pretty-print it. The parsed XML is kept on the resource
+    for the later stages to use.
+
+    Pass the run's session to reuse its pooled connections; without one, a new connection is
+    opened for the request. With a retry policy, transient failures are retried before giving up.
+
+    With a response cache, a saved copy of the resource is used if the API confirms it's still current (see
+    ResponseCache), and new responses are saved to it. A saved copy that the API can't confirm (one without
+    an ETag or Last-Modified) is only used if 'allow_unconfirmed_copy' is set, since it may be out of date.
+    This is only safe when nothing is sent back to the API, i.e. in dry runs: in a production run, the
+    backup and the update would be based on the old copy, overwriting any change made since.
     
     Errors are thrown, to be handled elsewhere."""
-    response = requests.get(api_resource.api_url, headers={"Accept": "application/xml"})
-    api_resource.xml_from_get_request = etree.tostring(etree.fromstring(response.content), pretty_print=True)
+    requester = session if session else requests
+    cached_response = cache.get(api_resource.api_url) if cache else None
+
+    headers = {"Accept": "application/xml"}
+    if cached_response and cached_response.can_revalidate:
+        # Ask the API to only send the resource if it changed since we saved it.
+        if cached_response.etag:
+            headers["If-None-Match"] = cached_response.etag
+        if cached_response.last_modified:
+            headers["If-Modified-Since"] = cached_response.last_modified
+    elif cached_response and allow_unconfirmed_copy:
+        # No way to check with the API, but the saved copy is recent enough to use.
+        return _use_xml(api_resource, cached_response.body, status_code=200)
+    else:
+        # Download the resource again, replacing the saved copy.
+        cached_response = None
+
+    def send_request():
+        return requester.get(api_resource.api_url, headers=headers)
+
+    response = retry_policy.call(send_request, api_resource, "GET") if retry_policy else send_request()
+
+    if cached_response and response.status_code == 304:
+        cache.touch(api_resource.api_url)
+        return _use_xml(api_resource, cached_response.body, status_code=200)
+
+    _use_xml(api_resource, response.content, response.status_code)
+    if cache and response.status_code == 200:
+        cache.put(api_resource.api_url, response.content, etag=response.headers.get("ETag"),
+                  last_modified=response.headers.get("Last-Modified"))
+
+    return api_resource
+
+
+def _use_xml(api_resource: ApiResource, xml: bytes, status_code: int | None) -> ApiResource:
+    """Parse the XML of a GET response and put it on the resource."""
+    try:
+        tree = parse_xml(xml)
+    except etree.XMLSyntaxError as e:
+        raise RetrievalError(f"GET response was not valid XML: {e}", status_code) from e
+    api_resource.set_xml_from_get_request(etree.tostring(tree, pretty_print=True), tree)
 
     return api_resource
\ No newline at end of file
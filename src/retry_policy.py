@@ -0,0 +1,50 @@
+import logging
+import random
+import time
+import requests
+
+from .api_resource import ApiResource
+
+
+class RetryPolicy:
+    """Class that retries API requests that failed for reasons that are likely to go away on their own,
+    like a dropped connection or a 503 from an overloaded server.
+
+    Each retry waits for a random time between 0 and backoff_factor * 2^(attempt - 1) seconds (capped
+    at max_backoff), so that many worker threads retrying at once don't all hit the API at the same
+    moment. 429s are not retried here; the rate limiter already takes care of those."""
+    def __init__(self, max_attempts: int = 3, backoff_factor: float = 0.5, max_backoff: float = 30,
+                 retry_on_status_codes: list[int] | None = None,
+                 retry_on_exceptions: tuple[type[Exception], ...] = (requests.ConnectionError, requests.Timeout)):
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.retry_on_status_codes = set(retry_on_status_codes if retry_on_status_codes is not None else [500, 502, 503, 504])
+        self.retry_on_exceptions = retry_on_exceptions
+
+    def call(self, send_request: callable, api_resource: ApiResource, request_name: str) -> requests.Response:
+        """Send a request, retrying it if it fails in a retryable way. The number of attempts is recorded
+        on the API resource under 'request_name' (e.g. 'GET').
+
+        If every attempt fails, the last exception is raised, or the last response is returned."""
+        attempt = 0
+        while True:
+            attempt += 1
+            api_resource.attempts[request_name] = attempt
+            try:
+                response = send_request()
+            except self.retry_on_exceptions as e:
+                if attempt >= self.max_attempts:
+                    raise
+                logging.warning("%s for resource %s failed with %s; retrying (attempt %s of %s).", request_name, api_resource.identifier, type(e).__name__, attempt + 1, self.max_attempts)
+            else:
+                if response.status_code not in self.retry_on_status_codes or attempt >= self.max_attempts:
+                    return response
+                logging.warning("%s for resource %s returned status %s; retrying (attempt %s of %s).", request_name, api_resource.identifier, response.status_code, attempt + 1, self.max_attempts)
+                response.close()
+
+            time.sleep(self.backoff(attempt))
+
+    def backoff(self, attempt: int) -> float:
+        """How long to wait after a failed attempt, with full jitter."""
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * 2 ** (attempt - 1)))
@@ -0,0 +1,107 @@
+import atexit
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+TEXT_FORMAT = '%(levelname)s:%(asctime)s: %(message)s'
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Formats each log record as one JSON object per line, for loading logs into other tools."""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """Puts log records on the queue as they are, so that messages are formatted by the listener's thread
+    instead of the thread that logged them. (The standard QueueHandler formats them first, so that they
+    can be sent to another process, which isn't needed here.)"""
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def _compress_rotated_log(source: str, destination: str):
+    with open(source, "rb") as f_in, gzip.open(destination, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def setup_logging(log_filepath: str, level: int | str = logging.INFO, json_lines: bool = False,
+                  max_bytes: int | None = 100 * 2**20, backup_count: int = 10) -> QueueListener:
+    """Send the program's logs to a file through a queue, so that the threads doing the work never wait on
+    the log file. The file is written by a background thread, which is stopped (after writing everything
+    left in the queue) by calling 'stop' on the listener that's returned.
+
+    Once the log file reaches 'max_bytes', it's compressed to '<log_filepath>.1.gz' (moving older ones up
+    to '.2.gz' and so on, keeping 'backup_count' of them) and a new file is started. Set max_bytes to None
+    to never rotate. With 'json_lines', each record is written as a JSON object instead of a line of text.
+
+    Messages should be logged with %-style arguments (logging.info("Resource %s", identifier)) rather than
+    f-strings, so that messages below the log level are never formatted at all."""
+    if max_bytes:
+        file_handler = RotatingFileHandler(log_filepath, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        file_handler.namer = lambda name: f"{name}.gz"
+        file_handler.rotator = _compress_rotated_log
+    else:
+        file_handler = logging.FileHandler(log_filepath, encoding="utf-8")
+    file_handler.setFormatter(JsonLinesFormatter() if json_lines else logging.Formatter(TEXT_FORMAT))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(_DeferredQueueHandler(log_queue))
+    root_logger.setLevel(level)
+
+    listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    # The listener's thread doesn't keep the program running, so make sure the queue is written out if the
+    # program stops without calling stop_logging (e.g. because of an exception).
+    atexit.register(listener.stop)
+    return listener
+
+
+def forward_process_logs(listener: QueueListener, mp_context) -> QueueListener:
+    """Start writing the logs of worker processes to the same file as 'listener'. The worker processes get
+    their logs to it through a queue from 'mp_context' (see 'setup_process_logging'), which is the queue of
+    the listener that's returned. Stop it once the processes have finished."""
+    process_listener = QueueListener(mp_context.Queue(), *listener.handlers, respect_handler_level=True)
+    process_listener.start()
+    return process_listener
+
+
+def setup_process_logging(log_queue, level: int | str = logging.INFO):
+    """Initializer for worker processes, which start without any logging set up: send their log records to
+    the main process through 'log_queue', to be written to the run's log file (see 'forward_process_logs').
+    The standard QueueHandler is used here, since records have to be formatted before they can be sent to
+    another process."""
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(QueueHandler(log_queue))
+    root_logger.setLevel(level)
+
+
+def stop_logging(listener: QueueListener):
+    """Write out the logs left in the queue, close the log file, and stop logging to it."""
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        if isinstance(handler, QueueHandler) and handler.queue is listener.queue:
+            root_logger.removeHandler(handler)
+    listener.stop()
+    atexit.unregister(listener.stop)
+    for handler in listener.handlers:
+        handler.close()
@@ -0,0 +1,144 @@
+import glob
+import hashlib
+import json
+import os
+import re
+
+from .progress_manager import ProgressManager
+
+_SHARD_FOLDER_PATTERN = re.compile(r"(\d+)_of_(\d+)")
+
+
+class Shard:
+    """One of 'count' parts of a project's update file, numbered from 1, so that a project can be split
+    between several processes or machines (e.g. each with its own API key).
+
+    Each resource belongs to exactly one shard, chosen from a hash of its identifier, so the same resource
+    is always in the same shard no matter where or how often the program is run (as long as the number of
+    shards stays the same). Check whether a resource is in the shard with 'identifier in shard'.
+
+    A shard keeps its own progress, backups, comparisons, logs and metrics in its folder,
+    'shards/<index>_of_<count>' in the project folder. 'merge_shards' brings the shards' progress and
+    comparisons back into the project's own files."""
+    __slots__ = ("index", "count")
+
+    def __init__(self, index: int, count: int):
+        if count < 1 or not 1 <= index <= count:
+            raise ValueError(f"Shard {index}/{count} does not exist. Shards are numbered from 1 to the number of shards, e.g. 1/4 to 4/4.")
+        self.index = index
+        self.count = count
+
+    @classmethod
+    def parse(cls, text: str) -> "Shard":
+        """Read a shard written as 'index/count', e.g. '2/4'."""
+        index, separator, count = text.partition("/")
+        if not separator or not index.strip().isdigit() or not count.strip().isdigit():
+            raise ValueError(f"'{text}' is not a shard. Write shards as 'index/count', e.g. '2/4'.")
+        return cls(int(index), int(count))
+
+    @classmethod
+    def from_folder(cls, folder: str) -> "Shard":
+        """The shard that keeps its files in a folder (see 'folder')."""
+        match = _SHARD_FOLDER_PATTERN.fullmatch(os.path.basename(folder))
+        if not match:
+            raise ValueError(f"'{folder}' is not the folder of a shard.")
+        return cls(int(match.group(1)), int(match.group(2)))
+
+    @property
+    def name(self) -> str:
+        return f"{self.index}_of_{self.count}"
+
+    def folder(self, project_path: str) -> str:
+        """The folder in the project folder where this shard keeps its files."""
+        return f"{project_path}/shards/{self.name}"
+
+    def __contains__(self, identifier: str) -> bool:
+        return shard_index(identifier, self.count) == self.index
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Shard) and (self.index, self.count) == (other.index, other.count)
+
+    def __hash__(self) -> int:
+        return hash((self.index, self.count))
+
+    def __repr__(self) -> str:
+        return f"Shard({self.index}/{self.count})"
+
+
+def shard_index(identifier: str, count: int) -> int:
+    """The shard (from 1 to 'count') that a resource belongs to. This uses a hash that's the same in every
+    process, unlike Python's own hash() of a string."""
+    identifier_hash = hashlib.sha256(identifier.encode("utf-8")).digest()
+    return int.from_bytes(identifier_hash[:8], "big") % count + 1
+
+
+def find_shard_folders(project_path: str) -> list[str]:
+    """The folders of the shards that have been run for a project, in order."""
+    folders = [folder for folder in glob.glob(f"{project_path}/shards/*_of_*")
+               if os.path.isdir(folder) and _SHARD_FOLDER_PATTERN.fullmatch(os.path.basename(folder))]
+    return sorted(folders, key=lambda folder: (Shard.from_folder(folder).count, Shard.from_folder(folder).index))
+
+
+def merge_shards(project_path: str) -> dict[str, int]:
+    """Bring the progress and comparisons of a project's shards into the project's own 'progress.csv' and
+    'comparisons.jsonl', so they're the same as if the project had been run without shards. Returns how
+    many resources and comparisons were merged.
+
+    The status a shard has for a resource replaces the one in the project's progress, except that a resource
+    that was updated successfully stays that way: a shard's status may be older than the project's (e.g. if
+    the project was run again without shards after the shard was), and a resource can't be un-updated by a
+    later failure. Comparisons are
+    appended to the project's comparisons; how far each shard's comparisons have been merged is saved in
+    'shards/merged.json', so merging again (e.g. after the shards have done more) only adds what's new.
+    Merge after the shards have stopped: a shard that's still running may not have saved all of its
+    progress yet."""
+    merge_state_filepath = f"{project_path}/shards/merged.json"
+    merged_offsets: dict[str, int] = {}
+    if os.path.isfile(merge_state_filepath):
+        with open(merge_state_filepath, "r", encoding="utf-8") as f:
+            merged_offsets = json.load(f)
+
+    progress: dict[str, str] = {}
+    comparisons = 0
+    with open(f"{project_path}/comparisons.jsonl", "ab") as project_comparisons:
+        for folder in find_shard_folders(project_path):
+            # Reading the progress this way also moves anything left in the shard's journal into its
+            # progress file.
+            for identifier, status in ProgressManager(folder).previously_completed_api_resources.items():
+                if progress.get(identifier) != "success":
+                    progress[identifier] = status
+
+            shard_comparisons_filepath = f"{folder}/comparisons.jsonl"
+            if not os.path.isfile(shard_comparisons_filepath):
+                continue
+            shard_name = os.path.basename(folder)
+            offset = merged_offsets.get(shard_name, 0)
+            with open(shard_comparisons_filepath, "rb") as f:
+                # A shard's comparisons are only ever appended to, unless the shard was started over.
+                if f.seek(0, os.SEEK_END) < offset:
+                    offset = 0
+                f.seek(offset)
+                for line in f:
+                    # A line without its end is still being written, so it's left for the next merge.
+                    if not line.endswith(b"\n"):
+                        break
+                    project_comparisons.write(line)
+                    offset += len(line)
+                    comparisons += 1
+            merged_offsets[shard_name] = offset
+        project_comparisons.flush()
+        os.fsync(project_comparisons.fileno())
+
+    project_pm = ProgressManager(project_path)
+    project_pm.merge(progress)
+    project_pm.close()
+
+    # Saved last, so if the merge is stopped part way through, the next one merges the same comparisons
+    # again. A comparison that's in the file twice does no harm, since the last one for a resource wins.
+    if os.path.isdir(f"{project_path}/shards"):
+        temp_filepath = f"{merge_state_filepath}.tmp"
+        with open(temp_filepath, "w", encoding="utf-8") as f:
+            json.dump(merged_offsets, f, indent=2)
+        os.replace(temp_filepath, merge_state_filepath)
+
+    return {"resources": len(progress), "comparisons": comparisons}
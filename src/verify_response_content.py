@@ -1,6 +1,4 @@
 import logging
-from lxml import etree
-from lxml.etree import ElementTree
 
 from .api_resource import ApiResource
 
@@ -14,13 +12,12 @@ def verify_response_content(api_resource: ApiResource, test_xpath: str):
 
     # Verify the XML from the GET request is valid.
     if api_resource.xml_from_get_request:
-        tree = etree.fromstring(api_resource.xml_from_get_request)
-        xpath_results = tree.xpath(test_xpath)
+        xpath_results = api_resource.tree.xpath(test_xpath)
 
         if len(xpath_results) == 0:
-            logging.warning(f"Malformed GET response from resource with ID {api_resource.identifier}. URL: {api_resource.api_url}")
-            api_resource.mark_failed()
+            logging.warning("Malformed GET response from resource with ID %s. URL: %s", api_resource.identifier, api_resource.api_url)
+            api_resource.mark_failed("verify", f"GET response did not contain '{test_xpath}'")
         else:
-            logging.debug(f"Verification for resource {api_resource.identifier} successful.")
+            logging.debug("Verification for resource %s successful.", api_resource.identifier)
             
     return api_resource
@@ -1,122 +1,194 @@
+from concurrent.futures import Executor
 from lxml import etree
 from lxml.etree import Element
+import copy
 import logging
-import xmltodict
+from functools import lru_cache
 
-from .api_resource import ApiResource
+from .api_resource import ApiResource, ResourceStatus, parse_xml
 
 def default_update_function(resource_id: str, xml_from_get_request: bytes, update_values: list[str] | None, xpaths: list[str] | None = None, operations: str | list[str] | None = None) -> bytes | None:
     """A function that handles updating one or more sections of an XML resource. Should return None IF there's nothing
     to update in this function"""
-    tree = etree.fromstring(xml_from_get_request)
+    return update_tree(resource_id, parse_xml(xml_from_get_request), update_values, xpaths, operations)
 
-    # ---------- OPERATE ON EACH XPATH --------------
-    for i, xpath in enumerate(xpaths):
-        operation_for_this_xpath = operations[i]
-        value_for_this_xpath = update_values[i]
 
-        # ----------- LOGIC FOR UPDATE OPERATION ---------------
-        if operation_for_this_xpath == "update":
-            try:
-                els_to_update = tree.xpath(xpath)
-
-                # Update each element matching the xpath
-                for el_to_update in els_to_update:
-                    el_to_update.text = value_for_this_xpath
-            except:
-                logging.warning(f"Element does not exist on resource {resource_id}. Try the 'updateOrInsert' operation instead.")
-                raise KeyError()
-            
-        # -------------- LOGIC FOR UPDATE OR INSERT OPERATION ------------------
-        elif operation_for_this_xpath == "updateOrInsert":
-            # Remove the last xpath element from the user-defined xpath 
-            # (e.g. 'hours' in /vendor/meta/gracePeriod/hours)
-            # to get the name of the child element
-            child_el_name = xpath.split("/")[-1]
-
-            # Get the parent element. We want to perform updates / insertions for all parent elements.
-            parent_el_xpath = xpath.removesuffix(child_el_name).rstrip("/")
-            parent_els = tree.xpath(parent_el_xpath)
-
-            for i, parent_el in enumerate(parent_els):
-                new_xpath = f"{parent_el_xpath}/{child_el_name}"
-                xpath_results = tree.xpath(new_xpath)
+def update_tree(resource_id: str, tree: etree._Element, update_values: list[str] | None, xpaths: list[str] | None = None, operations: str | list[str] | None = None) -> bytes | None:
+    """Does the work of 'default_update_function' on XML that has already been parsed. The tree is changed
+    in place. Returns the updated XML, or None if the update didn't change anything."""
+    return get_update_plan(xpaths, operations).apply(resource_id, tree, update_values)
+
+
+def get_update_plan(xpaths: list[str], operations: list[str]) -> "UpdatePlan":
+    """Get the compiled plan for a set of xpaths and operations. Plans are cached, so each one is only
+    compiled once (per process, when a process pool is used)."""
+    return _cached_update_plan(tuple(xpaths), tuple(operations))
+
+
+@lru_cache(maxsize=32)
+def _cached_update_plan(xpaths: tuple[str, ...], operations: tuple[str, ...]) -> "UpdatePlan":
+    return UpdatePlan(list(xpaths), list(operations))
+
+
+@lru_cache(maxsize=1024)
+def _compile_xpath(xpath: str) -> etree.XPath:
+    return etree.XPath(xpath)
+
+
+class UpdatePlanStep:
+    """One xpath and its operation, with every xpath the operation needs compiled ahead of time."""
+    def __init__(self, xpath: str, operation: str):
+        self.xpath = xpath
+        self.operation = operation
+        self.find = _compile_xpath(xpath)
+
+        # Remove the last xpath element from the user-defined xpath 
+        # (e.g. 'hours' in /vendor/meta/gracePeriod/hours)
+        # to get the name of the child element, and the xpath of its parent.
+        self.child_el_name = xpath.split("/")[-1]
+        self.parent_el_xpath = xpath.removesuffix(self.child_el_name).rstrip("/")
+        if operation in ("insert", "updateOrInsert"):
+            self.find_parents = _compile_xpath(self.parent_el_xpath)
+            self.find_children = _compile_xpath(f"{self.parent_el_xpath}/{self.child_el_name}")
+
+
+class UpdatePlan:
+    """The xpaths and operations of the default update, compiled into etree.XPath objects once, rather than
+    having the xpath strings (and the parent xpaths built from them) evaluated again for every resource.
+
+    Each operation keeps track of whether it actually changed the tree (e.g. an update to the value an
+    element already has doesn't), so that telling whether there's anything to PUT costs nothing, and the
+    XML is only serialized if there is."""
+    def __init__(self, xpaths: list[str], operations: list[str]):
+        self.steps = [UpdatePlanStep(xpath, operations[i]) for i, xpath in enumerate(xpaths)]
+
+    def apply(self, resource_id: str, tree: etree._Element, update_values: list[str] | None) -> bytes | None:
+        """Run the plan on a tree, changing it in place. Returns the updated XML, or None if the update
+        didn't change anything."""
+        changed = False
+
+        # ---------- OPERATE ON EACH XPATH --------------
+        for i, step in enumerate(self.steps):
+            value_for_this_xpath = update_values[i]
+
+            # ----------- LOGIC FOR UPDATE OPERATION ---------------
+            if step.operation == "update":
+                try:
+                    els_to_update = step.find(tree)
+
+                    # Update each element matching the xpath
+                    for el_to_update in els_to_update:
+                        changed |= _set_text(el_to_update, value_for_this_xpath)
+                except:
+                    logging.warning("Element does not exist on resource %s. Try the 'updateOrInsert' operation instead.", resource_id)
+                    raise KeyError()
+
+            # -------------- LOGIC FOR UPDATE OR INSERT OPERATION ------------------
+            elif step.operation == "updateOrInsert":
+                # Look for the elements once, rather than once per parent element.
+                xpath_results = step.find_children(tree)
 
                 # If there's already one or more elements, update them.
                 if len(xpath_results) > 0:
                     for el_to_update in xpath_results:
-                        el_to_update.text = value_for_this_xpath
+                        changed |= _set_text(el_to_update, value_for_this_xpath)
 
-                # If there's no elements, insert the element
+                # If there's no elements, insert the element into each parent element.
                 else:
-                    # Create the child element
-                    el_to_add = Element(child_el_name)
-                    el_to_add.text = value_for_this_xpath
-
-                    # Add the child element to the parent element.
-                    parent_el.append(el_to_add)
-
-        # ----------- LOGIC FOR INSERT OPERATION --------------
-        elif operation_for_this_xpath == "insert":
-            # Remove the last xpath element from the user-defined xpath 
-            # (e.g. 'hours' in /vendor/meta/gracePeriod/hours)
-            # This gets us the element name we want to create.
-            el_to_create_name = xpath.split("/")[-1]
-            # Create the child element
-            el_to_add = Element(el_to_create_name)
-            el_to_add.text = value_for_this_xpath
-
-            # Get the parent element, into which we want to insert the child element.
-            parent_el_xpath = xpath.removesuffix(el_to_create_name).rstrip("/")
-            parent_el = tree.xpath(parent_el_xpath)[0]
-            
-            # Add the child element to the parent element
-            parent_el.append(el_to_add)
-
-        # ------------- LOGIC FOR DELETE OPERATION --------------
-        elif operation_for_this_xpath == "delete":
-            # The name of the element to delete is the value. This is set for clarity 
-            xpath_of_el_to_delete = value_for_this_xpath
-
-            for i, el_to_update in enumerate(tree.xpath(xpath)):
-                # Add an index to perform this operation on all elements returned by the xpath
-                # UNLESS a specific index was specified by the user.
-                index = "" if xpath.endswith("]") else f"[{i+1}]"
-                for el_to_delete in tree.xpath(f"{xpath}{index}{"/" if not xpath_of_el_to_delete.startswith("/") else ""}{xpath_of_el_to_delete}"):
-                    el_to_update.remove(el_to_delete)
-
-    updated_xml = etree.tostring(tree, pretty_print=True)
-    update_function_changed_things: bool = xmltodict.parse(xml_from_get_request) != xmltodict.parse(updated_xml)
-    return updated_xml if update_function_changed_things else None
+                    for parent_el in step.find_parents(tree):
+                        # Create the child element
+                        el_to_add = Element(step.child_el_name)
+                        el_to_add.text = value_for_this_xpath
+
+                        # Add the child element to the parent element.
+                        parent_el.append(el_to_add)
+                        changed = True
+
+            # ----------- LOGIC FOR INSERT OPERATION --------------
+            elif step.operation == "insert":
+                # Create the child element
+                el_to_add = Element(step.child_el_name)
+                el_to_add.text = value_for_this_xpath
+
+                # Get the parent element, into which we want to insert the child element.
+                parent_el = step.find_parents(tree)[0]
+
+                # Add the child element to the parent element
+                parent_el.append(el_to_add)
+                changed = True
+
+            # ------------- LOGIC FOR DELETE OPERATION --------------
+            elif step.operation == "delete":
+                # The name of the element to delete is the value. This is set for clarity 
+                xpath_of_el_to_delete = value_for_this_xpath
+
+                # The value is relative to each element returned by the xpath, so it's looked up from
+                # each of those elements, rather than searching the whole tree again for each one.
+                find_els_to_delete = _compile_xpath(f".{xpath_of_el_to_delete}" if xpath_of_el_to_delete.startswith("/") else xpath_of_el_to_delete)
+                for el_to_update in step.find(tree):
+                    for el_to_delete in find_els_to_delete(el_to_update):
+                        parent_el = el_to_delete.getparent()
+                        # It may already be gone, if it was found from more than one element.
+                        if parent_el is not None:
+                            parent_el.remove(el_to_delete)
+                            changed = True
+
+        return etree.tostring(tree, pretty_print=True) if changed else None
+
+
+def _set_text(el: etree._Element, value: str | None) -> bool:
+    """Set an element's text, returning whether that changed it. An element with no text and one with
+    empty text are treated as the same."""
+    if (el.text or "") == (value or ""):
+        return False
+    el.text = value
+    return True
 
 
 class XMLUpdater:
     """Class that holds the settings for the XML update, including which xpaths are used, which update
-    function is used, and which operation should be done on each xpath."""
-    def __init__(self, custom_update_function: callable = None, xpaths: list[str] | None = None, operations: list[str] | str | None = None):
+    function is used, and which operation should be done on each xpath.
+
+    If a process pool is passed, the update function is run in it, so that updates for several resources
+    can use several CPU cores. Only the XML bytes and the update values are sent to the pool, and the
+    update function must be picklable (i.e. defined at the top level of a module)."""
+    def __init__(self, custom_update_function: callable = None, xpaths: list[str] | None = None, operations: list[str] | str | None = None,
+                 process_pool: Executor | None = None):
         self.update_function = custom_update_function if custom_update_function else default_update_function
         self.xpaths = xpaths
         self.operations = operations
+        self.process_pool = process_pool
+
+        # Compile the xpaths for the built-in update once, up front. This also means a bad xpath stops
+        # the run before it starts, instead of failing every resource.
+        self.update_plan = get_update_plan(xpaths, operations) if self.update_function is default_update_function and xpaths is not None else None
 
     def update_resource(self, api_resource: ApiResource) -> ApiResource:
         """Create the updated XML for a resource."""
 
         # Run this operation on API resources that have pending status and have XML from the get request
-        if api_resource.status == "pending" and api_resource.xml_from_get_request:
+        if api_resource.status == ResourceStatus.PENDING and api_resource.xml_from_get_request:
             try:
-                logging.info(f"Updating XML for resource {api_resource.identifier}")
-                updated_xml = self.update_function(
-                    api_resource.identifier, api_resource.xml_from_get_request, api_resource.update_values, self.xpaths, self.operations)
+                logging.debug("Updating XML for resource %s", api_resource.identifier)
+                update_args = (api_resource.identifier, api_resource.xml_from_get_request, api_resource.update_values, self.xpaths, self.operations)
+                if self.process_pool:
+                    updated_xml = self.process_pool.submit(self.update_function, *update_args).result()
+                elif self.update_function is default_update_function:
+                    # Work on a copy of the tree that was parsed when the resource was retrieved, rather than
+                    # parsing the XML again. The original tree is left as it was for the comparator.
+                    updated_xml = self.update_plan.apply(api_resource.identifier, copy.deepcopy(api_resource.tree), api_resource.update_values)
+                else:
+                    updated_xml = self.update_function(*update_args)
                 
                 if updated_xml:
                     api_resource.xml_for_update_request = updated_xml
                 else:
-                    logging.info(f"Skipping update request for resource '{api_resource.identifier}' because the XML update function returned nothing. Marking it as complete.")
+                    logging.info("Skipping update request for resource '%s' because the XML update function returned nothing. Marking it as complete.", api_resource.identifier)
                     api_resource.mark_successful()
-            except KeyError:
-                api_resource.mark_failed()
-            except:
-                logging.exception(f"There was an exception in updating resource {api_resource.identifier}")
-                api_resource.mark_failed()
+            except KeyError as ke:
+                api_resource.mark_failed("update", "An xpath could not be updated", exception=ke)
+            except Exception as e:
+                logging.exception("There was an exception in updating resource %s", api_resource.identifier)
+                api_resource.mark_failed("update", exception=e)
 
         return api_resource
@@ -0,0 +1,9 @@
+class FakeResponse:
+    """Stands in for requests.Response, with only what the code under test reads from a response."""
+    def __init__(self, status_code: int = 200, content: bytes = b"", headers: dict | None = None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers if headers else {}
+
+    def close(self):
+        pass
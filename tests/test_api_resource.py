@@ -0,0 +1,58 @@
+import unittest
+
+from src.api_resource import ApiResource, ResourceStatus
+
+
+class TestApiResource(unittest.TestCase):
+
+    def test_tree_is_parsed_once(self):
+        api_resource = ApiResource("1", "https://fakeserver/1")
+        api_resource.xml_from_get_request = b"<vendor><code>A</code></vendor>"
+
+        self.assertIs(api_resource.tree, api_resource.tree)
+        self.assertEqual(api_resource.tree.findtext("code"), "A")
+
+    def test_setting_xml_replaces_tree(self):
+        api_resource = ApiResource("1", "https://fakeserver/1")
+        api_resource.xml_from_get_request = b"<vendor><code>A</code></vendor>"
+        api_resource.tree
+        api_resource.xml_from_get_request = b"<vendor><code>B</code></vendor>"
+
+        self.assertEqual(api_resource.tree.findtext("code"), "B")
+
+    def test_no_xml_no_tree(self):
+        self.assertIsNone(ApiResource("1", "https://fakeserver/1").tree)
+
+    def test_status_is_an_enum_that_compares_to_strings(self):
+        api_resource = ApiResource("1", "https://fakeserver/1", status="success")
+
+        self.assertIs(api_resource.status, ResourceStatus.SUCCESS)
+        self.assertEqual(api_resource.status, "success")
+        self.assertEqual(f"{api_resource.status}", "success")
+        with self.assertRaises(ValueError):
+            api_resource.status = "done"
+
+    def test_resources_have_no_dict(self):
+        api_resource = ApiResource("1", "https://fakeserver/1")
+
+        self.assertFalse(hasattr(api_resource, "__dict__"))
+        with self.assertRaises(AttributeError):
+            api_resource.not_an_attribute = True
+
+    def test_release_payloads(self):
+        api_resource = ApiResource("1", "https://fakeserver/1")
+        api_resource.xml_from_get_request = b"<vendor><code>A</code></vendor>"
+        api_resource.tree
+        api_resource.xml_for_update_request = b"<vendor><code>B</code></vendor>"
+        api_resource.update_response = b"<vendor><code>B</code></vendor>"
+        api_resource.comparison = "No Difference"
+        api_resource.mark_successful()
+
+        api_resource.release_payloads()
+
+        self.assertIsNone(api_resource.xml_from_get_request)
+        self.assertIsNone(api_resource.tree)
+        self.assertIsNone(api_resource.xml_for_update_request)
+        self.assertIsNone(api_resource.update_response)
+        self.assertEqual(api_resource.comparison, "No Difference")
+        self.assertEqual(api_resource.status, "success")
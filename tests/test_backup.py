@@ -1,4 +1,6 @@
 import unittest
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
 from src.backup import Backup
 
@@ -25,3 +27,109 @@ class TestBackupResource(unittest.TestCase):
         updated_name = Backup.normalize_identifier(name_to_normalize)
 
         self.assertEqual(updated_name, "_VENDOR_03__")
+
+
+    def test_encoded_identifiers_dont_collide(self):
+        identifiers = ["a.b", "a_b", "a/b", "a%2Fb", "A.B", "a:b", "a b"]
+
+        filepaths = [Backup.relative_filepath(identifier) for identifier in identifiers]
+
+        self.assertEqual(len(set(filepath.lower() for filepath in filepaths)), len(identifiers))
+        self.assertTrue(all(filepath.count("/") == 1 for filepath in filepaths))
+
+    def test_encoded_identifier_round_trip(self):
+        for identifier in ["/VENDOR_03/.", "**VENDOR_03", "a%2Fb", "x~y", "caf\u00e9\tbar", "a\\b|c<d>e?\"f'"]:
+            with self.subTest(identifier=identifier):
+                filepath = Backup.relative_filepath(identifier)
+                self.assertEqual(Backup.decode_identifier(filepath), identifier)
+
+    def test_encoded_identifier_is_readable(self):
+        self.assertTrue(Backup.encode_identifier("R1/x.1").startswith("R1%2Fx.1~"))
+
+
+class TestBackupStores(unittest.TestCase):
+
+    def setUp(self):
+        self.project_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.project_dir.cleanup()
+
+    def test_files_restore(self):
+        backuper = Backup(self.project_dir.name)
+        backuper.backup("VENDOR/1", b"<vendor/>")
+
+        self.assertEqual(backuper.restore("VENDOR/1"), b"<vendor/>")
+        self.assertIsNone(backuper.restore("VENDOR/2"))
+
+    def test_files_restore_legacy_backup(self):
+        # Backups made by older versions, named with 'normalize_identifier'.
+        backuper = Backup(self.project_dir.name)
+        with open(f"{backuper.backup_location}/VENDOR_1.xml", "wb") as f:
+            f.write(b"<vendor/>")
+
+        self.assertEqual(backuper.restore("VENDOR/1"), b"<vendor/>")
+
+        backuper.backup("VENDOR/1", b"<vendor><code>1</code></vendor>")
+        self.assertEqual(backuper.restore("VENDOR/1"), b"<vendor><code>1</code></vendor>")
+
+    def test_files_restore_legacy_backup_of_colliding_identifiers(self):
+        backuper = Backup(self.project_dir.name)
+        with open(f"{backuper.backup_location}/VENDOR_1.xml", "wb") as f:
+            f.write(b"<vendor><code>1</code></vendor>")
+        # 'VENDOR:1' is backed up under its own name now, but its old backup may be the one in VENDOR_1.xml.
+        backuper.backup("VENDOR:1", b"<vendor><code>2</code></vendor>")
+
+        with self.assertLogs(level="WARNING"):
+            self.assertIsNone(backuper.restore("VENDOR/1"))
+        self.assertEqual(backuper.restore("VENDOR:1"), b"<vendor><code>2</code></vendor>")
+        # Once a backup folder has been read, that's still the case after more backups are made.
+        with open(f"{backuper.backup_location}/VENDOR_2.xml", "wb") as f:
+            f.write(b"<vendor><code>3</code></vendor>")
+        self.assertEqual(backuper.restore("VENDOR/2"), b"<vendor><code>3</code></vendor>")
+        backuper.backup("VENDOR:2", b"<vendor><code>4</code></vendor>")
+        with self.assertLogs(level="WARNING"):
+            self.assertIsNone(backuper.restore("VENDOR/2"))
+
+    def test_packed_restore(self):
+        backuper = Backup(self.project_dir.name, store_format="packed")
+        self.assertEqual(backuper.backup("VENDOR/1", b"<vendor><code>1</code></vendor>"), 0)
+        backuper.backup("VENDOR/1", b"<vendor><code>2</code></vendor>")
+        backuper.close()
+
+        # The newer backup replaces the older one, and it's still there once the file is reopened.
+        backuper = Backup(self.project_dir.name, store_format="packed")
+        self.assertEqual(backuper.restore("VENDOR/1"), b"<vendor><code>2</code></vendor>")
+        self.assertIsNone(backuper.restore("VENDOR/2"))
+        self.assertEqual(backuper.packed_store.identifiers(), ["VENDOR/1"])
+        backuper.close()
+
+    def test_restore_backups_made_in_the_other_format(self):
+        files_backuper = Backup(self.project_dir.name)
+        files_backuper.backup("VENDOR/1", b"<vendor><code>1</code></vendor>")
+        packed_backuper = Backup(self.project_dir.name, store_format="packed")
+        packed_backuper.backup("VENDOR/2", b"<vendor><code>2</code></vendor>")
+        packed_backuper.backup("VENDOR/1", b"<vendor><code>3</code></vendor>")
+        packed_backuper.close()
+
+        self.assertEqual(files_backuper.restore("VENDOR/2"), b"<vendor><code>2</code></vendor>")
+        self.assertEqual(files_backuper.restore("VENDOR/1"), b"<vendor><code>1</code></vendor>")
+        self.assertIsNone(files_backuper.restore("VENDOR/3"))
+        files_backuper.close()
+
+        packed_backuper = Backup(self.project_dir.name, store_format="packed")
+        files_backuper.backup("VENDOR/4", b"<vendor><code>4</code></vendor>")
+        self.assertEqual(packed_backuper.restore("VENDOR/4"), b"<vendor><code>4</code></vendor>")
+        self.assertEqual(packed_backuper.restore("VENDOR/1"), b"<vendor><code>3</code></vendor>")
+        packed_backuper.close()
+
+    def test_packed_backups_from_many_threads(self):
+        backuper = Backup(self.project_dir.name, store_format="packed")
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda i: backuper.backup(f"R{i}", f"<r>{i}</r>".encode()), range(200)))
+
+        self.assertEqual(results, [0] * 200)
+        self.assertEqual(backuper.files_written, 200)
+        self.assertEqual(backuper.restore("R150"), b"<r>150</r>")
+        backuper.close()
+
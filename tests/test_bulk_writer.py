@@ -0,0 +1,59 @@
+import unittest
+
+from src.api_resource import ApiResource
+from src.bulk_writer import BulkWriter
+
+
+def make_resource(identifier: str) -> ApiResource:
+    api_resource = ApiResource(identifier, f"https://fakeserver/{identifier}")
+    api_resource.xml_for_update_request = f"<vendor><code>{identifier}</code></vendor>".encode()
+    return api_resource
+
+
+class TestBulkWriter(unittest.TestCase):
+
+    def test_batches_are_written_when_full(self):
+        batches = []
+        def write(session, updates):
+            batches.append(updates)
+            return {identifier: True for identifier, _ in updates}
+
+        bw = BulkWriter(write, session=None, batch_size=2)
+
+        self.assertEqual(bw.add(make_resource("1")), [])
+        written = bw.add(make_resource("2"))
+        self.assertEqual([api_resource.identifier for api_resource in written], ["1", "2"])
+        self.assertTrue(all(api_resource.status == "success" for api_resource in written))
+        self.assertEqual(batches[0][0], ("1", b"<vendor><code>1</code></vendor>"))
+
+        bw.add(make_resource("3"))
+        self.assertEqual([api_resource.identifier for api_resource in bw.flush()], ["3"])
+        self.assertEqual(bw.flush(), [])
+        self.assertEqual(len(batches), 2)
+
+    def test_per_item_results(self):
+        def write(session, updates):
+            return {"1": True, "2": False, "3": b"<vendor><code>3</code></vendor>"}
+
+        bw = BulkWriter(write, session=None, batch_size=10)
+        for identifier in ["1", "2", "3", "4"]:
+            bw.add(make_resource(identifier))
+        one, two, three, four = bw.flush()
+
+        self.assertEqual(one.status, "success")
+        self.assertEqual(two.status, "failed")
+        self.assertEqual(two.failure.stage, "bulk write")
+        self.assertEqual(three.status, "success")
+        self.assertEqual(three.update_response, b"<vendor><code>3</code></vendor>")
+        self.assertEqual(four.status, "failed")
+
+    def test_exception_fails_the_batch(self):
+        def write(session, updates):
+            raise ConnectionError("API is down")
+
+        bw = BulkWriter(write, session=None, batch_size=2)
+        bw.add(make_resource("1"))
+        written = bw.add(make_resource("2"))
+
+        self.assertTrue(all(api_resource.status == "failed" for api_resource in written))
+        self.assertEqual(written[0].failure.exception_type, "ConnectionError")
@@ -1,7 +1,9 @@
-import unittest
 import json
+import os
+import tempfile
+import unittest
 
-from src.comparator import Comparator
+from src.comparator import Comparator, ComparisonLog
 from src.api_resource import ApiResource
 
 
@@ -173,3 +175,30 @@ class TestComparator(unittest.TestCase):
                 "BRILL": "Update was not run; XML update function returned None indicating update did not need to be performed."
             }
         )
+
+
+class TestComparisonLog(unittest.TestCase):
+    def test_comparisons_are_appended_across_runs(self):
+        with tempfile.TemporaryDirectory() as folder:
+            comparison_filepath = os.path.join(folder, "comparisons.jsonl")
+
+            log = ComparisonLog(comparison_filepath)
+            log.write("BRILL", "No Difference")
+            log.write("XLLSM", {"values_changed": {"root['vendor']['code']": {"new_value": "B", "old_value": "A"}}})
+            log.close()
+
+            log = ComparisonLog(comparison_filepath)
+            log.write("BRILL", "Update will not be performed.")
+            log.close()
+
+            # Simulate the program being killed partway through a line.
+            with open(comparison_filepath, "a") as f:
+                f.write('{"id": "CUT", "compar')
+
+            self.assertDictEqual(ComparisonLog.read_comparisons(comparison_filepath), {
+                "BRILL": "Update will not be performed.",
+                "XLLSM": {"values_changed": {"root['vendor']['code']": {"new_value": "B", "old_value": "A"}}},
+            })
+
+    def test_read_missing_file(self):
+        self.assertDictEqual(ComparisonLog.read_comparisons("tests/testdata/does_not_exist.jsonl"), {})
@@ -0,0 +1,68 @@
+import unittest
+import os
+import tempfile
+
+from src.api_resource import ApiResource
+from src.dry_run_manifest import DryRunManifest, DryRunPromoter
+
+XPATHS = ["/vendor/code"]
+OPERATIONS = ["update"]
+
+
+def make_resource(identifier: str, xml: bytes, update_values: list[str] | None = None) -> ApiResource:
+    api_resource = ApiResource(identifier, f"https://fakeserver/{identifier}", update_values if update_values else ["B"])
+    api_resource.xml_from_get_request = xml
+    return api_resource
+
+
+class TestDryRunPromotion(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        manifest = DryRunManifest(self.folder.name, XPATHS, OPERATIONS)
+
+        updated = make_resource("1", b"<vendor><code>A</code></vendor>")
+        with open(os.path.join(self.folder.name, "1.xml"), "wb") as f:
+            f.write(b"<vendor><code>B</code></vendor>")
+        manifest.record(updated, "1.xml")
+        manifest.record(make_resource("2", b"<vendor><code>B</code></vendor>"), None)
+        manifest.close()
+
+        self.promoter = DryRunPromoter(self.folder.name, XPATHS, OPERATIONS)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_unchanged_resource_uses_dry_run_xml(self):
+        api_resource = self.promoter.promote(make_resource("1", b"<vendor><code>A</code></vendor>"))
+
+        self.assertEqual(api_resource.status, "pending")
+        self.assertEqual(api_resource.xml_for_update_request, b"<vendor><code>B</code></vendor>")
+
+    def test_nothing_to_update(self):
+        api_resource = self.promoter.promote(make_resource("2", b"<vendor><code>B</code></vendor>"))
+
+        self.assertEqual(api_resource.status, "success")
+        self.assertIsNone(api_resource.xml_for_update_request)
+
+    def test_changed_resource_is_failed(self):
+        api_resource = self.promoter.promote(make_resource("1", b"<vendor><code>C</code></vendor>"))
+
+        self.assertEqual(api_resource.status, "failed")
+        self.assertEqual(api_resource.failure.stage, "promote")
+        self.assertIsNone(api_resource.xml_for_update_request)
+
+    def test_changed_update_values_are_failed(self):
+        api_resource = self.promoter.promote(make_resource("1", b"<vendor><code>A</code></vendor>", ["D"]))
+
+        self.assertEqual(api_resource.status, "failed")
+
+    def test_resource_not_in_dry_run_is_failed(self):
+        api_resource = self.promoter.promote(make_resource("3", b"<vendor><code>A</code></vendor>"))
+
+        self.assertEqual(api_resource.status, "failed")
+
+    def test_no_dry_run(self):
+        with tempfile.TemporaryDirectory() as folder:
+            with self.assertRaises(FileNotFoundError):
+                DryRunPromoter(folder)
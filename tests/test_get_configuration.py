@@ -19,6 +19,9 @@ class TestGetConfiguration(unittest.TestCase):
         self.assertEqual(configuration.update_file, "tests/testdata/proj_basic/input.csv")
         self.assertEqual(configuration.api_url_template, "https://alma.exlibrisgroup.com/users/<resource_id>")
         self.assertEqual(configuration.query_param_api_key, "apikey=1234")
+        # Not set in this project's settings, so it should fall back to the default.
+        self.assertEqual(configuration.max_concurrency, 1)
+        self.assertEqual(configuration.http_timeout, (10, 60))
 
     def test_get_configuration_mismatched_xpaths_and_operations(self):
         """If 'operations' is an array, there should be the same number of operations as xpaths"""
@@ -32,4 +35,8 @@ class TestGetConfiguration(unittest.TestCase):
 
     def test_get_configuration_no_operations_custom_function(self):
         # This should not throw an error. 
-        get_configuration("tests/testdata/proj_no_operations_custom_function")
\ No newline at end of file
+        get_configuration("tests/testdata/proj_no_operations_custom_function")
+
+    def test_get_configuration_invalid_max_concurrency_raises_error(self):
+        with self.assertRaises(ValueError):
+            get_configuration("tests/testdata/proj_invalid_concurrency")
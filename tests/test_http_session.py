@@ -0,0 +1,56 @@
+import socket
+import unittest
+
+import requests
+
+from src.api_resource import ApiResource
+from src.http_session import create_session
+from src.rate_limiter import RateLimiter
+from src.retry_policy import RetryPolicy
+
+
+class TestHttpSession(unittest.TestCase):
+
+    def test_create_session_pool_size(self):
+        session = create_session(pool_size=25)
+
+        adapter = session.get_adapter("https://example.com")
+        self.assertEqual(adapter._pool_maxsize, 25)
+        # The same pooled adapter serves plain HTTP too.
+        self.assertIs(session.get_adapter("http://example.com"), adapter)
+
+    def test_create_session_connect_retries(self):
+        session = create_session(connect_retries=3)
+
+        retries = session.get_adapter("https://example.com").max_retries
+        self.assertEqual(retries.connect, 3)
+        # Only connection failures are retried here; the request never reached the API.
+        self.assertEqual(retries.read, 0)
+        self.assertEqual(retries.status, 0)
+
+    def test_create_session_keep_alive_off(self):
+        session = create_session(keep_alive=False)
+
+        self.assertEqual(session.headers["Connection"], "close")
+
+    def test_create_session_timeout(self):
+        self.assertEqual(create_session().get_adapter("https://example.com").timeout, (10, 60))
+        self.assertEqual(create_session(rate_limiter=RateLimiter(), timeout=5).get_adapter("https://example.com").timeout, 5)
+
+    def test_stalled_request_is_retried_and_fails(self):
+        # A server that accepts connections but never answers.
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        url = f"http://127.0.0.1:{server.getsockname()[1]}/1"
+        session = create_session(rate_limiter=RateLimiter(), timeout=(1, 0.1))
+        api_resource = ApiResource("1", url)
+
+        try:
+            with self.assertRaises((requests.Timeout, requests.ConnectionError)):
+                RetryPolicy(max_attempts=2, backoff_factor=0).call(lambda: session.get(url), api_resource, "GET")
+        finally:
+            session.close()
+            server.close()
+
+        self.assertEqual(api_resource.attempts, {"GET": 2})
@@ -0,0 +1,115 @@
+import datetime
+import json
+import os
+import tempfile
+import unittest
+
+import requests
+
+from src.api_resource import ApiResource
+from src.metrics import Histogram, RunMetrics
+
+
+def make_response(method: str, status_code: int, body: bytes, request_body: bytes | None = None) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = body
+    response.elapsed = datetime.timedelta(milliseconds=20)
+    response.request = requests.Request(method, "https://fakeserver/1", data=request_body).prepare()
+    return response
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_percentiles_are_bucket_upper_bounds(self):
+        histogram = Histogram()
+        for _ in range(98):
+            histogram.observe(0.003)
+        histogram.observe(0.2)
+        histogram.observe(0.2)
+
+        self.assertEqual(histogram.count, 100)
+        self.assertEqual(histogram.percentile(50), 0.005)
+        self.assertEqual(histogram.percentile(99), 0.2)
+        self.assertEqual(histogram.summary()["max_ms"], 200.0)
+
+    def test_times_longer_than_the_last_bucket(self):
+        histogram = Histogram()
+        histogram.observe(120)
+
+        self.assertEqual(histogram.bucket_counts[-1], 1)
+        self.assertEqual(histogram.percentile(50), 120)
+
+    def test_empty(self):
+        self.assertEqual(Histogram().summary()["p99_ms"], 0.0)
+
+
+class TestRunMetrics(unittest.TestCase):
+
+    def test_time_stage(self):
+        metrics = RunMetrics()
+        with metrics.time_stage("GET"):
+            pass
+        with self.assertRaises(ValueError):
+            with metrics.time_stage("GET"):
+                raise ValueError()
+
+        # Stages that raise are still timed.
+        self.assertEqual(metrics.stage_seconds["GET"].count, 2)
+
+    def test_observe_response(self):
+        metrics = RunMetrics()
+        metrics.observe_response(make_response("GET", 200, b"<vendor/>"))
+        metrics.observe_response(make_response("PUT", 500, b"error", request_body=b"<vendor></vendor>"))
+
+        summary = metrics.summary()["http"]
+        self.assertEqual(summary["responses"], {"GET 200": 1, "PUT 500": 1})
+        self.assertEqual(summary["bytes_received"], 14)
+        self.assertEqual(summary["bytes_sent"], 17)
+        self.assertEqual(summary["request_seconds"]["GET"]["max_ms"], 20.0)
+
+    def test_record_resource(self):
+        metrics = RunMetrics()
+        succeeded = ApiResource("1", "https://fakeserver/1")
+        succeeded.attempts.update({"GET": 1, "PUT": 3})
+        succeeded.mark_successful()
+        failed = ApiResource("2", "https://fakeserver/2")
+        failed.mark_failed("verify", "No match")
+
+        metrics.record_resource(succeeded)
+        metrics.record_resource(failed)
+
+        summary = metrics.summary()
+        self.assertEqual(summary["resources"], {"success": 1, "failed": 1})
+        self.assertEqual(summary["failures_by_stage"], {"verify": 1})
+        self.assertEqual(summary["retries"], {"PUT": 2})
+
+    def test_write_json_and_prometheus(self):
+        metrics = RunMetrics()
+        metrics.observe_stage("PUT", 0.03)
+        metrics.observe_response(make_response("PUT", 200, b"<vendor/>"))
+        resource = ApiResource("1", "https://fakeserver/1")
+        resource.mark_successful()
+        metrics.record_resource(resource)
+
+        with tempfile.TemporaryDirectory() as folder:
+            metrics.write_json(os.path.join(folder, "metrics.json"))
+            metrics.write_prometheus(os.path.join(folder, "metrics.prom"), labels={"project": 'my "project"'})
+
+            with open(os.path.join(folder, "metrics.json")) as f:
+                self.assertEqual(json.load(f)["stage_seconds"]["PUT"]["count"], 1)
+            with open(os.path.join(folder, "metrics.prom")) as f:
+                lines = f.read().splitlines()
+            # No temporary files are left behind.
+            self.assertCountEqual(os.listdir(folder), ["metrics.json", "metrics.prom"])
+
+        self.assertIn('api_update_stage_seconds_bucket{project="my \\"project\\"",stage="PUT",le="0.05"} 1', lines)
+        self.assertIn('api_update_stage_seconds_bucket{project="my \\"project\\"",stage="PUT",le="+Inf"} 1', lines)
+        self.assertIn('api_update_stage_seconds_count{project="my \\"project\\"",stage="PUT"} 1', lines)
+        self.assertIn('api_update_http_responses_total{project="my \\"project\\"",method="PUT",status="200"} 1', lines)
+        self.assertIn('api_update_resources_total{project="my \\"project\\"",status="success"} 1', lines)
+        self.assertIn("# TYPE api_update_retries_total counter", lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,7 @@
 import unittest
+import os
+import shutil
+import tempfile
 
 from src.progress_manager import ProgressManager
 from src.api_resource import ApiResource
@@ -12,7 +15,7 @@ class TestProgressManager(unittest.TestCase):
         expected_completed_api_resources = ["1234", "1235", "1236", "1237"]
 
         self.assertListEqual(
-            pm.previously_completed_api_resources, expected_completed_api_resources)
+            list(pm.previously_completed_api_resources), expected_completed_api_resources)
 
     def test_initialize_progress_manager_read_application_retry_failed(self):
         pm = ProgressManager("tests/testdata/testproject", retry_failed=True)
@@ -20,7 +23,13 @@ class TestProgressManager(unittest.TestCase):
         expected_completed_api_resources = ["1235", "1236", "1237"]
 
         self.assertListEqual(
-            pm.previously_completed_api_resources, expected_completed_api_resources)
+            list(pm.previously_completed_api_resources), expected_completed_api_resources)
+
+    def test_previously_completed_api_resources_hold_status(self):
+        pm = ProgressManager("tests/testdata/testproject")
+
+        self.assertEqual(pm.previously_completed_api_resources["1234"], "failed")
+        self.assertEqual(pm.previously_completed_api_resources["1235"], "success")
 
     def test_create_updated_state(self):
         # This test simulates adding new, finished API resources to a previous run that wasn't
@@ -113,3 +122,68 @@ class TestProgressManager(unittest.TestCase):
 
         for i, state_object in enumerate(expected_new_state):
             self.assertDictEqual(new_state[i], state_object)
+
+
+class TestProgressJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.project_dir = tempfile.TemporaryDirectory()
+        self.project_path = self.project_dir.name
+        shutil.copy("tests/testdata/testproject/progress.csv", f"{self.project_path}/progress.csv")
+
+    def tearDown(self):
+        self.project_dir.cleanup()
+
+    def read_progress(self) -> list[str]:
+        with open(f"{self.project_path}/progress.csv", "r", encoding="utf-8-sig") as f:
+            return f.read().splitlines()
+
+    def test_record_writes_journal_immediately(self):
+        pm = ProgressManager(self.project_path)
+
+        pm.record(ApiResource("7683", None, status="success"))
+        pm.record(ApiResource("3829", None, status="failed"))
+        pm.record(ApiResource("2345", None, status="pending"))
+
+        with open(pm.journal_file_name, "r") as f:
+            self.assertEqual(f.read().splitlines(), ["7683,success", "3829,failed"])
+        # progress.csv is only touched on compaction.
+        self.assertEqual(len(self.read_progress()), 5)
+
+    def test_close_moves_journal_into_progress(self):
+        pm = ProgressManager(self.project_path)
+        pm.record(ApiResource("7683", None, status="success"))
+        pm.close()
+
+        self.assertFalse(os.path.exists(pm.journal_file_name))
+        self.assertEqual(self.read_progress(), ["ID,Status", "1234,failed", "1235,success", "1236,success", "1237,success", "7683,success"])
+
+    def test_compaction_interval(self):
+        pm = ProgressManager(self.project_path, compaction_interval=2)
+        pm.record(ApiResource("7683", None, status="success"))
+        self.assertEqual(len(self.read_progress()), 5)
+
+        pm.record(ApiResource("3829", None, status="success"))
+        self.assertEqual(len(self.read_progress()), 7)
+        self.assertFalse(os.path.exists(pm.journal_file_name))
+
+    def test_journal_left_by_killed_run_is_recovered(self):
+        pm = ProgressManager(self.project_path)
+        pm.record(ApiResource("7683", None, status="success"))
+        # Simulate the program being killed while writing the next line.
+        with open(pm.journal_file_name, "a") as f:
+            f.write("3829,succ")
+
+        pm = ProgressManager(self.project_path)
+
+        self.assertIn("7683", pm.previously_completed_api_resources)
+        self.assertNotIn("3829", pm.previously_completed_api_resources)
+        self.assertEqual(self.read_progress()[-1], "7683,success")
+
+    def test_retry_failed_rewrites_progress_without_retried_failures(self):
+        pm = ProgressManager(self.project_path, retry_failed=True)
+        pm.record(ApiResource("1234", None, status="success"))
+        pm.close()
+
+        self.assertEqual(self.read_progress(), ["ID,Status", "1235,success", "1236,success", "1237,success", "1234,success"])
+
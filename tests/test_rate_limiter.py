@@ -0,0 +1,106 @@
+import unittest
+import time
+from unittest.mock import patch
+from requests import PreparedRequest
+from requests.adapters import HTTPAdapter
+
+from src.rate_limiter import RateLimiter, RateLimitedAdapter, QuotaExhaustedError
+from tests.fakes import FakeResponse
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_requests_are_spaced_to_the_rate(self):
+        rl = RateLimiter(requests_per_second=100)
+
+        start = time.monotonic()
+        for _ in range(11):
+            rl.acquire()
+        elapsed = time.monotonic() - start
+
+        # The first request goes straight out, the next ten wait 1/100th of a second each.
+        self.assertGreaterEqual(elapsed, 0.09)
+
+    def test_burst_goes_out_without_waiting(self):
+        rl = RateLimiter(requests_per_second=1, burst=5)
+
+        start = time.monotonic()
+        for _ in range(5):
+            rl.acquire()
+
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_no_rate_does_not_wait(self):
+        rl = RateLimiter()
+
+        start = time.monotonic()
+        for _ in range(1000):
+            rl.acquire()
+
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_daily_request_limit(self):
+        rl = RateLimiter(daily_request_limit=3)
+        for _ in range(3):
+            rl.acquire()
+
+        with self.assertRaises(QuotaExhaustedError):
+            rl.acquire()
+
+    def test_remaining_quota_header(self):
+        rl = RateLimiter(min_remaining_quota=10)
+        rl.acquire()
+        rl.observe(FakeResponse(200, headers={"X-Exl-Api-Remaining": "11"}))
+        rl.acquire()
+        rl.observe(FakeResponse(200, headers={"X-Exl-Api-Remaining": "10"}))
+
+        with self.assertRaises(QuotaExhaustedError):
+            rl.acquire()
+
+    def test_429_pauses_and_slows_down(self):
+        rl = RateLimiter(requests_per_second=100)
+        rl.observe(FakeResponse(429, headers={"Retry-After": "0.2"}))
+
+        self.assertEqual(rl.current_rate, 50)
+        start = time.monotonic()
+        rl.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+
+        # The rate recovers as requests succeed again.
+        for _ in range(20):
+            rl.observe(FakeResponse(200))
+        self.assertEqual(rl.current_rate, 100)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(RateLimiter._parse_retry_after("3"), 3)
+        self.assertEqual(RateLimiter._parse_retry_after(None), RateLimiter.DEFAULT_RETRY_AFTER_SECONDS)
+        self.assertEqual(RateLimiter._parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0)
+        self.assertEqual(RateLimiter._parse_retry_after("soon"), RateLimiter.DEFAULT_RETRY_AFTER_SECONDS)
+
+
+class TestRateLimitedAdapter(unittest.TestCase):
+
+    def make_request(self) -> PreparedRequest:
+        request = PreparedRequest()
+        request.prepare(method="PUT", url="https://example.com/vendor/1", data=b"<vendor/>")
+        return request
+
+    def test_resends_throttled_request(self):
+        responses = [FakeResponse(429, headers={"Retry-After": "0"}), FakeResponse(200)]
+        adapter = RateLimitedAdapter(RateLimiter())
+
+        with patch.object(HTTPAdapter, "send", side_effect=responses) as send:
+            response = adapter.send(self.make_request())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(send.call_count, 2)
+
+    def test_gives_up_after_max_throttled_retries(self):
+        responses = [FakeResponse(429, headers={"Retry-After": "0"}) for _ in range(3)]
+        adapter = RateLimitedAdapter(RateLimiter(), max_throttled_retries=2)
+
+        with patch.object(HTTPAdapter, "send", side_effect=responses) as send:
+            response = adapter.send(self.make_request())
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(send.call_count, 3)
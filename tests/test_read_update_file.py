@@ -1,6 +1,6 @@
 import unittest 
 
-from src.read_update_file import read_update_file
+from src.read_update_file import read_update_file, iter_update_file, count_update_file
 from src.get_configuration import get_configuration
 
 class TestReadInput(unittest.TestCase):
@@ -78,3 +78,16 @@ class TestReadInput(unittest.TestCase):
         for api_resource in api_resources:
             self.assertEqual(api_resource.update_values, [])
 
+    def test_iter_update_file_is_lazy(self):
+        settings = get_configuration("tests/testdata/proj_basic")
+        api_resources = iter_update_file(settings, api_resources_to_exclude={"19982"})
+
+        self.assertEqual(next(api_resources).identifier, "123199")
+        self.assertEqual(next(api_resources).identifier, "23844")
+
+    def test_count_update_file(self):
+        settings = get_configuration("tests/testdata/proj_basic")
+
+        self.assertEqual(count_update_file(settings, api_resources_to_exclude={}), 4)
+        self.assertEqual(count_update_file(settings, api_resources_to_exclude={"19982": "success"}), 3)
+        self.assertEqual(count_update_file(settings, api_resources_to_exclude={}, update_limit=2), 2)
@@ -0,0 +1,323 @@
+import os
+import unittest
+import multiprocessing
+import tempfile
+import threading
+import time
+import requests
+from concurrent.futures import ProcessPoolExecutor
+
+from src.api_resource import ApiResource
+from src.backup import Backup
+from src.bulk_writer import BulkWriter
+from src.comparator import Comparator
+from src.dry_run_manifest import DryRunManifest, DryRunPromoter
+from src.get_configuration import Settings
+from src.metrics import RunMetrics
+from src.rate_limiter import QuotaExhaustedError
+from src.resource_pipeline import ResourcePipeline, TooManyFailuresError
+from src.response_cache import ResponseCache
+from src.retry_policy import RetryPolicy
+from src.xml_updater import XMLUpdater
+from tests.fakes import FakeResponse
+
+
+class FakeSession:
+    """Stands in for requests.Session. Serves the same XML for every GET and records every PUT."""
+    def __init__(self, xml: bytes, put_status_code: int = 200, delay: float = 0, put_status_codes: list[int] | None = None,
+                 bad_get_urls: dict | None = None):
+        self.xml = xml
+        # URLs whose GET should fail, mapped to the exception to raise or the body to return.
+        self.bad_get_urls = bad_get_urls if bad_get_urls else {}
+        self.put_status_code = put_status_code
+        # Status codes to answer the first PUTs with, before falling back to put_status_code.
+        self.put_status_codes = list(put_status_codes) if put_status_codes else []
+        self.delay = delay
+        self.gets = 0
+        self.puts = {}
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def _track(self):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+
+    def get(self, url, headers=None):
+        self._track()
+        with self._lock:
+            self.gets += 1
+        bad_get = self.bad_get_urls.get(url)
+        if isinstance(bad_get, Exception):
+            raise bad_get
+        if bad_get is not None:
+            return FakeResponse(500, bad_get)
+        return FakeResponse(200, self.xml)
+
+    def put(self, url, data=None, headers=None):
+        self._track()
+        with self._lock:
+            status_code = self.put_status_codes.pop(0) if self.put_status_codes else self.put_status_code
+        self.puts[url] = data
+        return FakeResponse(status_code, data)
+
+
+def make_settings(dry_run: bool, max_concurrency: int, max_consecutive_failures: int | None = None) -> Settings:
+    settings = Settings()
+    settings.xpath_for_get_response_verification = "/vendor/meta/gracePeriod/days"
+    settings.dry_run = dry_run
+    settings.max_concurrency = max_concurrency
+    settings.max_consecutive_failures = max_consecutive_failures
+    return settings
+
+
+class TestResourcePipeline(unittest.TestCase):
+
+    def setUp(self):
+        with open("tests/testdata/xml/xml_resource.xml", "rb") as f:
+            self.xml_resource = f.read()
+        self.project_dir = tempfile.TemporaryDirectory()
+        self.xu = XMLUpdater(xpaths=["/vendor/meta/gracePeriod/days"], operations=["update"])
+
+    def tearDown(self):
+        self.project_dir.cleanup()
+
+    def run_pipeline(self, session: FakeSession, api_resources: list[ApiResource], dry_run: bool = False, max_concurrency: int = 1):
+        backuper = Backup(self.project_dir.name)
+        pipeline = ResourcePipeline(make_settings(dry_run, max_concurrency), backuper, self.xu, session, dry_run_folder=self.project_dir.name)
+        return list(pipeline.run(api_resources)), backuper
+
+    def test_production_run_puts_and_backs_up(self):
+        session = FakeSession(self.xml_resource)
+        api_resources = [ApiResource(str(i), f"https://fakeserver/{i}", ["8"]) for i in range(3)]
+
+        completed, backuper = self.run_pipeline(session, api_resources)
+
+        # Both the GET and the PUT go through the shared session.
+        self.assertEqual(session.gets, 3)
+
+        self.assertEqual(len(completed), 3)
+        self.assertTrue(all(api_resource.status == "success" for api_resource in completed))
+        self.assertEqual(len(session.puts), 3)
+        self.assertEqual(backuper.files_written, 3)
+
+    def test_failed_put_marks_resource_failed(self):
+        session = FakeSession(self.xml_resource, put_status_code=400)
+        api_resources = [ApiResource("1", "https://fakeserver/1", ["8"])]
+
+        completed, _ = self.run_pipeline(session, api_resources)
+
+        self.assertEqual(completed[0].status, "failed")
+
+    def test_transient_put_failure_is_retried(self):
+        session = FakeSession(self.xml_resource, put_status_codes=[503, 502])
+        api_resources = [ApiResource("1", "https://fakeserver/1", ["8"])]
+        pipeline = ResourcePipeline(make_settings(False, 1), Backup(self.project_dir.name), self.xu, session,
+                                    retry_policy=RetryPolicy(max_attempts=3, backoff_factor=0))
+
+        completed = list(pipeline.run(api_resources))
+
+        self.assertEqual(completed[0].status, "success")
+        self.assertEqual(completed[0].attempts, {"GET": 1, "PUT": 3})
+
+    def test_dry_run_does_not_put(self):
+        session = FakeSession(self.xml_resource)
+        api_resources = [ApiResource("1", "https://fakeserver/1", ["8"])]
+
+        completed, backuper = self.run_pipeline(session, api_resources, dry_run=True)
+
+        self.assertEqual(completed[0].status, "pending")
+        self.assertEqual(session.puts, {})
+        self.assertEqual(backuper.files_written, 0)
+
+    def test_dry_run_files_dont_collide(self):
+        session = FakeSession(self.xml_resource)
+        api_resources = [ApiResource(identifier, f"https://fakeserver/{i}", ["8"]) for i, identifier in enumerate(["a.b", "a_b", "a/b"])]
+
+        self.run_pipeline(session, api_resources, dry_run=True)
+
+        for identifier in ["a.b", "a_b", "a/b"]:
+            self.assertTrue(os.path.isfile(os.path.join(self.project_dir.name, Backup.relative_filepath(identifier))))
+
+    def test_promotion_downloads_resources_the_cache_cant_confirm(self):
+        # The API sends no ETag or Last-Modified, so the saved copies from the dry run can't be checked
+        # with it. The promotion must still get each resource again, or a change made since the dry run
+        # would never be noticed.
+        xpaths, operations = ["/vendor/meta/gracePeriod/days"], ["update"]
+        cache = ResponseCache(os.path.join(self.project_dir.name, "response_cache.sqlite"))
+        dry_run_folder = os.path.join(self.project_dir.name, "dryRun")
+        os.mkdir(dry_run_folder)
+        manifest = DryRunManifest(dry_run_folder, xpaths, operations)
+        dry_run = ResourcePipeline(make_settings(True, 1), Backup(self.project_dir.name), self.xu, FakeSession(self.xml_resource),
+                                   dry_run_folder=dry_run_folder, response_cache=cache, dry_run_manifest=manifest)
+        list(dry_run.run([ApiResource("1", "https://fakeserver/1", ["8"])]))
+        manifest.close()
+
+        session = FakeSession(self.xml_resource.replace(b"11224", b"99999"))
+        promotion = ResourcePipeline(make_settings(False, 1), Backup(self.project_dir.name), self.xu, session, response_cache=cache,
+                                     dry_run_promoter=DryRunPromoter(dry_run_folder, xpaths, operations))
+        completed = list(promotion.run([ApiResource("1", "https://fakeserver/1", ["8"])]))
+        cache.close()
+
+        self.assertEqual(session.gets, 1)
+        self.assertEqual(completed[0].status, "failed")
+        self.assertEqual(completed[0].failure.stage, "promote")
+        self.assertEqual(session.puts, {})
+
+    def test_stages_are_timed(self):
+        session = FakeSession(self.xml_resource)
+        metrics = RunMetrics()
+        pipeline = ResourcePipeline(make_settings(False, 2), Backup(self.project_dir.name), self.xu, session,
+                                    comparator=Comparator("/"), metrics=metrics)
+
+        list(pipeline.run([ApiResource(str(i), f"https://fakeserver/{i}", ["8"]) for i in range(3)]))
+
+        for stage in ["GET", "verify", "backup", "update", "PUT", "compare"]:
+            self.assertEqual(metrics.stage_seconds[stage].count, 3, stage)
+        self.assertEqual(metrics.resource_seconds.count, 3)
+
+    def test_concurrent_run_processes_every_resource_once(self):
+        session = FakeSession(self.xml_resource, delay=0.01)
+        api_resources = [ApiResource(str(i), f"https://fakeserver/{i}", ["8"]) for i in range(40)]
+
+        completed, backuper = self.run_pipeline(session, api_resources, max_concurrency=8)
+
+        self.assertCountEqual([r.identifier for r in completed], [r.identifier for r in api_resources])
+        self.assertEqual(len(session.puts), 40)
+        self.assertEqual(backuper.files_written, 40)
+        self.assertGreater(session.max_active, 1)
+        self.assertLessEqual(session.max_active, 8)
+
+    def test_stopping_early_leaves_unstarted_resources_pending(self):
+        session = FakeSession(self.xml_resource, delay=0.01)
+        api_resources = [ApiResource(str(i), f"https://fakeserver/{i}", ["8"]) for i in range(100)]
+        pipeline = ResourcePipeline(make_settings(False, 4), Backup(self.project_dir.name), self.xu, session)
+
+        run = pipeline.run(api_resources)
+        next(run)
+        run.close()
+
+        # In-flight resources finish, but the rest of the update file is never started.
+        self.assertGreater(len([r for r in api_resources if r.status == "pending"]), 80)
+        self.assertEqual(len([r for r in api_resources if r.status == "success"]), len(session.puts))
+        # Everything that finished, apart from the one that was yielded, is handed back for saving.
+        self.assertEqual(len(pipeline.unreported), len(session.puts) - 1)
+
+    def test_bad_get_fails_only_that_resource(self):
+        session = FakeSession(self.xml_resource, bad_get_urls={
+            "https://fakeserver/1": b"<html><body>Internal Server Error</body>",
+            "https://fakeserver/2": requests.ConnectionError("Connection reset by peer"),
+        })
+        api_resources = [ApiResource(str(i), f"https://fakeserver/{i}", ["8"]) for i in range(4)]
+
+        completed, _ = self.run_pipeline(session, api_resources)
+
+        self.assertEqual([r.status for r in completed], ["success", "failed", "failed", "success"])
+        self.assertEqual(completed[1].failure.stage, "GET")
+        self.assertEqual(completed[1].failure.exception_type, "RetrievalError")
+        self.assertEqual(completed[1].failure.http_status, 500)
+        self.assertEqual(completed[2].failure.exception_type, "ConnectionError")
+        self.assertEqual(completed[2].failure.message, "Connection reset by peer")
+
+    def test_failed_put_records_status_code(self):
+        session = FakeSession(self.xml_resource, put_status_code=400)
+
+        completed, _ = self.run_pipeline(session, [ApiResource("1", "https://fakeserver/1", ["8"])])
+
+        self.assertEqual(completed[0].failure.stage, "PUT")
+        self.assertEqual(completed[0].failure.http_status, 400)
+
+    def test_too_many_consecutive_failures_stops_the_run(self):
+        session = FakeSession(self.xml_resource, bad_get_urls={
+            f"https://fakeserver/{i}": requests.ConnectionError("down") for i in range(2, 100)
+        })
+        api_resources = [ApiResource(str(i), f"https://fakeserver/{i}", ["8"]) for i in range(100)]
+        pipeline = ResourcePipeline(make_settings(False, 1, max_consecutive_failures=5), Backup(self.project_dir.name), self.xu, session)
+
+        completed = []
+        with self.assertRaises(TooManyFailuresError):
+            for api_resource in pipeline.run(api_resources):
+                completed.append(api_resource)
+
+        self.assertEqual(len(completed), 7)
+        self.assertEqual(len([r for r in api_resources if r.status == "pending"]), 93)
+
+    def test_update_and_comparison_in_process_pool(self):
+        session = FakeSession(self.xml_resource)
+        api_resources = [ApiResource(str(i), f"https://fakeserver/{i}", ["8"]) for i in range(4)]
+
+        with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn")) as process_pool:
+            xu = XMLUpdater(xpaths=["/vendor/meta/gracePeriod/days"], operations=["update"], process_pool=process_pool)
+            pipeline = ResourcePipeline(make_settings(True, 2), Backup(self.project_dir.name), xu, session,
+                                        dry_run_folder=self.project_dir.name, comparator=Comparator(process_pool=process_pool))
+            completed = list(pipeline.run(api_resources))
+
+        self.assertEqual(len(completed), 4)
+        for api_resource in completed:
+            self.assertIn(b"<days>8</days>", api_resource.xml_for_update_request)
+            self.assertIn("values_changed", api_resource.comparison)
+
+    def test_bulk_writer_replaces_puts(self):
+        for max_concurrency in [1, 3]:
+            session = FakeSession(self.xml_resource)
+            batches = []
+            def write(session, updates):
+                batches.append(updates)
+                return {identifier: True for identifier, _ in updates}
+
+            api_resources = [ApiResource(str(i), f"https://fakeserver/{i}", ["8"]) for i in range(5)]
+            pipeline = ResourcePipeline(make_settings(False, max_concurrency), Backup(self.project_dir.name), self.xu, session,
+                                        bulk_writer=BulkWriter(write, session, batch_size=2))
+            completed = list(pipeline.run(api_resources))
+
+            self.assertEqual(session.puts, {})
+            self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+            self.assertEqual(sorted(api_resource.identifier for api_resource in completed), ["0", "1", "2", "3", "4"])
+            self.assertTrue(all(api_resource.status == "success" for api_resource in completed))
+
+    def test_bulk_writer_batch_left_over_when_too_many_fail(self):
+        for max_concurrency in [1, 3]:
+            with self.subTest(max_concurrency=max_concurrency):
+                session = FakeSession(self.xml_resource)
+                def write(session, updates):
+                    return {identifier: index >= 2 for index, (identifier, _) in enumerate(updates)}
+
+                api_resources = [ApiResource(str(i), f"https://fakeserver/{i}", ["8"]) for i in range(5)]
+                pipeline = ResourcePipeline(make_settings(False, max_concurrency, max_consecutive_failures=2),
+                                            Backup(self.project_dir.name), self.xu, session,
+                                            bulk_writer=BulkWriter(write, session, batch_size=5))
+                completed = []
+                with self.assertRaises(TooManyFailuresError):
+                    for api_resource in pipeline.run(api_resources):
+                        completed.append(api_resource)
+
+                # The rest of the written batch is handed back for saving rather than lost.
+                self.assertEqual(len(completed), 2)
+                self.assertEqual(len(pipeline.unreported), 3)
+                self.assertTrue(all(api_resource.status == "success" for api_resource in pipeline.unreported))
+
+    def test_resources_finished_with_a_bulk_write_out_of_quota_are_handed_back(self):
+        session = FakeSession(self.xml_resource, bad_get_urls={
+            f"https://fakeserver/{i}": requests.ConnectionError("down") for i in range(1, 20, 2)
+        })
+        def write(session, updates):
+            raise QuotaExhaustedError("Out of quota")
+
+        api_resources = [ApiResource(str(i), f"https://fakeserver/{i}", ["8"]) for i in range(20)]
+        pipeline = ResourcePipeline(make_settings(False, 4), Backup(self.project_dir.name), self.xu, session,
+                                    bulk_writer=BulkWriter(write, session, batch_size=1))
+        completed = []
+        with self.assertRaises(QuotaExhaustedError):
+            for api_resource in pipeline.run(api_resources):
+                completed.append(api_resource)
+
+        # Every resource that failed is either yielded or handed back, even if it finished alongside the
+        # one whose bulk write ran out of quota.
+        failed = [api_resource for api_resource in api_resources if api_resource.status == "failed"]
+        self.assertCountEqual(failed, [api_resource for api_resource in completed + pipeline.unreported
+                                       if api_resource.status == "failed"])
+
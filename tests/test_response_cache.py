@@ -0,0 +1,86 @@
+import unittest
+import os
+import tempfile
+import time
+
+from src.api_resource import ApiResource
+from src.response_cache import ResponseCache
+from src.retrieve_resource import retrieve_resource
+from tests.fakes import FakeResponse
+
+
+class FakeSession:
+    """Answers GETs like an API that supports ETags, unless 'etag' is None."""
+    def __init__(self, etag: str | None = '"v1"'):
+        self.etag = etag
+        self.requests: list[dict] = []
+
+    def get(self, url, headers=None):
+        self.requests.append(headers)
+        if self.etag and headers.get("If-None-Match") == self.etag:
+            return FakeResponse(304)
+        return FakeResponse(200, b"<vendor><code>A</code></vendor>", {"ETag": self.etag} if self.etag else {})
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(os.path.join(self.folder.name, "response_cache.sqlite"), ttl=60)
+
+    def tearDown(self):
+        self.cache.close()
+        self.folder.cleanup()
+
+    def retrieve(self, session: FakeSession, allow_unconfirmed_copy: bool = False) -> ApiResource:
+        return retrieve_resource(ApiResource("A", "https://fakeserver/A?apikey=secret"), session, cache=self.cache,
+                                 allow_unconfirmed_copy=allow_unconfirmed_copy)
+
+    def test_conditional_get_uses_saved_copy(self):
+        session = FakeSession()
+        self.retrieve(session)
+        api_resource = self.retrieve(session)
+
+        self.assertEqual(session.requests[1]["If-None-Match"], '"v1"')
+        self.assertEqual(api_resource.tree.findtext("code"), "A")
+
+    def test_changed_resource_is_downloaded_again(self):
+        self.retrieve(FakeSession(etag='"v1"'))
+        session = FakeSession(etag='"v2"')
+        self.retrieve(session)
+
+        self.assertEqual(self.cache.get("https://fakeserver/A?apikey=secret").etag, '"v2"')
+
+    def test_ttl_without_validators(self):
+        session = FakeSession(etag=None)
+        self.retrieve(session, allow_unconfirmed_copy=True)
+        self.retrieve(session, allow_unconfirmed_copy=True)
+        self.assertEqual(len(session.requests), 1)
+
+        self.cache.ttl = 0.01
+        time.sleep(0.02)
+        self.retrieve(session, allow_unconfirmed_copy=True)
+        self.assertEqual(len(session.requests), 2)
+
+    def test_unconfirmed_copy_is_downloaded_again(self):
+        # A production run mustn't back up or update a copy that may be out of date.
+        session = FakeSession(etag=None)
+        self.retrieve(session)
+        self.retrieve(session)
+
+        self.assertEqual(len(session.requests), 2)
+        self.assertNotIn("If-None-Match", session.requests[1])
+
+    def test_invalidate(self):
+        self.retrieve(FakeSession())
+        self.cache.invalidate("https://fakeserver/A?apikey=secret")
+
+        self.assertIsNone(self.cache.get("https://fakeserver/A?apikey=secret"))
+
+    def test_url_is_not_stored(self):
+        self.retrieve(FakeSession())
+        self.cache.close()
+
+        with open(self.cache.cache_filepath, "rb") as f:
+            self.assertNotIn(b"secret", f.read())
+        self.cache = ResponseCache(self.cache.cache_filepath)
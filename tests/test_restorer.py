@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+
+from src.backup import Backup
+from src.restorer import Restorer, read_ids_file, ids_with_status, iter_resources_to_restore, count_resources_to_restore
+from src.xml_updater import XMLUpdater
+from src.api_resource import ApiResource
+from src.get_configuration import Settings
+from src.sharding import Shard
+
+
+class TestRestorer(unittest.TestCase):
+
+    def setUp(self):
+        self.project_dir = tempfile.TemporaryDirectory()
+        self.backups = Backup(self.project_dir.name)
+        self.backups.backup("1", b"<vendor>\n  <code>original</code>\n</vendor>")
+
+    def tearDown(self):
+        self.project_dir.cleanup()
+
+    def test_restore_returns_backup(self):
+        restorer = Restorer(self.backups)
+        self.assertEqual(restorer("1", b"<vendor><code>updated</code></vendor>"), b"<vendor>\n  <code>original</code>\n</vendor>")
+
+    def test_nothing_to_restore_if_unchanged(self):
+        # Formatting differences don't count as changes.
+        restorer = Restorer(self.backups)
+        self.assertIsNone(restorer("1", b"<vendor><code>original</code></vendor>"))
+
+    def test_backup_made_by_a_shard(self):
+        # After merging a project's shards, its progress lists resources that were backed up in the shards' folders.
+        shard = next(Shard(index, 3) for index in range(1, 4) if "2" in Shard(index, 3))
+        other_shard = next(Shard(index, 3) for index in range(1, 4) if "2" not in Shard(index, 3))
+        os.makedirs(shard.folder(self.project_dir.name))
+        os.makedirs(other_shard.folder(self.project_dir.name))
+        shard_backups = Backup(shard.folder(self.project_dir.name))
+        shard_backups.backup("2", b"<vendor><code>from shard</code></vendor>")
+        other_shard_backups = Backup(other_shard.folder(self.project_dir.name))
+        other_shard_backups.backup("2", b"<vendor><code>wrong shard</code></vendor>")
+
+        restorer = Restorer(self.backups, {other_shard: other_shard_backups, shard: shard_backups})
+
+        self.assertEqual(restorer("2", b"<vendor><code>updated</code></vendor>"), b"<vendor><code>from shard</code></vendor>")
+        with self.assertRaises(LookupError):
+            restorer("3", b"<vendor><code>updated</code></vendor>")
+
+    def test_missing_backup_fails_resource(self):
+        xu = XMLUpdater(custom_update_function=Restorer(self.backups))
+        api_resource = ApiResource("2", "https://fakeserver/2")
+        api_resource.xml_from_get_request = b"<vendor><code>updated</code></vendor>"
+
+        xu.update_resource(api_resource)
+
+        self.assertEqual(api_resource.status, "failed")
+        self.assertEqual(api_resource.failure.stage, "update")
+        self.assertIn("no backup", api_resource.failure.message)
+
+
+class TestChoosingResources(unittest.TestCase):
+
+    def test_read_ids_file(self):
+        with tempfile.TemporaryDirectory() as folder:
+            ids_filepath = os.path.join(folder, "ids.csv")
+            with open(ids_filepath, "w", encoding="utf-8-sig") as f:
+                f.write("ID,Notes\n1,a\n\n2,b\n")
+            self.assertEqual(read_ids_file(ids_filepath), ["1", "2"])
+
+    def test_ids_with_status(self):
+        progress = {"1": "success", "2": "failed", "3": "success"}
+        self.assertEqual(ids_with_status(progress, "success"), ["1", "3"])
+        self.assertEqual(ids_with_status(progress, "failed"), ["2"])
+        self.assertEqual(ids_with_status(progress, "all"), ["1", "2", "3"])
+
+    def test_already_restored_are_skipped(self):
+        settings = Settings()
+        settings.api_url_template = "https://fakeserver/<resource_id>"
+        api_resources = list(iter_resources_to_restore(settings, ["1", "2", "3"], {"2": "success"}))
+        self.assertEqual([api_resource.identifier for api_resource in api_resources], ["1", "3"])
+        self.assertEqual(api_resources[0].api_url, "https://fakeserver/1")
+        self.assertEqual(count_resources_to_restore(["1", "2", "3"], {"2": "success"}), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import requests
+
+from src.api_resource import ApiResource
+from src.retry_policy import RetryPolicy
+from tests.fakes import FakeResponse
+
+
+class FlakyRequest:
+    """Fails in the given ways (exceptions or status codes) before returning a 200."""
+    def __init__(self, failures: list):
+        self.failures = list(failures)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.failures:
+            failure = self.failures.pop(0)
+            if isinstance(failure, Exception):
+                raise failure
+            return FakeResponse(failure)
+        return FakeResponse(200)
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.api_resource = ApiResource("1234", "https://example.com/1234")
+        self.policy = RetryPolicy(max_attempts=3, backoff_factor=0)
+
+    def test_retries_retryable_status_codes(self):
+        send_request = FlakyRequest([503, 500])
+
+        response = self.policy.call(send_request, self.api_resource, "PUT")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.api_resource.attempts["PUT"], 3)
+
+    def test_retries_connection_errors(self):
+        send_request = FlakyRequest([requests.ConnectionError("reset")])
+
+        response = self.policy.call(send_request, self.api_resource, "GET")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.api_resource.attempts["GET"], 2)
+
+    def test_does_not_retry_client_errors(self):
+        send_request = FlakyRequest([400])
+
+        response = self.policy.call(send_request, self.api_resource, "PUT")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(send_request.calls, 1)
+
+    def test_returns_last_response_when_out_of_attempts(self):
+        send_request = FlakyRequest([503, 503, 503])
+
+        response = self.policy.call(send_request, self.api_resource, "PUT")
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(send_request.calls, 3)
+
+    def test_raises_last_exception_when_out_of_attempts(self):
+        send_request = FlakyRequest([requests.ConnectionError("reset") for _ in range(3)])
+
+        with self.assertRaises(requests.ConnectionError):
+            self.policy.call(send_request, self.api_resource, "GET")
+        self.assertEqual(send_request.calls, 3)
+
+    def test_backoff_is_capped(self):
+        policy = RetryPolicy(backoff_factor=10, max_backoff=2)
+
+        for attempt in range(1, 10):
+            self.assertLessEqual(policy.backoff(attempt), 2)
@@ -0,0 +1,97 @@
+import gzip
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from src.run_logging import setup_logging, stop_logging, forward_process_logs, setup_process_logging
+
+
+def log_warning(identifier: str):
+    logging.warning("Element does not exist on resource %s.", identifier)
+    logging.debug("Not at the log level")
+
+
+class TestRunLogging(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.log_filepath = os.path.join(self.folder.name, "logs.log")
+        root_logger = logging.getLogger()
+        self.original_handlers = root_logger.handlers[:]
+        self.original_level = root_logger.level
+
+    def tearDown(self):
+        root_logger = logging.getLogger()
+        for handler in root_logger.handlers[:]:
+            root_logger.removeHandler(handler)
+        for handler in self.original_handlers:
+            root_logger.addHandler(handler)
+        root_logger.setLevel(self.original_level)
+        self.folder.cleanup()
+
+    def test_logs_are_written_by_the_time_logging_stops(self):
+        listener = setup_logging(self.log_filepath)
+        threads = [threading.Thread(target=logging.info, args=("Resource %s", i)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        logging.debug("Not at the log level")
+        stop_logging(listener)
+
+        with open(self.log_filepath, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 20)
+        self.assertTrue(lines[0].startswith("INFO:"))
+        self.assertEqual(logging.getLogger().handlers, [])
+
+    def test_logs_from_worker_processes(self):
+        listener = setup_logging(self.log_filepath)
+        mp_context = multiprocessing.get_context("spawn")
+        process_listener = forward_process_logs(listener, mp_context)
+        with ProcessPoolExecutor(max_workers=1, mp_context=mp_context, initializer=setup_process_logging,
+                                 initargs=(process_listener.queue, "INFO")) as process_pool:
+            process_pool.submit(log_warning, "1").result()
+        process_listener.stop()
+        stop_logging(listener)
+
+        with open(self.log_filepath, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].startswith("WARNING:"))
+        self.assertTrue(lines[0].endswith("Element does not exist on resource 1."))
+
+    def test_json_lines(self):
+        listener = setup_logging(self.log_filepath, level="DEBUG", json_lines=True)
+        logging.debug("Comparing %s", "1")
+        try:
+            raise ValueError("Broken")
+        except ValueError:
+            logging.exception("Something went wrong")
+        stop_logging(listener)
+
+        with open(self.log_filepath, encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f]
+        self.assertEqual(entries[0]["level"], "DEBUG")
+        self.assertEqual(entries[0]["message"], "Comparing 1")
+        self.assertEqual(entries[1]["level"], "ERROR")
+        self.assertIn("ValueError: Broken", entries[1]["exception"])
+
+    def test_rotated_logs_are_compressed(self):
+        listener = setup_logging(self.log_filepath, max_bytes=1000, backup_count=2)
+        for i in range(100):
+            logging.info("Resource %s updated successfully.", i)
+        stop_logging(listener)
+
+        self.assertCountEqual(os.listdir(self.folder.name), ["logs.log", "logs.log.1.gz", "logs.log.2.gz"])
+        with gzip.open(f"{self.log_filepath}.1.gz", "rt", encoding="utf-8") as f:
+            self.assertIn("updated successfully", f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import json
+import os
+import tempfile
+import unittest
+
+from src.comparator import ComparisonLog
+from src.get_configuration import get_configuration
+from src.progress_manager import ProgressManager
+from src.read_update_file import iter_update_file, count_update_file
+from src.sharding import Shard, shard_index, find_shard_folders, merge_shards
+
+
+def write_progress(folder: str, rows: list[tuple[str, str]]):
+    os.makedirs(folder, exist_ok=True)
+    with open(f"{folder}/progress.csv", "w", encoding="utf-8-sig") as f:
+        f.write("ID,Status\n")
+        f.writelines(f"{identifier},{status}\n" for identifier, status in rows)
+
+
+def write_comparisons(folder: str, identifiers: list[str]):
+    comparison_log = ComparisonLog(f"{folder}/comparisons.jsonl")
+    for identifier in identifiers:
+        comparison_log.write(identifier, {"values_changed": identifier})
+    comparison_log.close()
+
+
+class TestShard(unittest.TestCase):
+
+    def test_parse(self):
+        shard = Shard.parse("2/4")
+
+        self.assertEqual((shard.index, shard.count), (2, 4))
+        self.assertEqual(shard.name, "2_of_4")
+        self.assertEqual(shard.folder("projects/p"), "projects/p/shards/2_of_4")
+
+    def test_parse_invalid(self):
+        for text in ("2", "0/4", "5/4", "a/4", "1/0", "-1/4"):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    Shard.parse(text)
+
+    def test_each_resource_is_in_one_shard(self):
+        shards = [Shard(index, 4) for index in range(1, 5)]
+        identifiers = [f"RECORD_{i}" for i in range(1000)]
+
+        for identifier in identifiers:
+            self.assertEqual(sum(identifier in shard for shard in shards), 1)
+        # The shards are about the same size.
+        for shard in shards:
+            self.assertGreater(sum(identifier in shard for identifier in identifiers), 200)
+
+    def test_shards_are_the_same_in_every_process(self):
+        # Python's hash() of a string changes between processes; the shards mustn't.
+        self.assertEqual([shard_index(identifier, 3) for identifier in ["19982", "123199", "23844", "182848"]], [2, 1, 3, 2])
+
+    def test_iter_update_file_with_shard(self):
+        settings = get_configuration("tests/testdata/proj_basic")
+
+        self.assertEqual([api_resource.identifier for api_resource in iter_update_file(settings, {}, shard=Shard(2, 3))],
+                         ["19982", "182848"])
+        self.assertEqual(count_update_file(settings, {"19982": "success"}, shard=Shard(2, 3)), 1)
+
+
+class TestMergeShards(unittest.TestCase):
+
+    def setUp(self):
+        self.project = tempfile.TemporaryDirectory()
+        self.project_path = self.project.name
+
+    def tearDown(self):
+        self.project.cleanup()
+
+    def test_merge_progress(self):
+        write_progress(self.project_path, [("1", "success"), ("2", "failed")])
+        write_progress(Shard(1, 2).folder(self.project_path), [("2", "success"), ("3", "failed")])
+        write_progress(Shard(2, 2).folder(self.project_path), [("4", "success")])
+        # Progress the shard didn't get to move out of its journal is merged too.
+        with open(f"{Shard(2, 2).folder(self.project_path)}/progress_journal.csv", "w", encoding="utf-8") as f:
+            f.write("5,success\n")
+
+        merged = merge_shards(self.project_path)
+        # Merging again changes nothing.
+        merge_shards(self.project_path)
+
+        self.assertEqual(merged["resources"], 4)
+        self.assertEqual(ProgressManager(self.project_path).previously_completed_api_resources,
+                         {"1": "success", "2": "success", "3": "failed", "4": "success", "5": "success"})
+
+    def test_merge_doesnt_undo_success(self):
+        write_progress(Shard(1, 2).folder(self.project_path), [("1", "failed"), ("2", "failed")])
+        merge_shards(self.project_path)
+        # The project is run again without shards, and gets resource 1 updated.
+        write_progress(self.project_path, [("1", "success"), ("2", "failed")])
+        # A shard that was run with a different number of shards failed resource 3 after the other updated it.
+        write_progress(Shard(1, 1).folder(self.project_path), [("3", "success")])
+        write_progress(Shard(2, 2).folder(self.project_path), [("3", "failed")])
+
+        merge_shards(self.project_path)
+
+        self.assertEqual(ProgressManager(self.project_path).previously_completed_api_resources,
+                         {"1": "success", "2": "failed", "3": "success"})
+
+    def test_merge_comparisons(self):
+        write_progress(self.project_path, [])
+        write_comparisons(self.project_path, ["1"])
+        shard_folder = Shard(1, 2).folder(self.project_path)
+        write_progress(shard_folder, [])
+        write_comparisons(shard_folder, ["2", "3"])
+
+        self.assertEqual(merge_shards(self.project_path)["comparisons"], 2)
+        # Only what the shard has added since is merged the next time.
+        write_comparisons(shard_folder, ["4"])
+        with open(f"{shard_folder}/comparisons.jsonl", "a", encoding="utf-8") as f:
+            f.write('{"id": "5", "compar')
+        self.assertEqual(merge_shards(self.project_path)["comparisons"], 1)
+
+        comparisons = ComparisonLog.read_comparisons(f"{self.project_path}/comparisons.jsonl")
+        self.assertEqual(list(comparisons), ["1", "2", "3", "4"])
+        with open(f"{self.project_path}/shards/merged.json", encoding="utf-8") as f:
+            self.assertEqual(list(json.load(f)), ["1_of_2"])
+
+    def test_find_shard_folders(self):
+        for name in ("2_of_2", "1_of_2", "1_of_1", "notes"):
+            os.makedirs(f"{self.project_path}/shards/{name}")
+
+        self.assertEqual([os.path.basename(folder) for folder in find_shard_folders(self.project_path)],
+                         ["1_of_1", "1_of_2", "2_of_2"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -25,6 +25,7 @@ class TestVerifyResponseContent(unittest.TestCase):
         api_resource = verify_response_content(test_resource, "/vendor/gracePeriod/hours")
 
         self.assertEqual(api_resource.status, "failed")
+        self.assertEqual(api_resource.failure.stage, "verify")
 
     def test_verify_response_content_pending_no_get_info_passes(self):
         test_resource = ApiResource("1234", "https://google.com")
@@ -3,6 +3,7 @@ from src.api_resource import ApiResource
 from src.xml_updater import XMLUpdater
 
 import xmltodict
+from lxml import etree
 
 
 class TestResourceUpdaterXML(unittest.TestCase):
@@ -226,4 +227,72 @@ class TestResourceUpdaterXML(unittest.TestCase):
 
         self.assertIsNone(updated_api_resource.xml_for_update_request)
 
-        
\ No newline at end of file
+        
+    def test_update_leaves_original_tree_unchanged(self):
+        xu = XMLUpdater(xpaths=["/vendor/meta/gracePeriod/days"], operations=["update"])
+        test_resource = ApiResource("11224", "https://fakeserver/id", ["8"])
+
+        with open("tests/testdata/xml/xml_resource.xml", "rb") as f:
+            test_resource.xml_from_get_request = f.read()
+        original_tree = test_resource.tree
+
+        xu.update_resource(test_resource)
+
+        self.assertIs(test_resource.tree, original_tree)
+        self.assertEqual(original_tree.findtext("meta/gracePeriod/days"), "5")
+        self.assertIn(b"<days>8</days>", test_resource.xml_for_update_request)
+
+    def test_update_to_same_value_is_not_a_change(self):
+        """Updating elements to the values they already have shouldn't send a PUT"""
+        for operation in ["update", "updateOrInsert"]:
+            xu = XMLUpdater(xpaths=["/vendor/meta/gracePeriod/days"], operations=[operation])
+            test_resource = ApiResource("11224", "https://fakeserver/id", ["5"])
+
+            with open("tests/testdata/xml/xml_resource.xml", "rb") as f:
+                test_resource.xml_from_get_request = f.read()
+
+            updated_api_resource = xu.update_resource(test_resource)
+
+            self.assertIsNone(updated_api_resource.xml_for_update_request)
+            self.assertEqual(updated_api_resource.status, "success")
+
+    def test_delete_nothing_matched_is_not_a_change(self):
+        xu = XMLUpdater(xpaths=["/vendor/meta/gracePeriod"], operations=["delete"])
+        test_resource = ApiResource("11224", "https://fakeserver/id", ["weeks"])
+
+        with open("tests/testdata/xml/xml_resource.xml", "rb") as f:
+            test_resource.xml_from_get_request = f.read()
+
+        self.assertIsNone(xu.update_resource(test_resource).xml_for_update_request)
+
+    def test_update_plan_is_compiled_once(self):
+        xu = XMLUpdater(xpaths=["/vendor/meta/gracePeriod/days"], operations=["updateOrInsert"])
+
+        self.assertIs(xu.update_plan, XMLUpdater(xpaths=["/vendor/meta/gracePeriod/days"], operations=["updateOrInsert"]).update_plan)
+        self.assertEqual(xu.update_plan.steps[0].parent_el_xpath, "/vendor/meta/gracePeriod")
+        self.assertEqual(xu.update_plan.steps[0].child_el_name, "days")
+
+    def test_invalid_xpath_fails_before_any_resource(self):
+        with self.assertRaises(etree.XPathSyntaxError):
+            XMLUpdater(xpaths=["/vendor/meta/["], operations=["update"])
+
+    def test_update_or_insert_inserts_into_each_parent(self):
+        xu = XMLUpdater(xpaths=["/items/item/note"], operations=["updateOrInsert"])
+        test_resource = ApiResource("1", "https://fakeserver/id", ["checked"])
+        test_resource.xml_from_get_request = b"<items><item><id>1</id></item><item><id>2</id></item></items>"
+
+        updated = etree.fromstring(xu.update_resource(test_resource).xml_for_update_request)
+
+        self.assertEqual(updated.xpath("/items/item/note/text()"), ["checked", "checked"])
+
+    def test_delete_from_each_parent(self):
+        xu = XMLUpdater(xpaths=["/items/item"], operations=["delete"])
+        test_resource = ApiResource("1", "https://fakeserver/id", ["notes/note[@type='old']"])
+        test_resource.xml_from_get_request = (b"<items>"
+            b"<item><notes><note type='old'>a</note><note type='new'>b</note></notes></item>"
+            b"<item><notes><note type='old'>c</note><note type='old'>d</note></notes></item>"
+            b"</items>")
+
+        updated = etree.fromstring(xu.update_resource(test_resource).xml_for_update_request)
+
+        self.assertEqual(updated.xpath("//note/text()"), ["b"])